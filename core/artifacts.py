@@ -0,0 +1,73 @@
+"""
+Pre-rendered ticket artifacts.
+
+The ticket page and the printable PDF for an order are built once, when the order is
+paid (build_ticket_artifacts task), and stored in TicketArtifact together with a strong
+ETag. download_ticket / download_ticket_pdf then serve the stored bytes and answer
+conditional GETs with 304s. Artifacts are dropped whenever a booking or ticket type
+they depend on changes (see core.signals) and rebuilt on next use.
+"""
+import hashlib
+
+from django.template.loader import render_to_string
+
+from . import pdf, qr
+from .models import Booking, TicketArtifact
+
+
+def _paid_bookings(order_id):
+    return list(
+        Booking.objects.filter(order_id=order_id, status='paid')
+        .select_related('ticket_type__event')
+        .order_by('id')
+    )
+
+
+def _store(order_id, kind, content):
+    artifact, _created = TicketArtifact.objects.update_or_create(
+        order_id=order_id, kind=kind,
+        defaults={'content': content, 'etag': hashlib.sha256(content).hexdigest()},
+    )
+    return artifact
+
+
+def get_artifact(order_id, kind):
+    return TicketArtifact.objects.filter(order_id=order_id, kind=kind).first()
+
+
+def get_etag(order_id, kind):
+    """ETag only — lets conditional GETs answer 304 without loading the artifact body."""
+    return TicketArtifact.objects.filter(order_id=order_id, kind=kind).values_list('etag', flat=True).first()
+
+
+def build_ticket_html(order_id, bookings=None):
+    bookings = _paid_bookings(order_id) if bookings is None else bookings
+    if not bookings:
+        return None
+    items = []
+    for booking in bookings:
+        items.append({
+            'name': booking.customer_name,
+            'ticket': booking.ticket_type.name,
+            'qty': booking.quantity,
+            'amount': booking.total_amount,
+            'payment_id': booking.payment_id,
+            'booking_id': booking.id,
+            'qr': qr.booking_qr_b64(booking),
+        })
+    html = render_to_string('core/ticket.html', {'items': items, 'order_id': order_id})
+    return _store(order_id, 'html', html.encode('utf-8'))
+
+
+def build_ticket_pdf(order_id, bookings=None):
+    """One PDF for the whole order, a page per booking. CPU-heavy — call from a worker."""
+    bookings = _paid_bookings(order_id) if bookings is None else bookings
+    if not bookings:
+        return None
+    html = pdf.order_pdf_html([(booking, qr.booking_qr_b64(booking, qr.EMAIL)) for booking in bookings])
+    return _store(order_id, 'pdf', pdf.render_pdf(html))
+
+
+def invalidate_order(order_id):
+    if order_id:
+        TicketArtifact.objects.filter(order_id=order_id).delete()
@@ -0,0 +1,47 @@
+"""
+System checks for deployment settings that break quietly at runtime.
+
+`manage.py check` (and migrate, runserver) runs them, and so does gunicorn before it
+forks its workers (gunicorn.conf.py).
+"""
+from django.conf import settings
+from django.core.checks import Error, Tags, register
+
+# Backends whose entries only the process that wrote them can see
+LOCAL_CACHES = (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
+
+
+def shared_cache():
+    return settings.CACHES['default']['BACKEND'] not in LOCAL_CACHES
+
+
+@register(Tags.caches)
+def check_shared_cache(app_configs, **kwargs):
+    if shared_cache() or settings.WEB_CONCURRENCY <= 1:
+        return []
+    return [Error(
+        f'{settings.WEB_CONCURRENCY} web workers would each have their own cache (CACHE_URL={settings.CACHE_URL}).',
+        hint=(
+            'Edits would not invalidate the page fragments and inventory snapshot of the other workers. '
+            'Set CACHE_URL to redis:// (or file:// for the workers of one machine), or WEB_CONCURRENCY=1.'
+        ),
+        id='core.E001',
+    )]
+
+
+@register(Tags.caches)
+def check_waiting_room_cache(app_configs, **kwargs):
+    if shared_cache() or getattr(settings, 'WAITING_ROOM_RATE', 0) <= 0:
+        return []
+    return [Error(
+        f'The waiting room is on (WAITING_ROOM_RATE={settings.WAITING_ROOM_RATE}) but its queue would live in '
+        f'a per-process cache (CACHE_URL={settings.CACHE_URL}).',
+        hint=(
+            'Each process would hand out its own queue numbers and admit WAITING_ROOM_RATE buyers per second, '
+            'and a restart would empty the queue. Set CACHE_URL to redis:// (or file:// on one machine).'
+        ),
+        id='core.E002',
+    )]
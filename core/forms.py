@@ -19,3 +19,10 @@ class TicketTypeForm(forms.ModelForm):
         widgets = {
             'description': forms.Textarea(attrs={'rows': 2}),
         }
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        if self.instance.inventory_shards:
+            # Stock lives in the inventory shards; merge them first to edit it here
+            self.fields['quantity_available'].disabled = True
+            self.fields['quantity_available'].help_text = 'Sharded stock: run `manage.py shard_inventory <id> 0` to edit.'
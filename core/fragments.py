@@ -0,0 +1,66 @@
+"""
+Cached fragments of the public index page.
+
+Each published event's card (details, map, ticket form) is rendered once and kept in
+the cache under a key that carries the event's version. Saving or deleting an Event
+or one of its TicketTypes gives the event a new version (core.signals), so the next
+page view re-renders just that card; old versions simply expire.
+
+Nothing per-visitor or fast-changing goes into a card: the CSRF input is a marker the
+view swaps for the visitor's token, and stock is merged in by the page from
+available_quantities() on every request.
+"""
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.template.loader import render_to_string
+from django.utils.safestring import mark_safe
+
+from .models import Event
+
+INDEX_CARD_CACHE_TTL = getattr(settings, 'INDEX_CARD_CACHE_TTL', 300)
+
+CSRF_MARKER = '<!-- csrf-input -->'
+
+
+def _version_key(event_id):
+    return f'event-card-version:{event_id}'
+
+
+def _new_version():
+    # Unique rather than incremented: a version key evicted from the cache comes back as a
+    # value no cached card was stored under, never as an old one
+    return time.time_ns()
+
+
+def invalidate_event(event_id):
+    cache.set(_version_key(event_id), _new_version(), None)
+
+
+def _versions(event_ids):
+    keys = {_version_key(event_id): event_id for event_id in event_ids}
+    versions = {keys[key]: version for key, version in cache.get_many(keys).items()}
+    missing = {key: _new_version() for key, event_id in keys.items() if event_id not in versions}
+    if missing:
+        cache.set_many(missing, None)
+        versions.update({keys[key]: version for key, version in missing.items()})
+    return versions
+
+
+def event_cards(event_ids):
+    """{event_id: card HTML (with CSRF_MARKER)}, rendering only the cards not cached at their current version."""
+    card_keys = {f'event-card:{event_id}:{version}': event_id for event_id, version in _versions(event_ids).items()}
+    cards = {card_keys[key]: html for key, html in cache.get_many(card_keys).items()}
+    missing = [event_id for event_id in event_ids if event_id not in cards]
+    if missing:
+        rendered = {
+            event.id: render_to_string('core/partials/event_card.html', {'event': event, 'csrf_input': mark_safe(CSRF_MARKER)})
+            for event in Event.objects.filter(id__in=missing).prefetch_related('ticket_types')
+        }
+        cache.set_many(
+            {key: rendered[event_id] for key, event_id in card_keys.items() if event_id in rendered},
+            INDEX_CARD_CACHE_TTL,
+        )
+        cards.update(rendered)
+    return cards
@@ -0,0 +1,123 @@
+"""
+Gate check-in.
+
+The ticket QR carries a compact signed token instead of readable booking details:
+
+    CC1.<booking id, base 36>.<quantity>.<signature>
+
+The signature is a truncated salted HMAC-SHA256 (keyed by SECRET_KEY) over the id and
+quantity, so a scanner can reject forged or altered tickets without touching the
+database. check_in() then admits a booking with a single conditional UPDATE that only
+matches paid bookings not checked in yet; two gates scanning the same ticket at the
+same moment can't both get a match.
+
+Scanners working offline (core.manifest) push their check-ins later through
+check_in_batch(), which keeps the earliest scan of a ticket whichever gate syncs first.
+"""
+import base64
+
+from django.db import transaction
+from django.db.models import Case, DateTimeField, Value, When
+from django.utils import timezone
+from django.utils.crypto import constant_time_compare, salted_hmac
+
+from .models import Booking
+
+TOKEN_PREFIX = 'CC1'
+_SALT = 'core.gate.ticket'
+_SIGNATURE_BYTES = 12
+
+
+def _digest(body):
+    return salted_hmac(_SALT, body, algorithm='sha256').digest()[:_SIGNATURE_BYTES]
+
+
+def _signature(body):
+    return base64.urlsafe_b64encode(_digest(body)).decode('ascii')
+
+
+def _base36(number):
+    digits = '0123456789abcdefghijklmnopqrstuvwxyz'
+    encoded = ''
+    while True:
+        number, remainder = divmod(number, 36)
+        encoded = digits[remainder] + encoded
+        if not number:
+            return encoded
+
+
+def _body(booking_id, quantity):
+    return f'{TOKEN_PREFIX}.{_base36(booking_id)}.{quantity}'
+
+
+def make_token(booking_id, quantity):
+    body = _body(booking_id, quantity)
+    return f'{body}.{_signature(body)}'
+
+
+def token_digest(booking_id, quantity):
+    """The raw signature bytes inside this ticket's token (what the offline manifest stores a prefix of)."""
+    return _digest(_body(booking_id, quantity))
+
+
+def verify_token(token):
+    """(booking_id, quantity) for a genuine token, else None. No database access."""
+    if not isinstance(token, str):  # JSON from a scanner can hold anything
+        return None
+    try:
+        prefix, booking_id, quantity, signature = token.strip().split('.')
+        if prefix != TOKEN_PREFIX:
+            return None
+        ticket = int(booking_id, 36), int(quantity)
+    except ValueError:
+        return None
+    if not constant_time_compare(_signature(f'{prefix}.{booking_id}.{quantity}'), signature):
+        return None
+    return ticket
+
+
+def check_in(booking_id, now=None):
+    """Admit a paid booking once: ('admitted', now), ('already_checked_in', when) or ('not_found', None)."""
+    now = now or timezone.now()
+    if Booking.objects.filter(id=booking_id, status='paid', checked_in_at__isnull=True).update(checked_in_at=now):
+        return 'admitted', now
+    # Only rejected scans pay for a second query, to say why
+    checked_in_at = Booking.objects.filter(id=booking_id, status='paid').values_list('checked_in_at', flat=True).first()
+    if checked_in_at:
+        return 'already_checked_in', checked_in_at
+    return 'not_found', None
+
+
+def check_in_batch(scans):
+    """Apply check-ins recorded offline, {booking_id: scanned_at}, in one transaction.
+
+    Returns {booking_id: (result, checked_in_at)} like check_in(). The earliest scan of a
+    booking is the one kept: a scan older than the stored check-in replaces it and comes
+    back 'admitted'; one scanned after another gate's comes back 'already_checked_in'
+    with that gate's time.
+    """
+    with transaction.atomic():
+        current = dict(
+            Booking.objects.select_for_update()
+            .filter(id__in=list(scans), status='paid')
+            .order_by('id')
+            .values_list('id', 'checked_in_at')
+        )
+        admit = [
+            booking_id for booking_id, checked_in_at in current.items()
+            if checked_in_at is None or scans[booking_id] < checked_in_at
+        ]
+        if admit:
+            Booking.objects.filter(id__in=admit).update(checked_in_at=Case(
+                *[When(id=booking_id, then=Value(scans[booking_id])) for booking_id in admit],
+                output_field=DateTimeField(),
+            ))
+    results = {}
+    for booking_id, scanned_at in scans.items():
+        if booking_id not in current:
+            results[booking_id] = ('not_found', None)
+        elif current[booking_id] is None or scanned_at < current[booking_id]:
+            results[booking_id] = ('admitted', scanned_at)
+        else:
+            results[booking_id] = ('already_checked_in', current[booking_id])
+    return results
@@ -0,0 +1,115 @@
+"""
+Sharded inventory counters.
+
+Every buyer of a plain ticket type serializes on its TicketType row: checkout locks
+it and payment_verify decrements it. A hot ticket type can instead have its stock
+split across TicketType.inventory_shards InventoryShard rows. Checkout then claims
+from one random shard with a single conditional UPDATE, so concurrent buyers mostly
+touch different rows and the TicketType row is never locked:
+
+    UPDATE core_inventoryshard SET quantity = quantity - n WHERE id = ? AND quantity >= n
+
+When the random shard can't cover the line (usually near sell-out) the fallback
+locks that ticket type's shards in id order and drains them one after another.
+
+For a sharded ticket type the shards hold the *unreserved* stock: the claim is the
+hold, releasing or expiring it credits the shard back, and payment leaves
+quantity_available alone. Split or merge a ticket type with reshard()
+(`manage.py shard_inventory`).
+"""
+import random
+
+from django.db import transaction
+from django.db.models import F, Sum
+
+from .models import InventoryShard, Reservation, TicketType
+from .pricing import StockError
+
+
+def shard_totals(ticket_type_ids):
+    """{ticket_type_id: unreserved stock} summed over the shards in one grouped query."""
+    rows = (
+        InventoryShard.objects.filter(ticket_type_id__in=ticket_type_ids)
+        .values('ticket_type_id')
+        .annotate(total=Sum('quantity'))
+        .order_by()
+    )
+    return {row['ticket_type_id']: row['total'] for row in rows}
+
+
+def claim(ticket, quantity):
+    """Take `quantity` from a sharded ticket type: [(shard_id, taken)] or StockError.
+
+    Run inside transaction.atomic() so the claim is undone if a later line fails.
+    """
+    index = random.randrange(ticket.inventory_shards)
+    shard_id = (
+        InventoryShard.objects.filter(ticket_type=ticket, index=index, quantity__gte=quantity)
+        .values_list('id', flat=True)
+        .first()
+    )
+    if shard_id and InventoryShard.objects.filter(id=shard_id, quantity__gte=quantity).update(
+        quantity=F('quantity') - quantity
+    ):
+        return [(shard_id, quantity)]
+
+    # Fallback: lock every shard of this ticket type (in id order, so concurrent
+    # fallbacks can't deadlock) and spread the line over as many as it takes.
+    shards = list(InventoryShard.objects.filter(ticket_type=ticket).order_by('id').select_for_update())
+    left = sum(max(shard.quantity, 0) for shard in shards)
+    if left < quantity:
+        raise StockError(ticket, left)
+    claims = []
+    for shard in shards:
+        taken = min(shard.quantity, quantity)
+        if taken <= 0:
+            continue
+        InventoryShard.objects.filter(id=shard.id).update(quantity=F('quantity') - taken)
+        claims.append((shard.id, taken))
+        quantity -= taken
+        if not quantity:
+            break
+    return claims
+
+
+def credit(reservation_ids):
+    """Give the stock of sharded holds back to the shards it was claimed from.
+
+    Call with the reservations locked, just before they leave the 'active' status.
+    """
+    rows = (
+        Reservation.objects.filter(id__in=reservation_ids, shard__isnull=False)
+        .values('shard_id')
+        .annotate(total=Sum('quantity'))
+        .order_by('shard_id')
+    )
+    for row in rows:
+        InventoryShard.objects.filter(id=row['shard_id']).update(quantity=F('quantity') + row['total'])
+
+
+def reshard(ticket_type_id, shards):
+    """Split a ticket type's stock over `shards` counters, or merge it back with shards=0."""
+    with transaction.atomic():
+        ticket = TicketType.objects.select_for_update().get(id=ticket_type_id)
+        holds = Reservation.objects.filter(ticket_type=ticket, status='active')
+        held = holds.aggregate(total=Sum('quantity'))['total'] or 0
+
+        if ticket.inventory_shards:
+            # Back to the row: unreserved stock plus what's held (taken again at payment)
+            unreserved = ticket.shards.aggregate(total=Sum('quantity'))['total'] or 0
+            ticket.quantity_available = unreserved + held
+            holds.update(shard=None)
+            ticket.shards.all().delete()
+
+        if shards:
+            per_shard, extra = divmod(max(ticket.quantity_available - held, 0), shards)
+            InventoryShard.objects.bulk_create([
+                InventoryShard(ticket_type=ticket, index=i, quantity=per_shard + (i < extra))
+                for i in range(shards)
+            ])
+            # Existing holds expire or are released into the first shard
+            holds.update(shard=ticket.shards.get(index=0))
+
+        ticket.inventory_shards = shards
+        ticket.save(update_fields=['quantity_available', 'inventory_shards'])
+    return ticket
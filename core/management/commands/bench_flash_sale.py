@@ -0,0 +1,214 @@
+import math
+import re
+import time
+import uuid
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.db.models import Sum
+from django.test import Client
+from django.test.utils import CaptureQueriesContext, override_settings
+
+from core import payments
+from core.inventory import reshard
+from core.models import Booking, Event, TicketArtifact, TicketType
+from core.stubs import start_stubs
+from pune_color_festival.celery import app as celery_app
+
+ENDPOINTS = ('index', 'update_total', 'checkout', 'checkout_display', 'payment_verify', 'download_ticket')
+CSRF_RE = re.compile(r'name="csrfmiddlewaretoken" value="([^"]+)"')
+ORDER_RE = re.compile(r'"order_id": "([^"]+)"')
+
+
+class _InProcess:
+    """Drives the app through the test client; counts each request's queries on this thread's connection."""
+
+    def __init__(self):
+        self.client = Client()
+
+    def get(self, path, data=None):
+        return self._call(self.client.get, path, data)
+
+    def post(self, path, data=None):
+        return self._call(self.client.post, path, data)
+
+    def _call(self, method, path, data):
+        with CaptureQueriesContext(connection) as queries:
+            response = method(path, data or {})
+        return response.status_code, response.get('Location', ''), response.content.decode(), len(queries)
+
+
+class _Live:
+    """Drives a running server over HTTP; query counts aren't visible from here."""
+
+    def __init__(self, url):
+        self.url = url.rstrip('/')
+        self.session = requests.Session()
+
+    def get(self, path, data=None):
+        response = self.session.get(self.url + path, params=data, allow_redirects=False, timeout=60)
+        return response.status_code, response.headers.get('Location', ''), response.text, None
+
+    def post(self, path, data=None):
+        response = self.session.post(self.url + path, data=data, allow_redirects=False, timeout=60)
+        return response.status_code, response.headers.get('Location', ''), response.text, None
+
+
+def _percentile(values, p):
+    return values[max(math.ceil(p / 100 * len(values)) - 1, 0)]
+
+
+class Command(BaseCommand):
+    help = (
+        "Flash-sale load test: N concurrent buyers go index -> update_total -> checkout -> "
+        "payment_verify -> download_ticket against local Razorpay/Resend/Meta stubs. Reports "
+        "p50/p95/p99 and queries per endpoint, checkouts/sec and oversold tickets."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--buyers', type=int, default=200)
+        parser.add_argument('--threads', type=int, default=16, help='Concurrent buyers')
+        parser.add_argument('--stock', type=int, default=0, help='Tickets on sale (default: half of --buyers, so it sells out)')
+        parser.add_argument('--quantity', type=int, default=1, help='Tickets per buyer')
+        parser.add_argument('--shards', type=int, default=0, help='Shard the ticket type\'s inventory (core.inventory)')
+        parser.add_argument('--provider-latency-ms', type=int, default=50, help='Delay of every stubbed provider call')
+        parser.add_argument('--no-delivery', action='store_true', help='Leave Resend and WhatsApp unconfigured')
+        parser.add_argument(
+            '--url', default='',
+            help='Load-test a running server instead (configured for `manage.py provider_stubs`, same database)',
+        )
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'postgresql' and not options['url']:
+            self.stderr.write(self.style.WARNING(
+                f'Running on {connection.vendor}: concurrent writers will fail with "database is locked". '
+                'Point DATABASE_URL at PostgreSQL, or use --threads 1 for a functional run.'
+            ))
+        stock = options['stock'] or max(options['buyers'] // 2, 1)
+        event = Event.objects.create(
+            title='bench_flash_sale', description='', venue_name='-', venue_address='-', is_published=True,
+        )
+        ticket = TicketType.objects.create(event=event, name='Flash', price=499, quantity_available=stock)
+        if options['shards']:
+            ticket = reshard(ticket.id, options['shards'])
+        try:
+            if options['url']:
+                results, elapsed = self._run(event, ticket, options, lambda: _Live(options['url']))
+                provider_calls = None
+            else:
+                results, elapsed, provider_calls = self._run_in_process(event, ticket, options)
+            self._report(results, elapsed, ticket, stock, provider_calls)
+        finally:
+            order_ids = list(event.orders.values_list('order_id', flat=True))
+            TicketArtifact.objects.filter(order_id__in=order_ids).delete()
+            event.delete()
+
+    def _run_in_process(self, event, ticket, options):
+        stubs = start_stubs(options['provider_latency_ms'] / 1000)
+        delivery = '' if options['no_delivery'] else 'bench'
+        overrides = {
+            **stubs.settings(),
+            'LOCAL_PAYMENT_BYPASS': False,
+            'PAYMENT_GATEWAY': 'razorpay',
+            'RESEND_API_KEY': delivery,
+            'WHATSAPP_PHONE_NUMBER_ID': delivery,
+            'WHATSAPP_ACCESS_TOKEN': delivery,
+            'ALLOWED_HOSTS': ['*'],
+        }
+        # No worker here: delivery runs inline after payment_verify commits, so its time counts there
+        always_eager = celery_app.conf.task_always_eager
+        celery_app.conf.CELERY_TASK_ALWAYS_EAGER = True  # the app reads its config under the CELERY_ namespace
+        try:
+            with override_settings(**overrides):
+                payments._gateway = None  # rebuilt against the stub
+                results, elapsed = self._run(event, ticket, options, _InProcess)
+        finally:
+            payments._gateway = None
+            celery_app.conf.CELERY_TASK_ALWAYS_EAGER = always_eager
+            stubs.stop()
+        return results, elapsed, stubs.calls()
+
+    def _run(self, event, ticket, options, make_client):
+        signer = payments.FakeGateway(settings.RAZORPAY_KEY_SECRET)  # signs like checkout.js would receive
+        quantity = options['quantity']
+
+        def buy(n):
+            http = make_client()
+            timings = []
+
+            def call(endpoint, method, path, data=None):
+                start = time.perf_counter()
+                status, location, body, queries = method(path, data)
+                timings.append((endpoint, time.perf_counter() - start, queries))
+                return status, location, body
+
+            try:
+                _, _, body = call('index', http.get, '/')
+                csrf = CSRF_RE.search(body)
+                call('update_total', http.get, '/update-total/', {f'qty_{ticket.id}': quantity})
+                _, location, _ = call('checkout', http.post, f'/checkout/{event.id}/', {
+                    'csrfmiddlewaretoken': csrf.group(1) if csrf else '',
+                    'customer_name': f'Buyer {n}',
+                    'customer_email': f'buyer{n}@example.com',
+                    'customer_phone': f'9{n:09d}'[-10:],
+                    f'qty_{ticket.id}': quantity,
+                })
+                if not location.endswith('/checkout/'):
+                    return 'sold out', timings
+                _, _, body = call('checkout_display', http.get, '/checkout/')
+                order_id = ORDER_RE.search(body).group(1)
+                payment_id = f'pay_{uuid.uuid4().hex[:14]}'
+                status, _, body = call('payment_verify', http.post, '/payment/verify/', {
+                    'razorpay_order_id': order_id,
+                    'razorpay_payment_id': payment_id,
+                    'razorpay_signature': signer.sign(order_id, payment_id),
+                })
+                if status != 200 or 'Payment Successful' not in body:
+                    return 'failed', timings
+                call('download_ticket', http.get, f'/ticket/{order_id}/')
+                return 'paid', timings
+            except Exception as e:
+                self.stderr.write(f'buyer {n}: {e.__class__.__name__}: {e}')
+                return 'error', timings
+            finally:
+                connection.close()
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=options['threads']) as pool:
+            results = list(pool.map(buy, range(options['buyers'])))
+        return results, time.perf_counter() - start
+
+    def _report(self, results, elapsed, ticket, stock, provider_calls):
+        latencies, queries = defaultdict(list), defaultdict(list)
+        for _, timings in results:
+            for endpoint, seconds, count in timings:
+                latencies[endpoint].append(seconds * 1000)
+                if count is not None:
+                    queries[endpoint].append(count)
+
+        self.stdout.write(f"{'endpoint':<18} {'requests':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'queries':>8}")
+        for endpoint in ENDPOINTS:
+            values = sorted(latencies[endpoint])
+            if not values:
+                continue
+            per_request = f'{sum(queries[endpoint]) / len(queries[endpoint]):.1f}' if queries[endpoint] else 'n/a'
+            self.stdout.write(
+                f'{endpoint:<18} {len(values):>8} {_percentile(values, 50):>8.1f} {_percentile(values, 95):>8.1f} '
+                f'{_percentile(values, 99):>8.1f} {per_request:>8}'
+            )
+
+        outcomes = defaultdict(int)
+        for outcome, _ in results:
+            outcomes[outcome] += 1
+        sold = Booking.objects.filter(ticket_type=ticket, status='paid').aggregate(total=Sum('quantity'))['total'] or 0
+        self.stdout.write(
+            f"{outcomes['paid'] / elapsed:.1f} checkouts/sec  ({len(results)} buyers in {elapsed:.2f}s: "
+            f"{outcomes['paid']} paid, {outcomes['sold out']} sold out, {outcomes['failed']} failed, {outcomes['error']} errors)"
+        )
+        self.stdout.write(f'{sold}/{stock} tickets sold, oversold {max(sold - stock, 0)}')
+        if provider_calls is not None:
+            self.stdout.write(f'provider calls: {provider_calls}')
@@ -0,0 +1,112 @@
+import logging
+import random
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client
+from django.test.utils import override_settings
+
+from core import views
+from core.gate import make_token
+from core.manifest import Manifest, build_manifest
+from core.models import Booking, Event, Order, TicketType
+
+
+class Command(BaseCommand):
+    help = (
+        "Load-test /gate/scan/: every seeded ticket is scanned twice, concurrently, and the "
+        "command reports scans/sec and checks that no ticket was admitted twice. The same "
+        "scans are first timed against the offline manifest."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--tickets', type=int, default=2000, help='Paid bookings to seed and scan')
+        parser.add_argument('--threads', type=int, default=16, help='Concurrent scanners')
+        parser.add_argument('--url', default='', help='Scan a running server, e.g. http://127.0.0.1:8000 (default: in-process)')
+        parser.add_argument('--key', default='', help='X-Gate-Key for --url (must match the server\'s GATE_API_KEY)')
+
+    def handle(self, *args, **options):
+        if options['url'] and not options['key']:
+            raise CommandError('--url needs --key.')
+        event = Event.objects.create(title='bench_gate', description='', venue_name='-', venue_address='-')
+        try:
+            self._run(event, options)
+        finally:
+            event.delete()
+
+    def _run(self, event, options):
+        ticket = TicketType.objects.create(event=event, name='General', price=499, quantity_available=0)
+        order = Order.objects.create(
+            order_id='bench_gate', event=event, customer_name='-', customer_email='gate@example.com',
+            customer_phone='-', total_amount=0, status='paid',
+        )
+        bookings = Booking.objects.bulk_create([
+            Booking(
+                ticket_type=ticket, order=order, customer_name=f'Guest {i}', customer_email='gate@example.com',
+                customer_phone='9999999999', quantity=1 + i % 4, total_amount=499, status='paid',
+            )
+            for i in range(options['tickets'])
+        ])
+        if bookings[0].pk is None:  # backends that don't return ids from bulk inserts
+            bookings = list(Booking.objects.filter(order=order))
+        scans = [make_token(booking.id, booking.quantity) for booking in bookings] * 2
+        random.shuffle(scans)
+        self._offline(event, scans)
+
+        key = options['key'] or 'bench-gate-key'
+        if options['url']:
+            url = options['url'].rstrip('/') + '/gate/scan/'
+            session = requests.Session()
+            scan = lambda token: session.post(url, data={'token': token}, headers={'X-Gate-Key': key}).status_code
+        else:
+            client = Client()
+            scan = lambda token: client.post('/gate/scan/', {'token': token}, headers={'X-Gate-Key': key}).status_code
+
+        def scan_and_close(token):
+            try:
+                return scan(token)
+            finally:
+                connection.close()
+
+        original_key = views.GATE_API_KEY
+        views.GATE_API_KEY = key
+        request_logger = logging.getLogger('django.request')
+        request_logger.disabled = True  # one "Conflict" warning per duplicate scan otherwise
+        try:
+            with override_settings(ALLOWED_HOSTS=['*']):
+                start = time.perf_counter()
+                with ThreadPoolExecutor(max_workers=options['threads']) as pool:
+                    statuses = Counter(pool.map(scan_and_close, scans))
+                elapsed = time.perf_counter() - start
+        finally:
+            views.GATE_API_KEY = original_key
+            request_logger.disabled = False
+
+        checked_in = Booking.objects.filter(order=order, checked_in_at__isnull=False).count()
+        self.stdout.write(
+            f"{len(scans) / elapsed:8.1f} scans/sec  ({len(scans)} scans in {elapsed:.2f}s, {options['threads']} threads)"
+        )
+        self.stdout.write(
+            f"admitted {statuses[200]}, duplicates rejected {statuses[409]}, other {sum(statuses.values()) - statuses[200] - statuses[409]}; "
+            f"checked in {checked_in}/{len(bookings)}"
+        )
+        if statuses[200] != len(bookings) or checked_in != len(bookings):
+            raise CommandError('Some tickets were admitted twice or not at all.')
+
+    def _offline(self, event, scans):
+        start = time.perf_counter()
+        data = build_manifest(event)
+        built = time.perf_counter() - start
+        manifest = Manifest(data)
+        start = time.perf_counter()
+        results = Counter(manifest.scan(token) for token in scans)
+        elapsed = time.perf_counter() - start
+        self.stdout.write(
+            f"offline: manifest {len(data)} bytes built in {built * 1000:.0f}ms; "
+            f"{elapsed / len(scans) * 1_000_000:.1f}us/scan, admitted {results['admitted']}, "
+            f"duplicates rejected {results['already_checked_in']}, invalid {results['invalid']}"
+        )
@@ -0,0 +1,75 @@
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.db import DatabaseError, connection, transaction
+from django.db.models import F, Sum
+
+from core.inventory import reshard
+from core.models import Event, Reservation, TicketType
+from core.pricing import StockError
+from core.reservations import convert_orders, reserve
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure concurrent checkouts/sec on one hot ticket type, with the TicketType row "
+        "as the only counter and with sharded inventory. Run it against PostgreSQL."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--buyers', type=int, default=2000, help='Checkouts attempted per run')
+        parser.add_argument('--threads', type=int, default=32, help='Concurrent buyers (one DB connection each)')
+        parser.add_argument('--shards', type=int, default=16, help='Counter rows for the sharded run')
+        parser.add_argument('--stock', type=int, default=0, help='Tickets on sale (default: --buyers, i.e. no sell-out)')
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'postgresql':
+            self.stderr.write(self.style.WARNING(
+                f'Running on {connection.vendor}: it serializes writers itself, so the numbers say nothing '
+                'about row-lock contention. Point DATABASE_URL at PostgreSQL.'
+            ))
+        for shards in (0, options['shards']):
+            self._run(shards, options['buyers'], options['threads'], options['stock'] or options['buyers'])
+
+    def _run(self, shards, buyers, threads, stock):
+        event = Event.objects.create(title='bench_inventory', description='', venue_name='-', venue_address='-')
+        ticket = TicketType.objects.create(event=event, name='Early Bird', price=499, quantity_available=stock)
+        if shards:
+            ticket = reshard(ticket.id, shards)
+
+        def buy(_):
+            try:
+                order_id = f'bench_{uuid.uuid4().hex[:16]}'
+                with transaction.atomic():
+                    reserve(order_id, event, [(ticket, 1)])
+                # The payment_verify half: convert the hold, decrement the row unless sharded
+                with transaction.atomic():
+                    TicketType.objects.filter(id=ticket.id, inventory_shards=0).update(
+                        quantity_available=F('quantity_available') - 1
+                    )
+                    convert_orders([order_id])
+                return 'sold'
+            except StockError:
+                return 'sold out'
+            except DatabaseError:
+                return 'error'
+            finally:
+                connection.close()
+
+        try:
+            start = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=threads) as pool:
+                results = list(pool.map(buy, range(buyers)))
+            elapsed = time.perf_counter() - start
+
+            sold = results.count('sold')
+            taken = Reservation.objects.filter(ticket_type=ticket).aggregate(total=Sum('quantity'))['total'] or 0
+            label = f'{shards} shards' if shards else 'TicketType row'
+            self.stdout.write(
+                f"{label:<16} {sold / elapsed:8.1f} checkouts/sec  ({elapsed:.2f}s, {sold} sold, "
+                f"{results.count('sold out')} sold out, {results.count('error')} errors, oversold {max(taken - stock, 0)})"
+            )
+        finally:
+            event.delete()
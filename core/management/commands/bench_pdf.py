@@ -0,0 +1,58 @@
+import base64
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import weasyprint
+from django.core.management.base import BaseCommand
+
+from core import pdf, qr
+from core.models import Booking, Event, TicketType
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure ticket PDF throughput (tickets/sec): inline-CSS renders vs the warm renderer, "
+        "in one process and spread over warm processes as a Celery worker's prefork children are."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--count', type=int, default=50, help='Number of tickets to render per run')
+        parser.add_argument('--processes', type=int, default=0, help='Processes for the parallel run (default: CPU count, as celery worker --concurrency)')
+
+    def handle(self, *args, **options):
+        count = options['count']
+        html_list = [pdf.ticket_pdf_html(booking, self._qr(booking)) for booking in self._sample_bookings(count)]
+
+        def run(label, render):
+            start = time.perf_counter()
+            render()
+            elapsed = time.perf_counter() - start
+            self.stdout.write(f"{label:<32} {count / elapsed:8.1f} tickets/sec  ({elapsed:.2f}s)")
+
+        # The pre-change behaviour: stylesheet embedded in every document and parsed every time
+        inline = [html.replace('<head>', f'<head><style>{pdf.TICKET_CSS}</style>', 1) for html in html_list]
+        run('inline CSS, cold parse', lambda: [weasyprint.HTML(string=html).write_pdf() for html in inline])
+
+        pdf.warm()
+        run('pre-parsed CSS, 1 process', lambda: [pdf.render_pdf(html) for html in html_list])
+
+        processes = options['processes'] or os.cpu_count() or 1
+        with ProcessPoolExecutor(max_workers=processes, initializer=pdf.warm) as pool:
+            list(pool.map(pdf.render_pdf, html_list[:processes * 2]))  # start and warm every process
+            run(f'pre-parsed CSS, {processes} processes', lambda: list(pool.map(pdf.render_pdf, html_list)))
+
+    def _qr(self, booking):
+        return base64.b64encode(qr.render_png(qr.booking_qr_payload(booking), qr.EMAIL)).decode('utf-8')
+
+    def _sample_bookings(self, count):
+        # Unsaved objects: the benchmark needs no database rows
+        event = Event(title='Colour Carnival 1.0', venue_name='Pandhurang Lawns')
+        ticket_type = TicketType(event=event, name='Early Bird Couple', price=599)
+        return [
+            Booking(
+                id=i, ticket_type=ticket_type, customer_name=f'Guest {i}', customer_email=f'guest{i}@example.com',
+                customer_phone='9999999999', quantity=2, total_amount=1198, payment_id=f'pay_bench{i:06d}',
+            )
+            for i in range(1, count + 1)
+        ]
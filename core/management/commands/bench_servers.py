@@ -0,0 +1,177 @@
+import math
+import os
+import re
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+
+import requests
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from core.checks import shared_cache
+from core.models import Event, TicketType
+from core.stubs import start_stubs
+
+CSRF_RE = re.compile(r'name="csrfmiddlewaretoken" value="([^"]+)"')
+
+
+def _percentile(values, p):
+    return values[max(math.ceil(p / 100 * len(values)) - 1, 0)] if values else 0
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+class Command(BaseCommand):
+    help = (
+        "Concurrent-request capacity of the sync (WSGI, gthread) and async (ASGI, uvicorn) server modes "
+        "of gunicorn.conf.py: buyers hammer checkout, whose Razorpay call goes to a stub with a fixed delay, "
+        "while a probe measures how quickly the rest of the site still answers."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--modes', nargs='+', choices=('sync', 'async'), default=['sync', 'async'])
+        parser.add_argument('--workers', type=int, default=2, help='WEB_CONCURRENCY for both modes')
+        parser.add_argument('--threads', type=int, default=4, help='GUNICORN_THREADS (sync mode)')
+        parser.add_argument('--concurrency', type=int, nargs='+', default=[8, 32, 64], help='Concurrent buyers per step')
+        parser.add_argument('--duration', type=float, default=10, help='Seconds per step')
+        parser.add_argument('--provider-latency-ms', type=int, default=300, help='Delay of the stubbed Razorpay orders API')
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'postgresql':
+            self.stderr.write(self.style.WARNING(
+                f'Running on {connection.vendor}: concurrent writers will fail with "database is locked". '
+                'Point DATABASE_URL at PostgreSQL for numbers that mean anything.'
+            ))
+        event = Event.objects.create(
+            title='bench_servers', description='', venue_name='-', venue_address='-', is_published=True,
+        )
+        ticket = TicketType.objects.create(event=event, name='General', price=499, quantity_available=10 ** 6)
+        stubs = start_stubs(options['provider_latency_ms'] / 1000)
+        try:
+            self.stdout.write(
+                f"{'mode':<6} {'buyers':>6} {'checkouts/s':>11} {'p50 ms':>8} {'p99 ms':>8} {'errors':>6}"
+                f"   {'probe p50':>9} {'probe p99':>9}"
+            )
+            for mode in options['modes']:
+                with self._server(mode, stubs, options) as url:
+                    for concurrency in options['concurrency']:
+                        self._step(mode, url, event, ticket, concurrency, options['duration'])
+        finally:
+            stubs.stop()
+            event.delete()
+
+    @contextmanager
+    def _server(self, mode, stubs, options):
+        """Run gunicorn with gunicorn.conf.py in `mode` on a free port; yields its URL."""
+        port = _free_port()
+        cache_dir = tempfile.mkdtemp(prefix='bench_servers-cache-')
+        env = dict(
+            os.environ,
+            **stubs.settings(),
+            WEB_SERVER_MODE=mode,
+            WEB_CONCURRENCY=str(options['workers']),
+            GUNICORN_THREADS=str(options['threads']),
+            LOCAL_PAYMENT_BYPASS='False',
+            PAYMENT_GATEWAY='razorpay',
+            WAITING_ROOM_RATE='0',
+            # The workers need a cache they share (core.checks)
+            CACHE_URL=settings.CACHE_URL if shared_cache() else f'file://{cache_dir}',
+            CELERY_BROKER_URL='memory://',  # nothing is delivered: no worker runs here
+        )
+        with tempfile.TemporaryFile() as log:
+            process = subprocess.Popen(
+                [sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py', '--bind', f'127.0.0.1:{port}'],
+                cwd=settings.BASE_DIR, env=env, stdout=log, stderr=subprocess.STDOUT,
+            )
+            url = f'http://127.0.0.1:{port}'
+            try:
+                deadline = time.monotonic() + 60
+                while True:
+                    try:
+                        requests.get(f'{url}/terms/', timeout=1)
+                        break
+                    except requests.RequestException:
+                        if process.poll() is not None or time.monotonic() > deadline:
+                            log.seek(0)
+                            raise CommandError(f'{mode} server did not start:\n{log.read().decode()[-2000:]}')
+                        time.sleep(0.2)
+                yield url
+            finally:
+                process.terminate()
+                try:
+                    process.wait(timeout=30)
+                except subprocess.TimeoutExpired:
+                    process.kill()
+                shutil.rmtree(cache_dir, ignore_errors=True)
+
+    def _step(self, mode, url, event, ticket, concurrency, duration):
+        latencies, probes = [], []
+        errors = [0]
+        lock = threading.Lock()
+        deadline = time.monotonic() + duration
+
+        def buyer(n):
+            http = requests.Session()
+            try:
+                csrf = CSRF_RE.search(http.get(f'{url}/', timeout=60).text).group(1)
+            except (requests.RequestException, AttributeError):
+                with lock:
+                    errors[0] += 1
+                return
+            while time.monotonic() < deadline:
+                start = time.perf_counter()
+                try:
+                    response = http.post(f'{url}/checkout/{event.id}/', {
+                        'csrfmiddlewaretoken': csrf,
+                        'customer_name': f'Buyer {n}',
+                        'customer_email': f'buyer{n}@example.com',
+                        'customer_phone': f'9{n:09d}'[-10:],
+                        f'qty_{ticket.id}': 1,
+                    }, allow_redirects=False, timeout=60)
+                    ok = response.headers.get('Location', '').endswith('/checkout/')
+                except requests.RequestException:
+                    ok = False
+                with lock:
+                    if ok:
+                        latencies.append((time.perf_counter() - start) * 1000)
+                    else:
+                        errors[0] += 1
+
+        def probe():
+            # A page that needs neither Razorpay nor the database: is anyone left to serve it?
+            http = requests.Session()
+            while time.monotonic() < deadline:
+                start = time.perf_counter()
+                try:
+                    http.get(f'{url}/terms/', timeout=60)
+                    probes.append((time.perf_counter() - start) * 1000)
+                except requests.RequestException:
+                    pass
+                time.sleep(0.05)
+
+        threads = [threading.Thread(target=buyer, args=(n,)) for n in range(concurrency)]
+        threads.append(threading.Thread(target=probe))
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+
+        latencies.sort()
+        probes.sort()
+        self.stdout.write(
+            f'{mode:<6} {concurrency:>6} {len(latencies) / elapsed:>11.1f} {_percentile(latencies, 50):>8.0f} '
+            f'{_percentile(latencies, 99):>8.0f} {errors[0]:>6}   {_percentile(probes, 50):>9.0f} {_percentile(probes, 99):>9.0f}'
+        )
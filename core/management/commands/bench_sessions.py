@@ -0,0 +1,61 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext, override_settings
+
+from core.models import Event, TicketArtifact, TicketType
+
+WRITES = ('INSERT', 'UPDATE', 'DELETE')
+
+
+class Command(BaseCommand):
+    help = (
+        "Database cost of each session backend over the session-using checkout steps "
+        "(checkout, checkout page, payment_verify): session queries, writes and total queries."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--checkouts', type=int, default=50, help='Checkouts per backend')
+
+    def handle(self, *args, **options):
+        event = Event.objects.create(title='bench_sessions', description='', venue_name='-', venue_address='-')
+        ticket = TicketType.objects.create(event=event, name='General', price=499, quantity_available=10 ** 6)
+        try:
+            self.stdout.write(
+                f"{'backend':<16} {'session queries':>16} {'db writes':>10} {'session writes':>15} {'queries':>8} {'ms':>7}  (per checkout)"
+            )
+            for name, engine in settings.SESSION_ENGINES.items():
+                self._run(name, engine, event, ticket, options['checkouts'])
+        finally:
+            order_ids = list(event.orders.values_list('order_id', flat=True))
+            TicketArtifact.objects.filter(order_id__in=order_ids).delete()
+            event.delete()
+
+    def _run(self, name, engine, event, ticket, checkouts):
+        captured = []
+        start = time.perf_counter()
+        # Bypass payments: the gateway isn't what's measured. Delivery stays unconfigured.
+        with override_settings(SESSION_ENGINE=engine, LOCAL_PAYMENT_BYPASS=True, RESEND_API_KEY='', WHATSAPP_ACCESS_TOKEN=''):
+            for n in range(checkouts):
+                client = Client()  # a new browser, and middleware loaded with this engine
+                with CaptureQueriesContext(connection) as queries:
+                    client.post(f'/checkout/{event.id}/', {
+                        'customer_name': f'Buyer {n}', 'customer_email': f'buyer{n}@example.com',
+                        'customer_phone': '9999999999', f'qty_{ticket.id}': 1,
+                    })
+                    order_id = client.session['checkout']['order_id']
+                    client.get('/checkout/')
+                    client.post('/payment/verify/', {'razorpay_order_id': order_id, 'bypass': 'true'})
+                captured += [query['sql'] for query in queries.captured_queries]
+        elapsed = time.perf_counter() - start
+
+        session = [sql for sql in captured if 'django_session' in sql]
+        writes = [sql for sql in captured if sql.lstrip().upper().startswith(WRITES)]
+        session_writes = [sql for sql in writes if 'django_session' in sql]
+        self.stdout.write(
+            f'{name:<16} {len(session) / checkouts:>16.1f} {len(writes) / checkouts:>10.1f} '
+            f'{len(session_writes) / checkouts:>15.1f} {len(captured) / checkouts:>8.1f} {elapsed / checkouts * 1000:>7.1f}'
+        )
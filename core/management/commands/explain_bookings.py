@@ -0,0 +1,121 @@
+import random
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.db.models import Sum
+from django.utils import timezone
+
+from core.models import Booking, Event, Order, TicketType
+from core.reservations import RESERVATION_TTL
+
+SEED_TITLE = 'explain_bookings seed'
+
+
+class Command(BaseCommand):
+    help = (
+        "EXPLAIN the hot Order and Booking queries (payment_verify, webhooks, download_ticket, expiry, attendees) "
+        "against a seeded dataset, to check index use on SQLite and PostgreSQL. "
+        "Seed into a throwaway database: the rows are kept between runs."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=1_000_000, help='Bookings to seed (two per order) if the seed event has fewer')
+        parser.add_argument('--analyze', action='store_true', help='PostgreSQL: run EXPLAIN ANALYZE (executes the queries)')
+        parser.add_argument('--drop', action='store_true', help='Delete the seeded event, its orders and bookings, then exit')
+
+    def handle(self, *args, **options):
+        event = Event.objects.filter(title=SEED_TITLE).first()
+        if options['drop']:
+            if event:
+                event.delete()
+            self.stdout.write('Seed data removed.')
+            return
+
+        event = event or Event.objects.create(title=SEED_TITLE, description='', venue_name='-', venue_address='-')
+        self._seed(event, options['rows'])
+
+        sample = Order.objects.filter(event=event, status='paid').order_by('id').first()
+        now = timezone.now()
+        queries = [
+            ('payment_verify: the order',
+             Order.objects.filter(order_id=sample.order_id)),
+            ('payment_verify: its bookings (prefetch)',
+             Booking.objects.filter(order_id__in=[sample.order_id]).order_by('id')),
+            ('payment_verify / webhooks (mark_paid): pending bookings of the orders paid',
+             Booking.objects.filter(order_id__in=[sample.order_id], status='pending').order_by('id')),
+            ('payment_verify / webhooks (recover_failed): failed orders paid for',
+             Order.objects.filter(order_id__in=[sample.order_id], status='failed')),
+            ('download_ticket: is the order paid',
+             Order.objects.filter(order_id=sample.order_id, status='paid')),
+            ('release_order / expire_reservations: fail the bookings of an order',
+             Booking.objects.filter(order_id__in=[sample.order_id], status='pending')),
+            ('expire_reservations: orphaned pending orders',
+             Order.objects.filter(status='pending', created_at__lte=now - RESERVATION_TTL)),
+            ('expire_reservations: pending bookings without an order',
+             Booking.objects.filter(status='pending', order__isnull=True, created_at__lte=now - RESERVATION_TTL)),
+            ('attendees: paid bookings, newest first',
+             Booking.objects.filter(ticket_type__event=event, status='paid').order_by('-created_at')[:50]),
+            ('attendees: totals',
+             Booking.objects.filter(ticket_type__event=event, status='paid').values('status')
+             .annotate(revenue=Sum('total_amount'), sold=Sum('quantity'))),
+        ]
+        explain_options = {'analyze': True} if options['analyze'] and connection.vendor == 'postgresql' else {}
+        for label, queryset in queries:
+            self.stdout.write(self.style.MIGRATE_HEADING(label))
+            self.stdout.write(queryset.explain(**explain_options))
+            self.stdout.write('')
+
+    def _seed(self, event, rows):
+        # Two bookings per order, as a checkout with two ticket types makes
+        existing = Order.objects.filter(event=event).count()
+        orders = (rows + 1) // 2
+        if existing >= orders:
+            return
+        tickets = list(event.ticket_types.all()) or [
+            TicketType.objects.create(event=event, name=name, price=price, quantity_available=rows)
+            for name, price in (('Early Bird', 499), ('Regular', 699), ('Couple', 1199), ('VIP', 2499))
+        ]
+        self.stdout.write(f'Seeding {orders - existing} orders, {(orders - existing) * 2} bookings...')
+        start = time.perf_counter()
+        rng = random.Random(existing)
+        now = timezone.now()
+        batch_size = 10_000
+        # Spread created_at over two months; auto_now_add would stamp every row with now
+        created_fields = [Order._meta.get_field('created_at'), Booking._meta.get_field('created_at')]
+        for field in created_fields:
+            field.auto_now_add = False
+        try:
+            for offset in range(existing, orders, batch_size):
+                order_batch, booking_batch = [], []
+                for n in range(offset, min(offset + batch_size, orders)):
+                    # ~90% paid, ~7% failed, ~3% pending
+                    status = rng.choices(('paid', 'failed', 'pending'), weights=(90, 7, 3))[0]
+                    created = now - timedelta(seconds=rng.randrange(60 * 24 * 3600))
+                    order_id = f'order_seed{n:08d}'
+                    payment_id = f'pay_seed{n:08d}' if status == 'paid' else None
+                    lines = []
+                    for i in (2 * n, 2 * n + 1):
+                        ticket = rng.choice(tickets)
+                        quantity = rng.randint(1, 4)
+                        lines.append(Booking(
+                            ticket_type=ticket, customer_name=f'Guest {n}', customer_email=f'guest{n}@example.com',
+                            customer_phone=f'9{n:09d}'[-10:], quantity=quantity, total_amount=ticket.price * quantity,
+                            order_id=order_id, payment_id=payment_id, status=status, created_at=created,
+                        ))
+                    order_batch.append(Order(
+                        order_id=order_id, event=event, customer_name=f'Guest {n}', customer_email=f'guest{n}@example.com',
+                        customer_phone=f'9{n:09d}'[-10:], total_amount=sum(line.total_amount for line in lines),
+                        payment_id=payment_id, status=status, created_at=created,
+                    ))
+                    booking_batch.extend(lines)
+                with transaction.atomic():
+                    Order.objects.bulk_create(order_batch)
+                    Booking.objects.bulk_create(booking_batch)
+        finally:
+            for field in created_fields:
+                field.auto_now_add = True
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+        self.stdout.write(f'Seeded in {time.perf_counter() - start:.1f}s.')
@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from core.manifest import HEADER, build_manifest
+from core.models import Event
+
+
+class Command(BaseCommand):
+    help = "Write an event's offline gate manifest to a file, for loading onto scanners without a network."
+
+    def add_arguments(self, parser):
+        parser.add_argument('event_id', type=int)
+        parser.add_argument('output', help='File to write')
+        parser.add_argument('--since', type=int, help='Write a delta since this manifest version')
+
+    def handle(self, *args, **options):
+        try:
+            event = Event.objects.get(id=options['event_id'])
+        except Event.DoesNotExist:
+            raise CommandError(f"Event {options['event_id']} does not exist.")
+        data = build_manifest(event, options['since'])
+        with open(options['output'], 'wb') as f:
+            f.write(data)
+        *_, version, _, count, _ = HEADER.unpack_from(data)
+        self.stdout.write(f"{count} tickets, {len(data)} bytes, version {version} -> {options['output']}")
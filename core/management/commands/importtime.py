@@ -0,0 +1,93 @@
+import json
+import os
+import statistics
+import subprocess
+import sys
+from collections import Counter
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+HEAVY = ('weasyprint', 'qrcode', 'PIL', 'razorpay', 'celery', 'requests')
+
+# Run in a fresh interpreter: what a gunicorn worker does from start to its first response
+WEB = """
+import io, json, os, sys, time
+start = time.perf_counter()
+from pune_color_festival.wsgi import application
+loaded = time.perf_counter()
+statuses = []
+environ = {
+    'REQUEST_METHOD': 'GET', 'PATH_INFO': os.environ['IMPORTTIME_PATH'], 'QUERY_STRING': '',
+    'SERVER_NAME': os.environ['IMPORTTIME_HOST'], 'SERVER_PORT': '443', 'HTTP_HOST': os.environ['IMPORTTIME_HOST'],
+    'SERVER_PROTOCOL': 'HTTP/1.1', 'wsgi.url_scheme': 'https', 'wsgi.input': io.BytesIO(), 'wsgi.errors': sys.stderr,
+}
+response = application(environ, lambda status, headers, exc_info=None: statuses.append(status))
+b''.join(response)
+response.close()
+done = time.perf_counter()
+print(json.dumps({'load': loaded - start, 'ready': done - start, 'status': statuses[0],
+                  'heavy': [name for name in HEAVY if name in sys.modules]}))
+"""
+
+# ... and what a Celery worker does before it takes its first task
+WORKER = """
+import json, sys, time
+start = time.perf_counter()
+from pune_color_festival.celery import app
+loaded = time.perf_counter()
+app.loader.import_default_modules()
+done = time.perf_counter()
+print(json.dumps({'load': loaded - start, 'ready': done - start, 'status': '-',
+                  'heavy': [name for name in HEAVY if name in sys.modules]}))
+"""
+
+
+class Command(BaseCommand):
+    help = (
+        "Cold start of a web worker (to its first response) or a Celery worker (to its tasks loaded), "
+        "in fresh interpreters, with a `python -X importtime` profile by package."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--process', choices=('web', 'worker'), default='web')
+        parser.add_argument('--path', default='/', help='URL of the first request (web)')
+        parser.add_argument('--runs', type=int, default=5)
+        parser.add_argument('--top', type=int, default=15, help='Packages to list in the import profile')
+
+    def handle(self, *args, **options):
+        script = f'HEAVY = {HEAVY!r}\n' + (WEB if options['process'] == 'web' else WORKER)
+        hosts = [host for host in settings.ALLOWED_HOSTS if host not in ('*', '') and not host.startswith('.')]
+        env = dict(
+            os.environ,
+            IMPORTTIME_PATH=options['path'],
+            IMPORTTIME_HOST=hosts[0] if hosts else 'localhost',
+        )
+
+        runs = [json.loads(self._python(['-c', script], env).stdout.strip().splitlines()[-1]) for _ in range(options['runs'])]
+        last = runs[-1]
+        label = 'first response' if options['process'] == 'web' else 'tasks loaded'
+        self.stdout.write(f"{options['process']} cold start, median of {len(runs)} runs:")
+        self.stdout.write(f"  app imported    {statistics.median(run['load'] for run in runs) * 1000:8.1f} ms")
+        self.stdout.write(f"  {label:<15} {statistics.median(run['ready'] for run in runs) * 1000:8.1f} ms  ({last['status']})")
+        self.stdout.write(f"  heavy packages loaded: {', '.join(last['heavy']) or 'none'}")
+
+        profile = self._python(['-X', 'importtime', '-c', script], env).stderr
+        by_package = Counter()
+        for line in profile.splitlines():
+            # import time: self [us] | cumulative | imported package
+            if not line.startswith('import time:') or 'self [us]' in line:
+                continue
+            own, _cumulative, name = line[len('import time:'):].split('|')
+            by_package[name.strip().split('.')[0]] += int(own)
+        self.stdout.write(f"\nimport time by top-level package (self time, {sum(by_package.values()) / 1000:.1f} ms total):")
+        for package, micros in by_package.most_common(options['top']):
+            self.stdout.write(f"  {package:<28} {micros / 1000:8.1f} ms")
+
+    def _python(self, args, env):
+        result = subprocess.run(
+            [sys.executable, *args], env=env, cwd=settings.BASE_DIR, capture_output=True, text=True,
+        )
+        if result.returncode:
+            raise CommandError(f'Cold start run failed:\n{result.stderr[-2000:]}')
+        return result
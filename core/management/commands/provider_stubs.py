@@ -0,0 +1,30 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from core.stubs import start_stubs
+
+
+class Command(BaseCommand):
+    help = (
+        "Run the Razorpay, Resend and Meta stubs (core.stubs) in the foreground, for load-testing "
+        "a server started separately. Prints the environment that server needs."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--host', default='127.0.0.1')
+        parser.add_argument('--port', type=int, default=8701, help='Razorpay on PORT, Resend on PORT+1, Meta on PORT+2')
+        parser.add_argument('--latency-ms', type=int, default=50, help='Delay before every stub response')
+
+    def handle(self, *args, **options):
+        stubs = start_stubs(options['latency_ms'] / 1000, options['host'], options['port'])
+        for name, url in stubs.settings().items():
+            self.stdout.write(f'{name}={url}')
+        self.stdout.write('LOCAL_PAYMENT_BYPASS=False PAYMENT_GATEWAY=razorpay')
+        self.stdout.write('RESEND_API_KEY, WHATSAPP_PHONE_NUMBER_ID and WHATSAPP_ACCESS_TOKEN: any non-empty value')
+        try:
+            while True:
+                time.sleep(10)
+                self.stdout.write(f'calls: {stubs.calls()}')
+        except KeyboardInterrupt:
+            stubs.stop()
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from core.sales import rebuild_all
+
+
+class Command(BaseCommand):
+    help = "Recompute the TicketSales rollup from paid bookings (repair after manual edits)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('event_ids', nargs='*', type=int, help='Only these events (default: all)')
+
+    def handle(self, *args, **options):
+        rows = rebuild_all(options['event_ids'])
+        self.stdout.write(
+            f"Rebuilt {len(rows)} ticket types: {sum(row.sold for row in rows)} tickets, "
+            f"revenue {sum(row.revenue for row in rows)}"
+        )
@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from core.inventory import reshard
+from core.models import TicketType
+
+
+class Command(BaseCommand):
+    help = "Split a ticket type's stock across N inventory counters (0 merges it back onto the ticket type)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('ticket_type_id', type=int)
+        parser.add_argument('shards', type=int, help='Number of counter rows, e.g. 16 for a hot Early Bird tier')
+
+    def handle(self, *args, **options):
+        if not 0 <= options['shards'] <= 256:
+            raise CommandError('shards must be between 0 and 256.')
+        try:
+            ticket = reshard(options['ticket_type_id'], options['shards'])
+        except TicketType.DoesNotExist:
+            raise CommandError(f"Ticket type {options['ticket_type_id']} does not exist.")
+        if ticket.inventory_shards:
+            self.stdout.write(self.style.SUCCESS(f'{ticket}: stock split across {ticket.inventory_shards} shards.'))
+        else:
+            self.stdout.write(self.style.SUCCESS(f'{ticket}: {ticket.quantity_available} left, not sharded.'))
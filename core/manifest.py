@@ -0,0 +1,162 @@
+"""
+Offline gate manifest.
+
+Scanners at the venue can't count on reaching the server, so before gates open they
+download every paid ticket of the event as one small binary file and check tokens
+against it locally. Afterwards they pull deltas (new sales and other gates'
+check-ins) whenever they get a connection, and push their own check-ins back in
+batches to /gate/checkins/.
+
+Layout, little-endian:
+
+    header  4s magic b'CCGM', B format (1), B kind (0 full, 1 delta), B signature
+            bytes S, B bloom hashes k, I event id, q version, q since,
+            I entry count, I bloom length in bytes
+    entries sorted by booking id, each: I booking id, H quantity, B flags
+            (1 = checked in), S bytes signature prefix
+    bloom   bloom filter over the booking ids (full manifests only)
+
+A token is genuine offline if its id is in the entries with the same quantity and
+its signature starts with the stored prefix; the bloom filter lets a device drop
+unknown ids before the binary search. Bit i of the filter is set for an id when
+i = (h1 + j * h2) mod (8 * bloom length) for some j < k, where h1 and h2 are the two
+little-endian uint64 halves of blake2b(id as uint32 LE, digest_size=16).
+
+Versions are server timestamps in microseconds. A delta since version v holds every
+booking paid or checked in from GATE_MANIFEST_OVERLAP seconds before v, so
+transactions that committed late aren't missed; entries are upserts, and applying
+one twice is harmless.
+"""
+import base64
+import hashlib
+import struct
+from bisect import bisect_left
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.db.models import Q
+from django.utils import timezone
+
+from .gate import TOKEN_PREFIX, token_digest
+from .models import Booking
+
+GATE_MANIFEST_OVERLAP = getattr(settings, 'GATE_MANIFEST_OVERLAP', 120)
+
+MAGIC = b'CCGM'
+FORMAT = 1
+FULL, DELTA = 0, 1
+CHECKED_IN = 1
+SIGNATURE_BYTES = 4
+BLOOM_BITS_PER_ENTRY = 10
+BLOOM_HASHES = 7  # ~1% false positives at 10 bits per entry
+
+HEADER = struct.Struct('<4sBBBBIqqII')
+ENTRY = struct.Struct(f'<IHB{SIGNATURE_BYTES}s')
+
+
+def to_version(moment):
+    return int(moment.timestamp() * 1_000_000)
+
+
+def from_version(version):
+    return datetime.fromtimestamp(version / 1_000_000, tz=dt_timezone.utc)
+
+
+def _bloom_positions(booking_id, bits):
+    digest = hashlib.blake2b(struct.pack('<I', booking_id), digest_size=16).digest()
+    h1, h2 = struct.unpack('<QQ', digest)
+    return [(h1 + j * h2) % bits for j in range(BLOOM_HASHES)]
+
+
+def _bloom(booking_ids):
+    bloom = bytearray(max(1, (len(booking_ids) * BLOOM_BITS_PER_ENTRY + 7) // 8))
+    for booking_id in booking_ids:
+        for bit in _bloom_positions(booking_id, len(bloom) * 8):
+            bloom[bit >> 3] |= 1 << (bit & 7)
+    return bytes(bloom)
+
+
+def build_manifest(event, since=None):
+    """The manifest of `event`'s paid tickets as bytes; a delta if `since` (a version) is given."""
+    now = timezone.now()
+    bookings = Booking.objects.filter(ticket_type__event=event, status='paid')
+    if since is not None:
+        cutoff = from_version(since) - timedelta(seconds=GATE_MANIFEST_OVERLAP)
+        bookings = bookings.filter(Q(paid_at__gte=cutoff) | Q(checked_in_at__gte=cutoff))
+    rows = list(bookings.order_by('id').values_list('id', 'quantity', 'checked_in_at'))
+
+    entries = b''.join(
+        ENTRY.pack(
+            booking_id, quantity, CHECKED_IN if checked_in_at else 0,
+            token_digest(booking_id, quantity)[:SIGNATURE_BYTES],
+        )
+        for booking_id, quantity, checked_in_at in rows
+    )
+    bloom = _bloom([row[0] for row in rows]) if since is None else b''
+    header = HEADER.pack(
+        MAGIC, FORMAT, FULL if since is None else DELTA, SIGNATURE_BYTES, BLOOM_HASHES,
+        event.id, to_version(now), since or 0, len(rows), len(bloom),
+    )
+    return header + entries + bloom
+
+
+class Manifest:
+    """Reference reader, as a scanner device would use it: load a full manifest, apply deltas, look tokens up."""
+
+    def __init__(self, data):
+        magic, fmt, kind, signature_bytes, self.bloom_hashes, self.event_id, self.version, _, count, bloom_length = (
+            HEADER.unpack_from(data)
+        )
+        if magic != MAGIC or fmt != FORMAT or kind != FULL or signature_bytes != SIGNATURE_BYTES:
+            raise ValueError('Not a full gate manifest this reader understands.')
+        self.ids, self.entries = [], []
+        for booking_id, quantity, flags, signature in ENTRY.iter_unpack(data[HEADER.size:HEADER.size + count * ENTRY.size]):
+            self.ids.append(booking_id)
+            self.entries.append([quantity, flags, signature])
+        self.bloom = bytearray(data[HEADER.size + count * ENTRY.size:][:bloom_length])
+
+    def apply(self, data):
+        """Merge a delta into this manifest."""
+        magic, fmt, kind, _, _, event_id, version, _, count, _ = HEADER.unpack_from(data)
+        if magic != MAGIC or fmt != FORMAT or kind != DELTA or event_id != self.event_id:
+            raise ValueError('Not a delta for this manifest.')
+        for booking_id, quantity, flags, signature in ENTRY.iter_unpack(data[HEADER.size:HEADER.size + count * ENTRY.size]):
+            i = bisect_left(self.ids, booking_id)
+            if i < len(self.ids) and self.ids[i] == booking_id:
+                self.entries[i][1] |= flags
+            else:
+                self.ids.insert(i, booking_id)
+                self.entries.insert(i, [quantity, flags, signature])
+                for bit in _bloom_positions(booking_id, len(self.bloom) * 8):
+                    self.bloom[bit >> 3] |= 1 << (bit & 7)
+        self.version = max(self.version, version)
+
+    def _find(self, token):
+        try:
+            prefix, booking_id, quantity, signature = token.strip().split('.')
+            booking_id, quantity = int(booking_id, 36), int(quantity)
+            signature = base64.urlsafe_b64decode(signature)
+        except ValueError:
+            return None
+        if prefix != TOKEN_PREFIX:
+            return None
+        if not all(self.bloom[bit >> 3] & (1 << (bit & 7)) for bit in _bloom_positions(booking_id, len(self.bloom) * 8)):
+            return None
+        i = bisect_left(self.ids, booking_id)
+        if i == len(self.ids) or self.ids[i] != booking_id:
+            return None
+        entry = self.entries[i]
+        if entry[0] != quantity or not signature.startswith(entry[2]):
+            return None
+        return booking_id, entry
+
+    def scan(self, token):
+        """'admitted' (and marks the ticket used locally), 'already_checked_in' or 'invalid'."""
+        found = self._find(token)
+        if found is None:
+            return 'invalid'
+        _, entry = found
+        if entry[1] & CHECKED_IN:
+            return 'already_checked_in'
+        entry[1] |= CHECKED_IN
+        return 'admitted'
@@ -0,0 +1,27 @@
+# Generated by Django 6.0.2 on 2026-10-18 10:51
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0007_qrimage'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TicketArtifact',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('order_id', models.CharField(max_length=100)),
+                ('kind', models.CharField(choices=[('html', 'HTML'), ('pdf', 'PDF')], max_length=10)),
+                ('content', models.BinaryField()),
+                ('etag', models.CharField(max_length=64)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('order_id', 'kind'), name='unique_artifact_per_order')],
+            },
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 6.0.2 on 2026-10-18 10:57
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0009_reservation'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='tickettype',
+            name='inventory_shards',
+            field=models.PositiveSmallIntegerField(default=0, help_text='Counter rows stock is split across (0 = not sharded). Change with `manage.py shard_inventory`.'),
+        ),
+        migrations.CreateModel(
+            name='InventoryShard',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('index', models.PositiveSmallIntegerField()),
+                ('quantity', models.IntegerField(default=0)),
+                ('ticket_type', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='shards', to='core.tickettype')),
+            ],
+        ),
+        migrations.AddField(
+            model_name='reservation',
+            name='shard',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='reservations', to='core.inventoryshard'),
+        ),
+        migrations.AddConstraint(
+            model_name='inventoryshard',
+            constraint=models.UniqueConstraint(fields=('ticket_type', 'index'), name='unique_shard_per_ticket_type'),
+        ),
+    ]
@@ -0,0 +1,62 @@
+# Generated by Django 6.0.2 on 2026-10-18 11:20
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def create_orders(apps, schema_editor):
+    """One Order per distinct Booking.order_id, built from its bookings."""
+    Booking = apps.get_model('core', 'Booking')
+    Order = apps.get_model('core', 'Order')
+    # Keep the first booking's created_at instead of stamping the migration time
+    Order._meta.get_field('created_at').auto_now_add = False
+    orders = {}
+    bookings = (
+        Booking.objects.exclude(order_id__isnull=True).exclude(order_id='')
+        .select_related('ticket_type').order_by('id').iterator(chunk_size=2000)
+    )
+    for booking in bookings:
+        order = orders.get(booking.order_id)
+        if order is None:
+            order = orders[booking.order_id] = Order(
+                order_id=booking.order_id,
+                event_id=booking.ticket_type.event_id,
+                customer_name=booking.customer_name,
+                customer_email=booking.customer_email,
+                customer_phone=booking.customer_phone,
+                total_amount=0,
+                status='failed',
+                created_at=booking.created_at,
+            )
+        order.total_amount += booking.total_amount
+        # paid if any line was paid, else pending if any line still is
+        if booking.status == 'paid' or (booking.status == 'pending' and order.status == 'failed'):
+            order.status = booking.status
+        order.payment_id = order.payment_id or booking.payment_id
+    Order.objects.bulk_create(orders.values(), batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0012_paymentevent'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Order',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('order_id', models.CharField(max_length=100, unique=True)),
+                ('customer_name', models.CharField(max_length=100)),
+                ('customer_email', models.EmailField(max_length=254)),
+                ('customer_phone', models.CharField(max_length=15)),
+                ('total_amount', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('payment_id', models.CharField(blank=True, max_length=100, null=True)),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('paid', 'Paid'), ('failed', 'Failed')], default='pending', max_length=20)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('event', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='orders', to='core.event')),
+            ],
+        ),
+        migrations.RunPython(create_orders, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,47 @@
+# Generated by Django 6.0.2 on 2026-10-18 11:20
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    # Separate from 0013 so PostgreSQL adds the constraint outside the data migration's transaction
+
+    dependencies = [
+        ('core', '0013_order'),
+    ]
+
+    operations = [
+        # Booking.order_id (CharField) becomes the `order` foreign key on the same column,
+        # pointing at Order.order_id: the data stays put, only the constraint is added.
+        migrations.SeparateDatabaseAndState(
+            database_operations=[
+                migrations.AlterField(
+                    model_name='booking',
+                    name='order_id',
+                    field=models.ForeignKey(
+                        blank=True, db_column='order_id', db_index=False, null=True,
+                        on_delete=django.db.models.deletion.CASCADE, related_name='bookings',
+                        to='core.order', to_field='order_id',
+                    ),
+                ),
+            ],
+            state_operations=[
+                migrations.RemoveIndex(model_name='booking', name='booking_order_status'),
+                migrations.RemoveField(model_name='booking', name='order_id'),
+                migrations.AddField(
+                    model_name='booking',
+                    name='order',
+                    field=models.ForeignKey(
+                        blank=True, db_column='order_id', db_index=False, null=True,
+                        on_delete=django.db.models.deletion.CASCADE, related_name='bookings',
+                        to='core.order', to_field='order_id',
+                    ),
+                ),
+                migrations.AddIndex(
+                    model_name='booking',
+                    index=models.Index(fields=['order', 'status'], name='booking_order_status'),
+                ),
+            ],
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 6.0.2 on 2026-10-18 11:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0015_booking_checked_in_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='booking',
+            name='paid_at',
+            field=models.DateTimeField(blank=True, db_index=True, null=True),
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 6.0.2 on 2026-10-18 11:16
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0016_booking_paid_at'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TicketSales',
+            fields=[
+                ('ticket_type', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='sales', serialize=False, to='core.tickettype')),
+                ('sold', models.PositiveIntegerField(default=0)),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('event', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='ticket_sales', to='core.event')),
+            ],
+        ),
+    ]
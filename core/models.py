@@ -22,10 +22,38 @@ class TicketType(models.Model):
     price = models.DecimalField(max_digits=10, decimal_places=2)
     quantity_available = models.IntegerField()
     description = models.TextField(blank=True)
+    inventory_shards = models.PositiveSmallIntegerField(default=0, help_text="Counter rows stock is split across (0 = not sharded). Change with `manage.py shard_inventory`.")
 
     def __str__(self):
         return f"{self.name} - {self.event.title}"
 
+class Order(models.Model):
+    """One checkout: the gateway order, the buyer and the order-level payment state. Its lines are Bookings."""
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('paid', 'Paid'),
+        ('failed', 'Failed'),
+        ('refund_due', 'Refund due'), # paid after it failed, and the stock was gone (core.orders.recover_failed)
+    ]
+    order_id = models.CharField(max_length=100, unique=True) # Razorpay order ID
+    event = models.ForeignKey(Event, related_name='orders', on_delete=models.CASCADE)
+    customer_name = models.CharField(max_length=100)
+    customer_email = models.EmailField()
+    customer_phone = models.CharField(max_length=15)
+    total_amount = models.DecimalField(max_digits=10, decimal_places=2)
+    payment_id = models.CharField(max_length=100, blank=True, null=True) # Razorpay payment ID
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            # stale pending orders (expire_reservations): small, rows leave it once paid or failed
+            models.Index(fields=['created_at'], name='order_pending_created', condition=models.Q(status='pending')),
+        ]
+
+    def __str__(self):
+        return f"{self.order_id} - {self.customer_name} ({self.status})"
+
 class Booking(models.Model):
     STATUS_CHOICES = [
         ('pending', 'Pending'),
@@ -39,10 +67,170 @@ class Booking(models.Model):
     quantity = models.IntegerField(default=1)
     total_amount = models.DecimalField(max_digits=10, decimal_places=2)
     payment_id = models.CharField(max_length=100, blank=True, null=True) # Razorpay payment ID
-    order_id = models.CharField(max_length=100, blank=True, null=True) # Razorpay order ID
+    # Stored in the order_id column as the Razorpay order ID, so booking.order_id is that string.
+    # Not indexed on its own: booking_order_status covers it.
+    order = models.ForeignKey(
+        Order, to_field='order_id', db_column='order_id', related_name='bookings', on_delete=models.CASCADE,
+        blank=True, null=True, db_index=False,
+    )
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
     created_at = models.DateTimeField(auto_now_add=True)
+    paid_at = models.DateTimeField(blank=True, null=True, db_index=True) # set by mark_paid; gate manifest deltas
+    checked_in_at = models.DateTimeField(blank=True, null=True, db_index=True) # set once by /gate/scan/
+
+    class Meta:
+        # One index per hot lookup; check them with `manage.py explain_bookings`
+        indexes = [
+            # payment_verify, download_ticket, order release / expiry
+            models.Index(fields=['order', 'status'], name='booking_order_status'),
+            # stale pending bookings (expire_reservations): small, rows leave it once paid or failed
+            models.Index(fields=['created_at'], name='booking_pending_created', condition=models.Q(status='pending')),
+            # attendee lists, newest first
+            models.Index(fields=['ticket_type', 'status', '-created_at'], name='booking_type_status_created'),
+        ]
 
     def __str__(self):
         return f"{self.customer_name} - {self.ticket_type.name}"
 
+class TicketDelivery(models.Model):
+    """Delivery state of one channel (email / WhatsApp) for a paid booking, written by the Celery tasks."""
+    CHANNEL_CHOICES = [
+        ('email', 'Email'),
+        ('whatsapp', 'WhatsApp'),
+    ]
+    STATUS_CHOICES = [
+        ('queued', 'Queued'),
+        ('retrying', 'Retrying'),
+        ('sent', 'Sent'),
+        ('failed', 'Failed'),
+        ('skipped', 'Skipped'),
+    ]
+    booking = models.ForeignKey(Booking, related_name='deliveries', on_delete=models.CASCADE)
+    channel = models.CharField(max_length=20, choices=CHANNEL_CHOICES)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='queued')
+    attempts = models.PositiveIntegerField(default=0)
+    detail = models.TextField(blank=True) # last provider response or error
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['booking', 'channel'], name='unique_delivery_per_channel'),
+        ]
+
+    def __str__(self):
+        return f"Booking #{self.booking_id} {self.channel}: {self.status}"
+
+class QRImage(models.Model):
+    """Persistent tier of the QR cache in core.qr, keyed by payload hash and render size."""
+    key = models.CharField(max_length=100, unique=True)
+    booking = models.ForeignKey(Booking, related_name='qr_images', on_delete=models.CASCADE, blank=True, null=True)
+    png = models.BinaryField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return self.key
+
+class TicketArtifact(models.Model):
+    """Pre-rendered ticket page / PDF for an order, served by download_ticket with a strong ETag."""
+    KIND_CHOICES = [
+        ('html', 'HTML'),
+        ('pdf', 'PDF'),
+    ]
+    order_id = models.CharField(max_length=100)
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES)
+    content = models.BinaryField()
+    etag = models.CharField(max_length=64)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['order_id', 'kind'], name='unique_artifact_per_order'),
+        ]
+
+    def __str__(self):
+        return f"{self.order_id} ({self.kind})"
+
+class Reservation(models.Model):
+    """
+    A temporary hold on stock while the customer pays. Available stock is
+    quantity_available minus active holds, expired ones included until the sweep
+    releases them (see core.reservations).
+    """
+    STATUS_CHOICES = [
+        ('active', 'Active'),
+        ('converted', 'Converted'), # paid, stock taken from quantity_available (or already from a shard)
+        ('released', 'Released'),
+        ('expired', 'Expired'),
+    ]
+    event = models.ForeignKey(Event, related_name='reservations', on_delete=models.CASCADE)
+    ticket_type = models.ForeignKey(TicketType, related_name='reservations', on_delete=models.CASCADE)
+    shard = models.ForeignKey('InventoryShard', related_name='reservations', on_delete=models.SET_NULL, blank=True, null=True) # set when claimed from a sharded ticket type
+    order_id = models.CharField(max_length=100, db_index=True)
+    quantity = models.IntegerField()
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='active')
+    expires_at = models.DateTimeField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['event', 'status', 'expires_at'], name='reservation_event_status_exp'),
+            models.Index(fields=['ticket_type', 'status', 'expires_at'], name='reservation_ticket_status_exp'),
+        ]
+
+    def __str__(self):
+        return f"{self.order_id}: {self.quantity} x {self.ticket_type_id} ({self.status})"
+
+class InventoryShard(models.Model):
+    """
+    One of TicketType.inventory_shards counter rows. For a sharded ticket type the
+    shards hold the unreserved stock, so concurrent checkouts decrement different rows
+    instead of all locking the TicketType (see core.inventory).
+    """
+    ticket_type = models.ForeignKey(TicketType, related_name='shards', on_delete=models.CASCADE)
+    index = models.PositiveSmallIntegerField()
+    quantity = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['ticket_type', 'index'], name='unique_shard_per_ticket_type'),
+        ]
+
+    def __str__(self):
+        return f"{self.ticket_type_id}#{self.index}: {self.quantity}"
+
+class PaymentEvent(models.Model):
+    """
+    Append-only inbox of Razorpay webhook deliveries, keyed by Razorpay's event id so
+    a duplicate callback is a no-op. Applied in batches by process_payment_events.
+    """
+    event_id = models.CharField(max_length=100, unique=True)
+    event = models.CharField(max_length=50) # e.g. payment.captured, order.paid
+    order_id = models.CharField(max_length=100, blank=True)
+    payment_id = models.CharField(max_length=100, blank=True)
+    payload = models.JSONField()
+    received_at = models.DateTimeField(auto_now_add=True)
+    processed_at = models.DateTimeField(blank=True, null=True)
+    refund_due = models.BooleanField(default=False) # a captured payment whose order could not be filled; unprocessed until refunded
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['id'], name='paymentevent_unprocessed', condition=models.Q(processed_at__isnull=True)),
+        ]
+
+    def __str__(self):
+        return f"{self.event_id} {self.event} ({self.order_id})"
+
+class TicketSales(models.Model):
+    """
+    Running paid totals of one ticket type, moved forward by core.orders.mark_paid in
+    the transaction that marks the bookings paid. Event totals are the sum of an
+    event's rows. Migration 0019 backfills it; repair with `manage.py rebuild_sales`.
+    """
+    ticket_type = models.OneToOneField(TicketType, primary_key=True, related_name='sales', on_delete=models.CASCADE)
+    event = models.ForeignKey(Event, related_name='ticket_sales', on_delete=models.CASCADE)
+    sold = models.PositiveIntegerField(default=0)
+    revenue = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.ticket_type_id}: {self.sold} sold, {self.revenue}"
@@ -0,0 +1,171 @@
+"""
+Order confirmation.
+
+An order is confirmed either by the browser (payment_verify) or by Razorpay's
+webhook, often both, and the webhook may be delivered more than once. mark_paid()
+is the single, repeatable path for both: it only ever moves *pending* bookings to
+paid, with one UPDATE for the whole batch (plus one for their Order rows) and one
+stock and one sales-rollup UPDATE per ticket type, so a second confirmation of the
+same order changes nothing.
+
+Webhook deliveries are only recorded in the PaymentEvent inbox by the request;
+process_payment_events applies them in batches with apply_payment_events().
+
+A payment can also be captured for an order that has already failed (its hold
+expired, or the buyer started another checkout). recover_failed() reserves the stock
+again and returns the order to pending for mark_paid(); if the stock is gone the
+order becomes refund_due and is logged, and its webhook event is flagged and left
+unprocessed until the payment is refunded.
+
+Both confirmation paths go through confirm_payments(), which locks the Order rows
+first (the lock order core.reservations uses too), so the expiry sweep can't fail
+an order between the status check and mark_paid().
+"""
+import logging
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Case, F, Value, When
+from django.utils import timezone
+
+from . import sales
+from .models import Booking, Order, PaymentEvent, TicketType
+from .pricing import StockError
+from .reservations import convert_orders, reserve
+
+logger = logging.getLogger(__name__)
+
+PAYMENT_EVENT_BATCH = getattr(settings, 'PAYMENT_EVENT_BATCH', 200)
+
+# Webhook events that mean the order's money has been taken
+PAID_EVENTS = ('payment.captured', 'order.paid')
+
+
+def mark_paid(order_payments):
+    """Mark the pending bookings of every {order_id: payment_id} paid.
+
+    Run inside transaction.atomic(). Returns {order_id: [booking ids paid now]}.
+    """
+    pending = list(
+        Booking.objects.select_for_update(of=('self',))  # not the joined TicketType row
+        .filter(order_id__in=order_payments, status='pending')
+        .order_by('id')
+        .values_list('id', 'order_id', 'ticket_type_id', 'quantity', 'total_amount', 'ticket_type__event_id')
+    )
+    if not pending:
+        return {}
+
+    paid = defaultdict(list)
+    sold = defaultdict(int)
+    revenue = defaultdict(int)
+    events = {}
+    for booking_id, order_id, ticket_type_id, quantity, amount, event_id in pending:
+        paid[order_id].append(booking_id)
+        sold[ticket_type_id] += quantity
+        revenue[ticket_type_id] += amount
+        events[ticket_type_id] = event_id
+
+    payment_ids = Case(*[When(order_id=order_id, then=Value(order_payments[order_id])) for order_id in paid])
+    Order.objects.filter(order_id__in=list(paid)).update(status='paid', payment_id=payment_ids)
+    Booking.objects.filter(id__in=[booking_id for booking_id, *_ in pending]).update(
+        status='paid', payment_id=payment_ids, paid_at=timezone.now()
+    )
+    # Sharded ticket types already took this stock from a shard at checkout
+    for ticket_type_id in sorted(sold):
+        TicketType.objects.filter(id=ticket_type_id, inventory_shards=0).update(
+            quantity_available=F('quantity_available') - sold[ticket_type_id]
+        )
+    sales.record({ticket_type_id: (events[ticket_type_id], sold[ticket_type_id], revenue[ticket_type_id]) for ticket_type_id in sold})
+    convert_orders(list(paid))
+    return dict(paid)
+
+
+def recover_failed(order_payments):
+    """Re-reserve failed orders of {order_id: payment_id} whose money has been taken.
+
+    Recovered orders go back to pending (mark_paid then takes them); the rest become
+    refund_due. Run inside transaction.atomic(). Returns the order ids now refund_due.
+    """
+    refund_due = []
+    failed = (
+        Order.objects.select_for_update(of=('self',))
+        .filter(order_id__in=order_payments, status='failed')
+        .select_related('event')
+    )
+    for order in failed:
+        lines = [
+            (booking.ticket_type, booking.quantity)
+            for booking in order.bookings.filter(status='failed').select_related('ticket_type').order_by('ticket_type_id')
+        ]
+        recovered = False
+        if lines:
+            try:
+                with transaction.atomic():
+                    reserve(order.order_id, order.event, lines)
+                recovered = True
+            except StockError:
+                pass
+        if not recovered:
+            Order.objects.filter(id=order.id).update(status='refund_due', payment_id=order_payments[order.order_id])
+            logger.error(
+                'Payment %s captured for failed order %s, whose tickets are no longer available: refund it.',
+                order_payments[order.order_id], order.order_id,
+            )
+            refund_due.append(order.order_id)
+            continue
+        Booking.objects.filter(order_id=order.order_id, status='failed').update(status='pending')
+        Order.objects.filter(id=order.id).update(status='pending')
+    return refund_due
+
+
+def confirm_payments(order_payments):
+    """Apply captured payments {order_id: payment_id}: recover failed orders, then mark_paid().
+
+    Run inside transaction.atomic(). Returns ({order_id: [booking ids paid now]}, [refund_due order ids]).
+    """
+    # Lock the orders (in id order) before anything else, so no sweep or release changes them underneath
+    list(Order.objects.select_for_update().filter(order_id__in=order_payments).order_by('id').values_list('id', flat=True))
+    refund_due = recover_failed(order_payments)
+    return mark_paid(order_payments), refund_due
+
+
+def record_payment_event(event_id, payload):
+    """Append a verified webhook delivery to the inbox. False if it was already there."""
+    entity = payload.get('payload', {}).get('payment', {}).get('entity', {})
+    _, created = PaymentEvent.objects.get_or_create(
+        event_id=event_id,
+        defaults={
+            'event': payload.get('event', ''),
+            'order_id': entity.get('order_id') or '',
+            'payment_id': entity.get('id') or '',
+            'payload': payload,
+        },
+    )
+    return created
+
+
+def apply_payment_events(batch_size=PAYMENT_EVENT_BATCH):
+    """Apply one batch of unprocessed inbox events; returns (events, {order_id: [booking ids]}).
+
+    Concurrent consumers skip each other's locked rows, so they never apply the same event.
+    Run inside transaction.atomic().
+    """
+    events = list(
+        PaymentEvent.objects.select_for_update(skip_locked=True)
+        .filter(processed_at__isnull=True, refund_due=False)
+        .order_by('id')[:batch_size]
+    )
+    if not events:
+        return [], {}
+    captured = {
+        event.order_id: event.payment_id
+        for event in events
+        if event.event in PAID_EVENTS and event.order_id and event.payment_id
+    }
+    paid, refund_due = confirm_payments(captured)
+    # A payment that has to be refunded stays unprocessed until someone refunds it
+    ids = [event.id for event in events]
+    PaymentEvent.objects.filter(id__in=ids, event__in=PAID_EVENTS, order_id__in=refund_due).update(refund_due=True)
+    PaymentEvent.objects.filter(id__in=ids, refund_due=False).update(processed_at=timezone.now())
+    return events, paid
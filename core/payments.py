@@ -0,0 +1,267 @@
+"""
+Payment gateway adapter.
+
+Checkout used to build a new razorpay.Client (and open a new TLS connection) per
+request and guard it with socket.setdefaulttimeout(15), a process-wide setting that
+could still stall a worker for 15 seconds. Here each process keeps one client on a
+keep-alive requests.Session, and every call gets its own (connect, read) timeout.
+Transient failures are retried with jittered backoff, and a circuit breaker makes
+checkout fail fast while Razorpay is down instead of queueing workers behind it.
+
+    order_id = payments.create_order({'amount': 49900, 'currency': 'INR', 'receipt': ...})
+    order_id = await payments.acreate_order(...)  # from async (ASGI) views, on httpx
+    payments.verify_signature(order_id, payment_id, signature)
+    payments.verify_webhook_signature(request.body, request.headers['X-Razorpay-Signature'])
+
+PAYMENT_GATEWAY=fake swaps in FakeGateway, which answers locally after an optional
+PAYMENT_FAKE_LATENCY_MS, so tests and benchmarks don't wait on the real gateway.
+The razorpay SDK is imported when the first RazorpayGateway is built, so processes
+that never take a payment (Celery workers, the fake gateway) don't load it.
+
+The SDK is blocking, so acreate_order() calls the orders API itself on an
+httpx.AsyncClient, with the same timeouts, retries and breaker: an ASGI worker keeps
+serving other requests while Razorpay answers.
+"""
+import asyncio
+import hashlib
+import hmac
+import random
+import threading
+import time
+import uuid
+import weakref
+
+import requests
+from django.conf import settings
+from requests.adapters import HTTPAdapter
+
+PAYMENT_TIMEOUT = (
+    getattr(settings, 'PAYMENT_CONNECT_TIMEOUT', 3),
+    getattr(settings, 'PAYMENT_READ_TIMEOUT', 10),
+)
+PAYMENT_RETRIES = getattr(settings, 'PAYMENT_RETRIES', 2)
+PAYMENT_RETRY_BACKOFF = getattr(settings, 'PAYMENT_RETRY_BACKOFF', 0.2)
+
+
+class GatewayError(Exception):
+    """The gateway refused or failed the call (after retries), or the circuit is open."""
+
+
+class CircuitOpenError(GatewayError):
+    pass
+
+
+class CircuitBreaker:
+    """
+    Opens after `threshold` consecutive failures; while open every call fails at once.
+    After `cooldown` seconds one trial call is let through: success closes the
+    circuit, failure opens it for another cooldown.
+    """
+
+    def __init__(self, threshold, cooldown):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.failures = 0
+        self.opened_at = None
+        self.lock = threading.Lock()
+
+    def allow(self):
+        with self.lock:
+            if self.opened_at is None:
+                return True
+            if time.monotonic() - self.opened_at >= self.cooldown:
+                self.opened_at = time.monotonic()  # half-open: this caller is the trial
+                return True
+            return False
+
+    def success(self):
+        with self.lock:
+            self.failures = 0
+            self.opened_at = None
+
+    def failure(self):
+        with self.lock:
+            self.failures += 1
+            if self.failures >= self.threshold:
+                self.opened_at = time.monotonic()
+
+
+def _sign(secret, message):
+    return hmac.new(secret.encode('utf-8'), message, hashlib.sha256).hexdigest()
+
+
+def _backoff(attempt):
+    # Full jitter, so workers that failed together don't retry together
+    return random.uniform(0, PAYMENT_RETRY_BACKOFF * 2 ** attempt)
+
+
+class RazorpayGateway:
+    def __init__(self, key_id, key_secret):
+        import razorpay
+
+        self.errors = razorpay.errors
+        # Worth another try: the request may never have reached Razorpay, or it failed on their side
+        self.retryable = (
+            requests.ConnectionError,
+            requests.Timeout,
+            razorpay.errors.ServerError,
+            razorpay.errors.GatewayError,
+            ValueError,  # a non-JSON reply, e.g. a proxy's 502 page
+        )
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_maxsize=getattr(settings, 'PAYMENT_POOL_SIZE', 10))
+        session.mount('https://', adapter)
+        session.mount('http://', adapter)  # a local stub (core.stubs)
+        self.client = razorpay.Client(
+            session=session, auth=(key_id, key_secret),
+            base_url=getattr(settings, 'RAZORPAY_API_URL', 'https://api.razorpay.com'),
+        )
+        # _call retries: SDK retries inside each of its attempts would multiply the worst case
+        self.client.enable_retry(False)
+        self.auth = (key_id, key_secret)
+        self.breaker = CircuitBreaker(
+            getattr(settings, 'PAYMENT_BREAKER_THRESHOLD', 5),
+            getattr(settings, 'PAYMENT_BREAKER_COOLDOWN', 30),
+        )
+        self._async_clients = weakref.WeakKeyDictionary()
+
+    def create_order(self, data):
+        return self._call(lambda: self.client.order.create(data=data, timeout=PAYMENT_TIMEOUT))['id']
+
+    def _async_client(self):
+        # An AsyncClient's connections belong to the event loop that opened them: one client per loop
+        import httpx
+
+        loop = asyncio.get_running_loop()
+        client = self._async_clients.get(loop)
+        if client is None:
+            client = self._async_clients[loop] = httpx.AsyncClient(
+                base_url=getattr(settings, 'RAZORPAY_API_URL', 'https://api.razorpay.com'),
+                auth=self.auth,
+                timeout=httpx.Timeout(PAYMENT_TIMEOUT[1], connect=PAYMENT_TIMEOUT[0]),
+                # No cap on connections in flight: waiting here is what the async path avoids
+                limits=httpx.Limits(max_connections=None, max_keepalive_connections=getattr(settings, 'PAYMENT_POOL_SIZE', 10)),
+            )
+        return client
+
+    async def acreate_order(self, data):
+        import httpx
+
+        if not self.breaker.allow():
+            raise CircuitOpenError('Payment gateway unavailable (circuit open).')
+        for attempt in range(PAYMENT_RETRIES + 1):
+            try:
+                response = await self._async_client().post('/v1/orders', json=data)
+                result = response.json()
+            except (httpx.TransportError, ValueError) as e:
+                error = str(e) or e.__class__.__name__
+            else:
+                if response.status_code < 400:
+                    self.breaker.success()
+                    return result['id']
+                error = result.get('error', {}).get('description') or f'HTTP {response.status_code}'
+                if response.status_code < 500:
+                    raise GatewayError(error)  # our request was wrong, as with BadRequestError
+            if attempt == PAYMENT_RETRIES:
+                self.breaker.failure()
+                raise GatewayError(error)
+            await asyncio.sleep(_backoff(attempt))
+
+    def verify_signature(self, order_id, payment_id, signature):
+        # Local HMAC check, no network call
+        try:
+            self.client.utility.verify_payment_signature({
+                'razorpay_order_id': order_id,
+                'razorpay_payment_id': payment_id,
+                'razorpay_signature': signature,
+            })
+        except self.errors.SignatureVerificationError:
+            return False
+        return True
+
+    def _call(self, request):
+        if not self.breaker.allow():
+            raise CircuitOpenError('Payment gateway unavailable (circuit open).')
+        for attempt in range(PAYMENT_RETRIES + 1):
+            try:
+                result = request()
+            except self.retryable as e:
+                if attempt == PAYMENT_RETRIES:
+                    self.breaker.failure()
+                    raise GatewayError(str(e) or e.__class__.__name__) from e
+                time.sleep(_backoff(attempt))
+            except (self.errors.BadRequestError, requests.RequestException) as e:
+                # Our request was wrong: retrying won't help, and it says nothing about the gateway's health
+                raise GatewayError(str(e) or e.__class__.__name__) from e
+            else:
+                self.breaker.success()
+                return result
+
+
+class FakeGateway:
+    """Local stand-in using Razorpay's order-id format and signature scheme; no network."""
+
+    def __init__(self, key_secret, latency=0):
+        self.key_secret = key_secret
+        self.latency = latency
+
+    def create_order(self, data):
+        if self.latency:
+            time.sleep(self.latency)
+        return f'order_fake{uuid.uuid4().hex[:14]}'
+
+    async def acreate_order(self, data):
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        return f'order_fake{uuid.uuid4().hex[:14]}'
+
+    def sign(self, order_id, payment_id):
+        """The razorpay_signature checkout.js would post for this payment."""
+        return _sign(self.key_secret, f'{order_id}|{payment_id}'.encode('utf-8'))
+
+    def sign_webhook(self, body):
+        """The X-Razorpay-Signature header Razorpay would send with this webhook body."""
+        return _sign(settings.RAZORPAY_WEBHOOK_SECRET, body)
+
+    def verify_signature(self, order_id, payment_id, signature):
+        return hmac.compare_digest(self.sign(order_id, payment_id), signature)
+
+
+_gateway = None
+_gateway_lock = threading.Lock()
+
+
+def gateway():
+    """This process's gateway, built on first use (so after any fork)."""
+    global _gateway
+    if _gateway is None:
+        with _gateway_lock:
+            if _gateway is None:
+                if getattr(settings, 'PAYMENT_GATEWAY', 'razorpay') == 'fake':
+                    _gateway = FakeGateway(
+                        settings.RAZORPAY_KEY_SECRET,
+                        latency=getattr(settings, 'PAYMENT_FAKE_LATENCY_MS', 0) / 1000,
+                    )
+                else:
+                    _gateway = RazorpayGateway(settings.RAZORPAY_KEY_ID, settings.RAZORPAY_KEY_SECRET)
+    return _gateway
+
+
+def create_order(data):
+    """Create a gateway order for `data` ({'amount', 'currency', 'receipt'}) and return its id."""
+    return gateway().create_order(data)
+
+
+def verify_signature(order_id, payment_id, signature):
+    return gateway().verify_signature(order_id, payment_id, signature)
+
+
+def verify_webhook_signature(body, signature):
+    """Check a webhook body against X-Razorpay-Signature (HMAC-SHA256 with RAZORPAY_WEBHOOK_SECRET)."""
+    secret = getattr(settings, 'RAZORPAY_WEBHOOK_SECRET', '')
+    return bool(secret and signature) and hmac.compare_digest(_sign(secret, body), signature)
+
+
+async def acreate_order(data):
+    """create_order for async views: waits on the event loop, not in a thread."""
+    return await gateway().acreate_order(data)
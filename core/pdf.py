@@ -0,0 +1,108 @@
+"""
+Ticket PDF rendering.
+
+WeasyPrint is the most CPU-expensive step of ticket delivery, and most of a single
+render used to go into re-parsing the same stylesheet and loading the same fonts.
+Here the ticket stylesheet is parsed into a weasyprint.CSS object once per process,
+and Celery worker processes are warmed up when they start (worker_process_init in
+core.tasks). Renders run in parallel as the worker's prefork children, a task each.
+
+PDFs are only rendered on Celery workers (the `pdf` queue) and in management
+commands — never inside a web request. So WeasyPrint (and Pango/cairo under it) is
+imported by the functions that render, not by this module, which web processes load
+through core.tasks.
+"""
+TICKET_CSS = """
+body { font-family: 'Helvetica Neue', Arial, sans-serif; background: #fff; margin: 0; padding: 20px; }
+.wrapper { max-width: 600px; margin: 0 auto; border: 2px solid #333; border-radius: 12px; overflow: hidden; }
+.header { background: #E8182A; padding: 20px; text-align: center; color: #fff; border-bottom: 4px solid #333; }
+.header h1 { margin: 0; font-size: 28px; text-transform: uppercase; letter-spacing: 2px; }
+.receipt-badge { background: #222; color: #fff; font-size: 16px; font-weight: 700; text-align: center; padding: 10px; text-transform: uppercase; letter-spacing: 1px; }
+.body { padding: 30px; }
+.table { width: 100%; border-collapse: collapse; margin-bottom: 30px; font-size: 16px; }
+.table td { padding: 12px 10px; border-bottom: 1px solid #eee; }
+.table td:first-child { font-weight: bold; color: #555; width: 40%; }
+.amount { color: #E8182A; font-weight: bold; font-size: 18px; }
+.qr-container { text-align: center; margin: 20px 0; padding: 20px; background: #f9f9f9; border-radius: 8px; border: 1px dashed #ccc; }
+.qr-container img { width: 220px; height: 220px; }
+.qr-hint { font-size: 14px; color: #666; margin-top: 10px; font-weight: bold; }
+.footer { text-align: center; padding: 20px; font-size: 12px; color: #888; border-top: 1px solid #eee; margin-top: 20px; }
+.wrapper + .wrapper { page-break-before: always; }
+"""
+
+_stylesheets = None
+
+
+def stylesheets():
+    """The pre-parsed ticket stylesheet, built on first use and shared by every render in this process."""
+    global _stylesheets
+    if _stylesheets is None:
+        import weasyprint
+
+        _stylesheets = [weasyprint.CSS(string=TICKET_CSS)]
+    return _stylesheets
+
+
+def warm():
+    """Parse the stylesheet and lay out a throwaway ticket so fonts are loaded before the first real job."""
+    import weasyprint
+
+    weasyprint.HTML(string='<div class="wrapper"><h1>Colour Carnival</h1></div>').render(stylesheets=stylesheets())
+
+
+def _ticket_markup(booking, qr_b64):
+    event = booking.ticket_type.event
+    return f"""
+    <div class="wrapper">
+      <div class="header">
+        <h1>Colour Carnival 1.0</h1>
+        <p style="margin: 5px 0 0; opacity: 0.9;">Official Event Ticket</p>
+      </div>
+      <div class="receipt-badge">Payment Receipt / Admittance Pass</div>
+      <div class="body">
+        <p><strong>Name:</strong> {booking.customer_name}</p>
+        <table class="table">
+          <tr><td>🎪 Event</td><td>{event.title}</td></tr>
+          <tr><td>🎟 Ticket Type</td><td>{booking.ticket_type.name}</td></tr>
+          <tr><td>🔢 Quantity</td><td>{booking.quantity} Person(s)</td></tr>
+          <tr><td>💳 Total Paid</td><td class="amount">₹{booking.total_amount}</td></tr>
+          <tr><td>🔑 Payment ID</td><td>{booking.payment_id}</td></tr>
+          <tr><td>📋 Booking ID</td><td>#{booking.id}</td></tr>
+        </table>
+
+        <div class="qr-container">
+          <img src="data:image/png;base64,{qr_b64}" alt="Ticket QR Code" />
+          <div class="qr-hint">Scan this QR Code at the Entry Gate</div>
+        </div>
+
+        <div style="font-size: 14px; color: #444; text-align: center; margin-top: 30px;">
+          <p><strong>📅 Date:</strong> 8th March, 2026 | 10:00 AM – 4:00 PM</p>
+          <p><strong>📍 Venue:</strong> Pandhurang Lawns, Guruvar Peth, Ambajogai – 431517</p>
+        </div>
+      </div>
+      <div class="footer">
+        Colour Carnival &copy; 2026 | Support: 9145452609 / 9359176168
+      </div>
+    </div>
+    """
+
+
+def _document(markup):
+    return f'<!DOCTYPE html><html><head><meta charset="UTF-8"></head><body>{markup}</body></html>'
+
+
+def ticket_pdf_html(booking, qr_b64):
+    """HTML for one booking's printable pass (styled by TICKET_CSS, not inline styles)."""
+    return _document(_ticket_markup(booking, qr_b64))
+
+
+def order_pdf_html(tickets):
+    """HTML for several passes in one document, a page each. `tickets` is [(booking, qr_b64), ...]."""
+    return _document(''.join(_ticket_markup(booking, qr_b64) for booking, qr_b64 in tickets))
+
+
+def render_pdf(html):
+    import weasyprint
+
+    return weasyprint.HTML(string=html).write_pdf(stylesheets=stylesheets())
+
@@ -0,0 +1,117 @@
+"""
+Pricing and stock checks for a whole ticket selection at once.
+
+update_total and checkout receive one `qty_<ticket id>` field per ticket type. The
+selection is priced with a single `id__in` query instead of one query per field, and
+checkout locks every selected row with one SELECT ... FOR UPDATE ordered by id, so
+concurrent checkouts always take their locks in the same order and cannot deadlock.
+
+Totals shown while the buyer types are computed in the browser from a signed price
+manifest shipped with the ticket selection partial. update_total stays as a fallback and
+answers from that manifest or from an in-process price table, never from the database
+on the hot path.
+"""
+import threading
+import time
+from decimal import Decimal
+
+from django.conf import settings
+from django.core import signing
+
+from .models import TicketType
+
+# Upper bound on staleness for other processes; saves in this process invalidate at once
+PRICE_CACHE_TTL = getattr(settings, 'PRICE_CACHE_TTL', 60)
+PRICE_MANIFEST_MAX_AGE = getattr(settings, 'PRICE_MANIFEST_MAX_AGE', 60 * 60)
+_MANIFEST_SALT = 'core.pricing.manifest'
+
+_price_table = None
+_price_table_loaded_at = 0.0
+_price_lock = threading.Lock()
+
+
+class StockError(Exception):
+    def __init__(self, ticket, available):
+        self.ticket = ticket
+        self.available = available
+        super().__init__(f'Sorry, only {available} ticket(s) left for {ticket.name}.')
+
+
+def parse_quantities(data):
+    """{ticket_id: quantity} for every positive `qty_<id>` field; malformed fields are skipped."""
+    quantities = {}
+    for key, value in data.items():
+        if key.startswith('qty_'):
+            try:
+                ticket_id = int(key.split('_')[1])
+                quantity = int(value)
+            except (ValueError, IndexError):
+                continue
+            if quantity > 0:
+                quantities[ticket_id] = quantity
+    return quantities
+
+
+def price_table():
+    """{ticket_id: price} for every ticket type, cached in-process for PRICE_CACHE_TTL seconds."""
+    global _price_table, _price_table_loaded_at
+    with _price_lock:
+        if _price_table is None or time.monotonic() - _price_table_loaded_at > PRICE_CACHE_TTL:
+            _price_table = dict(TicketType.objects.values_list('id', 'price'))
+            _price_table_loaded_at = time.monotonic()
+        return _price_table
+
+
+def invalidate_prices():
+    global _price_table
+    with _price_lock:
+        _price_table = None
+
+
+def prices_for(quantities):
+    """{ticket_id: price} for the selected ticket types, from the cached price table."""
+    table = price_table()
+    return {ticket_id: table[ticket_id] for ticket_id in quantities if ticket_id in table}
+
+
+def price_manifest(ticket_types):
+    """Signed {ticket_id: price} for the browser. Uncompressed, so the JSON payload stays readable client-side."""
+    return signing.dumps({str(ticket.id): str(ticket.price) for ticket in ticket_types}, salt=_MANIFEST_SALT)
+
+
+def manifest_prices(manifest):
+    """Prices from a manifest we signed, or None if it is missing, tampered with or expired."""
+    if not manifest:
+        return None
+    try:
+        prices = signing.loads(manifest, salt=_MANIFEST_SALT, max_age=PRICE_MANIFEST_MAX_AGE)
+    except signing.BadSignature:
+        return None
+    return {int(ticket_id): Decimal(price) for ticket_id, price in prices.items()}
+
+
+def total_for(prices, quantities):
+    return sum((prices[ticket_id] * quantity for ticket_id, quantity in quantities.items() if ticket_id in prices), Decimal('0'))
+
+
+def load_lines(event, quantities, lock=False):
+    """[(ticket, quantity)] for the selected ticket types of `event`, ordered by id.
+
+    With lock=True the rows are locked in that same order in a single query.
+    """
+    tickets = TicketType.objects.filter(event=event, id__in=quantities).order_by('id')
+    if lock:
+        tickets = tickets.select_for_update()
+    return [(ticket, quantities[ticket.id]) for ticket in tickets]
+
+
+def check_stock(lines, available=None):
+    """Raise StockError for the first line that exceeds stock (`available` defaults to quantity_available)."""
+    for ticket, quantity in lines:
+        left = ticket.quantity_available if available is None else available[ticket.id]
+        if left < quantity:
+            raise StockError(ticket, max(left, 0))
+
+
+def lines_total(lines):
+    return sum((ticket.price * quantity for ticket, quantity in lines), Decimal('0'))
@@ -0,0 +1,127 @@
+"""
+Content-addressed QR image cache.
+
+Rendering a QR and PNG-encoding it costs a few milliseconds, and the same ticket QR
+is requested again and again (ticket page reloads at the gate, email, PDF). Images are
+keyed by sha256(payload) plus the render size, held in a bounded in-process LRU and
+persisted in the QRImage table so every web/worker process shares them.
+
+A changed booking produces a different payload and therefore a different key; the
+old row is dropped by the Booking post_save handler in core.signals.
+
+qrcode (and Pillow behind it) is imported on the first render, not with this module:
+web processes serving cached images never load it.
+"""
+import base64
+import hashlib
+import threading
+from collections import OrderedDict
+from io import BytesIO
+
+from django.conf import settings
+
+from .gate import make_token
+from .models import QRImage
+
+# Render presets: (box_size, border, error correction level L/M/Q/H)
+TICKET_PAGE = (8, 3, 'M')
+EMAIL = (10, 4, 'L')
+PRESETS = (TICKET_PAGE, EMAIL)
+
+
+class _LRU:
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            value = self._data.get(key)
+            if value is not None:
+                self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def discard(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+
+_memory = _LRU(getattr(settings, 'QR_CACHE_SIZE', 512))
+
+
+def booking_qr_payload(booking):
+    # Signed check-in token, verified at the gate by core.gate
+    return make_token(booking.id, booking.quantity)
+
+
+def cache_key(payload, preset):
+    box_size, border, error_correction = preset
+    digest = hashlib.sha256(payload.encode('utf-8')).hexdigest()
+    return f"{digest}:{box_size}:{border}:{error_correction}"
+
+
+def render_png(payload, preset):
+    """Uncached render — use qr_png() unless you really need a fresh image."""
+    import qrcode
+    import qrcode.constants
+
+    box_size, border, error_correction = preset
+    qr = qrcode.QRCode(
+        version=1, error_correction=getattr(qrcode.constants, f'ERROR_CORRECT_{error_correction}'),
+        box_size=box_size, border=border,
+    )
+    qr.add_data(payload)
+    qr.make(fit=True)
+    img = qr.make_image(fill_color="black", back_color="white")
+    buffer = BytesIO()
+    img.save(buffer, format='PNG')
+    return buffer.getvalue()
+
+
+def qr_png(payload, preset=TICKET_PAGE, booking=None):
+    """PNG bytes for `payload`: memory LRU, then the QRImage table, then a fresh render."""
+    key = cache_key(payload, preset)
+    png = _memory.get(key)
+    if png is not None:
+        return png
+
+    png = QRImage.objects.filter(key=key).values_list('png', flat=True).first()
+    if png is None:
+        png = render_png(payload, preset)
+        QRImage.objects.bulk_create(
+            [QRImage(key=key, booking=booking, png=png)], ignore_conflicts=True
+        )
+    png = bytes(png)
+    _memory.set(key, png)
+    return png
+
+
+def qr_png_b64(payload, preset=TICKET_PAGE, booking=None):
+    return base64.b64encode(qr_png(payload, preset, booking)).decode('utf-8')
+
+
+def booking_qr_b64(booking, preset=TICKET_PAGE):
+    return qr_png_b64(booking_qr_payload(booking), preset, booking)
+
+
+def warm_booking_qr(booking):
+    """Render every preset for a freshly paid booking so later requests are cache hits."""
+    for preset in PRESETS:
+        qr_png(booking_qr_payload(booking), preset, booking)
+
+
+def invalidate_booking_qr(booking):
+    """Drop cached images that no longer match the booking's current payload."""
+    current = {cache_key(booking_qr_payload(booking), preset) for preset in PRESETS}
+    stale = QRImage.objects.filter(booking=booking).exclude(key__in=current)
+    for key in stale.values_list('key', flat=True):
+        _memory.discard(key)
+    stale.delete()
@@ -0,0 +1,138 @@
+"""
+Inventory reservations.
+
+checkout places a Reservation per order line instead of relying on pending bookings,
+so stock is actually held while the customer pays:
+
+    available = TicketType.quantity_available - sum(active holds)
+
+payment_verify converts the order's holds in the same transaction that decrements
+quantity_available. Holds past expires_at are swept in bulk by the expire_reservations
+periodic task, never by customer requests, and count as held until then: an order
+whose hold has run out can still be paid until the sweep fails it.
+
+Lock order: the Order row first, then its reservations, bookings and stock rows.
+Payment (core.orders.confirm_payments), release_order and expire_stale all follow it,
+and the sweep skips orders a payment has locked instead of waiting on them.
+
+Sharded ticket types (core.inventory) keep their unreserved stock in counter rows
+instead; their holds are claimed from a shard and credited back on release/expiry.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Sum
+from django.utils import timezone
+
+from . import inventory, snapshot
+from .models import Booking, Order, Reservation
+from .pricing import check_stock, load_lines
+
+RESERVATION_TTL = timedelta(minutes=getattr(settings, 'RESERVATION_TTL_MINUTES', 20))
+
+
+def active_holds(ticket_type_ids):
+    """{ticket_type_id: quantity currently held} in one grouped query."""
+    rows = (
+        Reservation.objects.filter(ticket_type_id__in=ticket_type_ids, status='active')
+        .values('ticket_type_id')
+        .annotate(held=Sum('quantity'))
+    )
+    return {row['ticket_type_id']: row['held'] for row in rows}
+
+
+def available_quantities(tickets):
+    """{ticket_type_id: stock that can still be reserved} for already-loaded TicketType rows."""
+    holds = active_holds([ticket.id for ticket in tickets if not ticket.inventory_shards])
+    shards = inventory.shard_totals([ticket.id for ticket in tickets if ticket.inventory_shards])
+    return {
+        ticket.id: shards.get(ticket.id, 0) if ticket.inventory_shards
+        else ticket.quantity_available - holds.get(ticket.id, 0)
+        for ticket in tickets
+    }
+
+
+def reserve(order_id, event, lines):
+    """Hold every (ticket, quantity) line for RESERVATION_TTL or raise StockError.
+
+    Plain ticket types are locked in one query (id order) and checked against the
+    active holds; sharded ones claim from their counters without locking the row.
+    Run inside transaction.atomic(). Returns the lines with the re-read ticket rows.
+    """
+    plain = load_lines(event, {ticket.id: quantity for ticket, quantity in lines if not ticket.inventory_shards}, lock=True)
+    check_stock(plain, available_quantities([ticket for ticket, _ in plain]))
+    sharded = [(ticket, quantity) for ticket, quantity in lines if ticket.inventory_shards]
+
+    expires_at = timezone.now() + RESERVATION_TTL
+    holds = [
+        Reservation(event=event, ticket_type=ticket, order_id=order_id, quantity=quantity, expires_at=expires_at)
+        for ticket, quantity in plain
+    ]
+    for ticket, quantity in sharded:
+        holds += [
+            Reservation(event=event, ticket_type=ticket, shard_id=shard_id, order_id=order_id, quantity=taken, expires_at=expires_at)
+            for shard_id, taken in inventory.claim(ticket, quantity)
+        ]
+    Reservation.objects.bulk_create(holds)
+    snapshot.invalidate()
+    return sorted(plain + sharded, key=lambda line: line[0].id)
+
+
+def release_order(order_id):
+    """Give an unpaid order's stock back and fail its pending bookings."""
+    with transaction.atomic():
+        status = Order.objects.select_for_update().filter(order_id=order_id).values_list('status', flat=True).first()
+        if status not in (None, 'pending'):
+            return  # paid, or already failed: nothing is held for it any more
+        held = list(
+            Reservation.objects.select_for_update().filter(order_id=order_id, status='active').values_list('id', flat=True)
+        )
+        inventory.credit(held)
+        Reservation.objects.filter(id__in=held).update(status='released')
+        Order.objects.filter(order_id=order_id, status='pending').update(status='failed')
+        Booking.objects.filter(order_id=order_id, status='pending').update(status='failed')
+        if held:
+            snapshot.invalidate()
+
+
+def convert_orders(order_ids):
+    Reservation.objects.filter(order_id__in=order_ids, status='active').update(status='converted')
+
+
+def expire_stale(now=None):
+    """Bulk-expire holds past their deadline and fail the matching pending orders and bookings.
+
+    Orders locked by a payment in progress are skipped; the next run sees them paid.
+    """
+    now = now or timezone.now()
+    with transaction.atomic():
+        stale_orders = set(
+            Reservation.objects.filter(status='active', expires_at__lte=now).values_list('order_id', flat=True)
+        )
+        # Pending bookings with no hold at all (e.g. from before reservations) can't be paid for either
+        stale_orders.update(
+            Order.objects.filter(status='pending', created_at__lte=now - RESERVATION_TTL).values_list('order_id', flat=True)
+        )
+        locked = set(
+            Order.objects.select_for_update(skip_locked=True)
+            .filter(order_id__in=stale_orders).order_by('id').values_list('order_id', flat=True)
+        )
+        # Holds of an order being paid right now are left to the payment
+        busy = set(Order.objects.filter(order_id__in=stale_orders).values_list('order_id', flat=True)) - locked
+        stale_ids = list(
+            Reservation.objects.select_for_update(skip_locked=True)
+            .filter(order_id__in=stale_orders - busy, status='active', expires_at__lte=now)
+            .values_list('id', flat=True)
+        )
+        inventory.credit(stale_ids)
+        expired = Reservation.objects.filter(id__in=stale_ids).update(status='expired')
+        if expired:
+            snapshot.invalidate()
+        failed = Order.objects.filter(order_id__in=locked, status='pending')
+        failed_ids = list(failed.values_list('order_id', flat=True))
+        failed.update(status='failed')
+        Booking.objects.filter(order_id__in=failed_ids, status='pending').update(status='failed')
+        # Orphaned pending bookings of orders that don't exist
+        Booking.objects.filter(status='pending', order__isnull=True, created_at__lte=now - RESERVATION_TTL).update(status='failed')
+    return expired
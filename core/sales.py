@@ -0,0 +1,63 @@
+"""
+Sales rollup (TicketSales).
+
+mark_paid() calls record() with what it has just marked paid, so the organizer pages
+read one row per ticket type instead of summing every paid booking. There is no
+per-event row on purpose: every payment of an event would queue on it, while the
+per-ticket-type rows are only contended by buyers of the same ticket type.
+"""
+from django.db import transaction
+from django.db.models import F, Sum
+
+from .models import Booking, TicketSales, TicketType
+
+
+def record(sold):
+    """Add {ticket_type_id: (event_id, quantity, amount)} to the rollup. Run inside transaction.atomic()."""
+    for ticket_type_id in sorted(sold):
+        event_id, quantity, amount = sold[ticket_type_id]
+        updated = TicketSales.objects.filter(ticket_type_id=ticket_type_id).update(
+            sold=F('sold') + quantity, revenue=F('revenue') + amount
+        )
+        if not updated:
+            # First sale since the ticket type was created (or before a rebuild)
+            TicketSales.objects.bulk_create(
+                [TicketSales(ticket_type_id=ticket_type_id, event_id=event_id)], ignore_conflicts=True
+            )
+            TicketSales.objects.filter(ticket_type_id=ticket_type_id).update(
+                sold=F('sold') + quantity, revenue=F('revenue') + amount
+            )
+
+
+def paid_totals(bookings):
+    """{ticket_type_id: (event_id, quantity, amount)} of the paid bookings in `bookings`, as record() takes."""
+    rows = (
+        bookings.filter(status='paid').order_by()
+        .values_list('ticket_type_id', 'ticket_type__event_id')
+        .annotate(sold=Sum('quantity'), revenue=Sum('total_amount'))
+    )
+    return {ticket_type_id: (event_id, sold, revenue) for ticket_type_id, event_id, sold, revenue in rows}
+
+
+def rebuild(ticket_type):
+    """Recompute one ticket type's row from its paid bookings.
+
+    The row is locked before the bookings are summed, so a payment confirmed meanwhile
+    is either in the sum or added after it, never both.
+    """
+    with transaction.atomic():
+        TicketSales.objects.bulk_create(
+            [TicketSales(ticket_type_id=ticket_type.id, event_id=ticket_type.event_id)], ignore_conflicts=True
+        )
+        sales = TicketSales.objects.select_for_update().get(ticket_type_id=ticket_type.id)
+        totals = paid_totals(Booking.objects.filter(ticket_type_id=ticket_type.id))
+        _event_id, sales.sold, sales.revenue = totals.get(ticket_type.id, (ticket_type.event_id, 0, 0))
+        sales.save(update_fields=['sold', 'revenue', 'updated_at'])
+        return sales
+
+
+def rebuild_all(event_ids=None):
+    ticket_types = TicketType.objects.order_by('id')
+    if event_ids:
+        ticket_types = ticket_types.filter(event_id__in=event_ids)
+    return [rebuild(ticket_type) for ticket_type in ticket_types.only('id', 'event_id')]
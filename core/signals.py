@@ -0,0 +1,48 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from . import snapshot
+from .artifacts import invalidate_order
+from .fragments import invalidate_event
+from .models import Booking, Event, TicketArtifact, TicketType
+from .pricing import invalidate_prices
+from .qr import invalidate_booking_qr
+
+
+@receiver(post_save, sender=Booking)
+def booking_saved(sender, instance, created, **kwargs):
+    if not created:
+        invalidate_booking_qr(instance)
+        invalidate_order(instance.order_id)
+
+
+def _invalidate_event_card(event_id):
+    # After commit, or a page view in between could cache the card rendered from the old rows
+    transaction.on_commit(lambda: invalidate_event(event_id))
+
+
+@receiver(post_save, sender=Event)
+@receiver(post_delete, sender=Event)
+def event_changed(sender, instance, **kwargs):
+    snapshot.invalidate()  # publishing or unpublishing changes which tickets it covers
+    _invalidate_event_card(instance.id)
+
+
+@receiver(post_save, sender=TicketType)
+def ticket_type_saved(sender, instance, created, **kwargs):
+    invalidate_prices()
+    snapshot.invalidate()
+    _invalidate_event_card(instance.event_id)
+    # Ticket pages show the ticket type name, so rebuild them on next download
+    if not created:
+        TicketArtifact.objects.filter(
+            order_id__in=Booking.objects.filter(ticket_type=instance).values('order_id')
+        ).delete()
+
+
+@receiver(post_delete, sender=TicketType)
+def ticket_type_deleted(sender, instance, **kwargs):
+    invalidate_prices()
+    snapshot.invalidate()
+    _invalidate_event_card(instance.event_id)
@@ -0,0 +1,69 @@
+"""
+Inventory snapshot for "tickets left" counters.
+
+Browsers on the index page poll /inventory/ (htmx) during a sale. Rather than each
+poll reading TicketType rows and holds, they all get one shared snapshot,
+{ticket_id: tickets left} for every published event, kept in the cache:
+
+- a change to stock (reserve, release, expiry, an organizer edit) marks it dirty,
+  and the next poll rebuilds it, but not more than once per
+  INVENTORY_SNAPSHOT_MIN_REFRESH seconds however fast tickets sell;
+- without changes it is still rebuilt after INVENTORY_SNAPSHOT_MAX_AGE seconds
+  (holds also run out on their own);
+- one process rebuilds at a time; the others keep serving the previous snapshot.
+
+So a counter is never more than MAX_AGE seconds (plus one rebuild) behind, and the
+inventory rows see at most one read per MIN_REFRESH, whatever the number of browsers.
+"""
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from . import reservations
+from .models import TicketType
+
+INVENTORY_SNAPSHOT_MAX_AGE = getattr(settings, 'INVENTORY_SNAPSHOT_MAX_AGE', 10)
+INVENTORY_SNAPSHOT_MIN_REFRESH = getattr(settings, 'INVENTORY_SNAPSHOT_MIN_REFRESH', 1)
+
+_KEY = 'inventory-snapshot'
+_DIRTY_KEY = 'inventory-snapshot:dirty'
+_LOCK_KEY = 'inventory-snapshot:lock'
+
+
+def invalidate():
+    """Mark the snapshot out of date once the current transaction commits."""
+    transaction.on_commit(lambda: cache.set(_DIRTY_KEY, True, None))
+
+
+def _build():
+    tickets = list(
+        TicketType.objects.filter(event__is_published=True).only('id', 'quantity_available', 'inventory_shards')
+    )
+    return {
+        'built_at': time.time(),
+        'stock': {ticket_id: max(left, 0) for ticket_id, left in reservations.available_quantities(tickets).items()},
+    }
+
+
+def snapshot():
+    """{'built_at': epoch seconds, 'stock': {ticket_id: tickets left}} within the staleness bounds above."""
+    cached = cache.get_many([_KEY, _DIRTY_KEY])
+    current = cached.get(_KEY)
+    if current is not None:
+        age = time.time() - current['built_at']
+        if age < INVENTORY_SNAPSHOT_MIN_REFRESH or (age < INVENTORY_SNAPSHOT_MAX_AGE and not cached.get(_DIRTY_KEY)):
+            return current
+    locked = cache.add(_LOCK_KEY, True, 30)
+    if not locked and current is not None:
+        return current  # another process is rebuilding it
+    try:
+        # Cleared before reading, so a sale during the rebuild marks it dirty again
+        cache.delete(_DIRTY_KEY)
+        current = _build()
+        cache.set(_KEY, current, None)
+    finally:
+        if locked:
+            cache.delete(_LOCK_KEY)
+    return current
@@ -0,0 +1,136 @@
+"""
+Local stand-ins for the external APIs, for load tests.
+
+Each stub is a small threaded HTTP server that answers like the real API (Razorpay
+orders, Resend emails, Meta Graph media/messages) after an optional delay, counts
+its calls, and checks no credentials. Point the app at them with the *_API_URL
+settings:
+
+    stubs = start_stubs(latency=0.05)
+    stubs.settings()  # {'RAZORPAY_API_URL': 'http://127.0.0.1:...', 'RESEND_API_URL': ..., 'WHATSAPP_API_URL': ...}
+    ...
+    stubs.stop()
+
+`manage.py provider_stubs` runs them in the foreground for a server started separately.
+"""
+import json
+import threading
+import time
+import uuid
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+def razorpay_routes(path, body):
+    if path == '/v1/orders':
+        data = json.loads(body or b'{}')
+        return 200, {
+            'id': f'order_{uuid.uuid4().hex[:14]}',
+            'entity': 'order',
+            'amount': data.get('amount'),
+            'currency': data.get('currency', 'INR'),
+            'receipt': data.get('receipt'),
+            'status': 'created',
+            'created_at': int(time.time()),
+        }
+    return 404, {'error': {'code': 'BAD_REQUEST_ERROR', 'description': 'The requested URL was not found on the server.'}}
+
+
+def resend_routes(path, body):
+    if path == '/emails':
+        return 200, {'id': str(uuid.uuid4())}
+    return 404, {'name': 'not_found', 'message': 'Not found'}
+
+
+def meta_routes(path, body):
+    if path.endswith('/media'):
+        return 200, {'id': uuid.uuid4().hex}
+    if path.endswith('/messages'):
+        return 200, {'messaging_product': 'whatsapp', 'messages': [{'id': f'wamid.{uuid.uuid4().hex}'}]}
+    return 404, {'error': {'message': 'Unknown path', 'type': 'OAuthException'}}
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'  # keep-alive, like the real APIs
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        stub = self.server.stub
+        if stub.latency:
+            time.sleep(stub.latency)
+        status, payload = stub.routes(self.path, body)
+        stub.record(self.path)
+        data = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class _Server(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 128  # the default 5 makes a burst of new connections wait a second for SYN retries
+
+
+class StubServer:
+    def __init__(self, name, routes, latency=0, host='127.0.0.1', port=0):
+        self.name = name
+        self.routes = routes
+        self.latency = latency
+        self.calls = Counter()
+        self._lock = threading.Lock()
+        self.httpd = _Server((host, port), _Handler)
+        self.httpd.stub = self
+
+    @property
+    def url(self):
+        host, port = self.httpd.server_address[:2]
+        return f'http://{host}:{port}'
+
+    def record(self, path):
+        with self._lock:
+            self.calls[path] += 1
+
+    def start(self):
+        threading.Thread(target=self.httpd.serve_forever, name=f'stub-{self.name}', daemon=True).start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+class ProviderStubs:
+    def __init__(self, latency=0, host='127.0.0.1', base_port=0):
+        port = lambda offset: base_port + offset if base_port else 0
+        self.razorpay = StubServer('razorpay', razorpay_routes, latency, host, port(0))
+        self.resend = StubServer('resend', resend_routes, latency, host, port(1))
+        self.meta = StubServer('meta', meta_routes, latency, host, port(2))
+        self.servers = [self.razorpay, self.resend, self.meta]
+
+    def start(self):
+        for server in self.servers:
+            server.start()
+        return self
+
+    def stop(self):
+        for server in self.servers:
+            server.stop()
+
+    def settings(self):
+        return {
+            'RAZORPAY_API_URL': self.razorpay.url,
+            'RESEND_API_URL': self.resend.url,
+            'WHATSAPP_API_URL': f'{self.meta.url}/v18.0',
+        }
+
+    def calls(self):
+        return {server.name: sum(server.calls.values()) for server in self.servers}
+
+
+def start_stubs(latency=0, host='127.0.0.1', base_port=0):
+    return ProviderStubs(latency, host, base_port).start()
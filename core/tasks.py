@@ -1,52 +1,80 @@
-from celery import shared_task
-from django.core.mail import EmailMultiAlternatives
+from celery import shared_task, chain, group
+from celery.exceptions import Ignore
+from celery.signals import worker_process_init
 from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from django.db.models import F
 from io import BytesIO
 import base64
 import requests
 import re
-import weasyprint
-import qrcode
-import qrcode.constants
-from .models import Booking
+from . import pdf, qr
+from .artifacts import build_ticket_html, build_ticket_pdf
+from .orders import apply_payment_events
+from .reservations import expire_stale
+from .models import Booking, TicketDelivery
 
+# Retry policy for the delivery channels: exponential backoff starting at
+# DELIVERY_RETRY_BACKOFF seconds, capped at DELIVERY_RETRY_BACKOFF_MAX.
+DELIVERY_MAX_RETRIES = getattr(settings, 'DELIVERY_MAX_RETRIES', 5)
+DELIVERY_RETRY_BACKOFF = getattr(settings, 'DELIVERY_RETRY_BACKOFF', 30)
+DELIVERY_RETRY_BACKOFF_MAX = getattr(settings, 'DELIVERY_RETRY_BACKOFF_MAX', 600)
 
-@shared_task
-def send_ticket_email(booking_id):
-    try:
-        booking = Booking.objects.get(id=booking_id)
-    except Booking.DoesNotExist:
-        return f"Booking {booking_id} not found."
 
-    if booking.status != 'paid':
-        return f"Booking {booking_id} is not paid."
+@worker_process_init.connect
+def warm_pdf_renderer(**kwargs):
+    # Pay WeasyPrint's stylesheet parsing and font loading once per worker process, not per ticket
+    pdf.warm()
+
+
+class TransientDeliveryError(Exception):
+    """Provider answered with a rate limit or server error — worth another attempt."""
 
-    event = booking.ticket_type.event
 
-    # Generate QR Code
-    qr = qrcode.QRCode(
-        version=1,
-        error_correction=qrcode.constants.ERROR_CORRECT_L,
-        box_size=10,
-        border=4,
+def _check_transient(resp):
+    if resp.status_code == 429 or resp.status_code >= 500:
+        raise TransientDeliveryError(f"HTTP {resp.status_code}: {resp.text[:500]}")
+
+
+def _set_delivery(booking_id, channel, status, detail=''):
+    # .update() skips auto_now, so stamp updated_at explicitly.
+    TicketDelivery.objects.filter(booking_id=booking_id, channel=channel).update(
+        status=status, detail=detail, updated_at=timezone.now()
     )
-    qr.add_data(
-        f"ID:{booking.id}|{booking.customer_name}|{booking.ticket_type.name} x{booking.quantity}|Colour Carnival 1.0"
+
+
+def _start_attempt(booking_id, channel):
+    TicketDelivery.objects.get_or_create(booking_id=booking_id, channel=channel)
+    TicketDelivery.objects.filter(booking_id=booking_id, channel=channel).update(
+        attempts=F('attempts') + 1, updated_at=timezone.now()
     )
-    qr.make(fit=True)
-    img = qr.make_image(fill_color="black", back_color="white")
-    img_stream = BytesIO()
-    img.save(img_stream, format='PNG')
-    img_stream.seek(0)
-    qr_b64 = base64.b64encode(img_stream.read()).decode('utf-8')
-    img_stream.seek(0)
+
+
+def _retry_or_fail(task, booking_id, channel, exc):
+    """Re-schedule the task with backoff, or mark the channel failed once retries run out."""
+    if task.request.retries >= DELIVERY_MAX_RETRIES:
+        _set_delivery(booking_id, channel, 'failed', str(exc))
+        raise exc
+    _set_delivery(booking_id, channel, 'retrying', str(exc))
+    countdown = min(DELIVERY_RETRY_BACKOFF * 2 ** task.request.retries, DELIVERY_RETRY_BACKOFF_MAX)
+    raise task.retry(exc=exc, countdown=countdown, max_retries=DELIVERY_MAX_RETRIES)
+
+
+def _paid_booking(booking_id):
+    booking = Booking.objects.select_related('ticket_type__event').filter(id=booking_id).first()
+    if booking is None or booking.status != 'paid':
+        return None
+    return booking
+
+
+def _email_bodies(booking):
+    event = booking.ticket_type.event
 
     # Build ticket download URL
     site_url = getattr(settings, 'SITE_URL', 'https://colour-carnival.onrender.com')
     ticket_url = f"{site_url}/ticket/{booking.order_id}/"
 
-    subject = f"Your Ticket — Colour Carnival 1.0 🎉"
-
     # Plain text fallback
     text_body = f"""
 Dear {booking.customer_name},
@@ -73,7 +101,6 @@ For queries: 9145452609 / 9359176168 | @colourcarnival_1.0
 See you there! 🌈
 — Colour Carnival Team
     """
-
     # HTML email body
     html_body = f"""
 <!DOCTYPE html>
@@ -140,177 +167,263 @@ See you there! 🌈
 </body>
 </html>
     """
+    return text_body, html_body
+
+
+def _email_configured():
+    return bool(getattr(settings, 'RESEND_API_KEY', ''))
+
+
+def _whatsapp_configured():
+    return bool(getattr(settings, 'WHATSAPP_PHONE_NUMBER_ID', '') and getattr(settings, 'WHATSAPP_ACCESS_TOKEN', ''))
+
+
+def _fail(booking_id, channel, detail):
+    """Mark a channel permanently failed and stop the rest of its branch."""
+    _set_delivery(booking_id, channel, 'failed', detail)
+    raise Ignore(detail)
+
+
+def _queue_delivery(booking, channel):
+    TicketDelivery.objects.update_or_create(
+        booking=booking, channel=channel, defaults={'status': 'queued', 'detail': ''}
+    )
+
+
+def _skip_delivery(booking, channel, detail):
+    TicketDelivery.objects.update_or_create(
+        booking=booking, channel=channel, defaults={'status': 'skipped', 'detail': detail}
+    )
+
+
+@shared_task
+def send_ticket_email(booking_id):
+    """
+    Fan out delivery of a paid booking:
+
+        render_ticket_qr ─┬─ email_ticket
+                          └─ render_ticket_pdf → upload_ticket_media → send_whatsapp_ticket
+
+    The two branches run in parallel and retry independently, so a slow or failing
+    provider never delays or re-runs the other channel. Unconfigured channels are
+    skipped up front (no PDF is rendered when WhatsApp is off).
+    """
+    booking = _paid_booking(booking_id)
+    if booking is None:
+        return f"Booking {booking_id} not found or not paid."
+
+    branches = []
+    if _email_configured():
+        _queue_delivery(booking, 'email')
+        branches.append(email_ticket.s(booking_id))
+    else:
+        _skip_delivery(booking, 'email', 'No Resend key')
+
+    if _whatsapp_configured():
+        _queue_delivery(booking, 'whatsapp')
+        branches.append(chain(
+            render_ticket_pdf.s(booking_id),
+            upload_ticket_media.s(booking_id),
+            send_whatsapp_ticket.s(booking_id),
+        ))
+    else:
+        _skip_delivery(booking, 'whatsapp', 'No API keys')
+
+    if not branches:
+        # Still render the QR now so the ticket page is served from cache
+        render_ticket_qr.delay(booking_id)
+        return f"No delivery channels configured for booking {booking_id}"
+
+    chain(render_ticket_qr.s(booking_id), group(branches)).delay()
+    return f"Queued {len(branches)} delivery branch(es) for booking {booking_id}"
+
+
+@shared_task
+def render_ticket_qr(booking_id):
+    """Warm the QR cache for every preset (ticket page included) and return the email-sized image."""
+    booking = _paid_booking(booking_id)
+    if booking is None:
+        raise Ignore(f"Booking {booking_id} not found or not paid.")
+    qr.warm_booking_qr(booking)
+    return qr.booking_qr_b64(booking, qr.EMAIL)
+
+
+@shared_task(bind=True, max_retries=DELIVERY_MAX_RETRIES)
+def email_ticket(self, qr_b64, booking_id):
+    booking = _paid_booking(booking_id)
+    if booking is None:
+        raise Ignore(f"Booking {booking_id} not found or not paid.")
+
+    _start_attempt(booking_id, 'email')
 
-    # --- Resend Email Delivery ---
-    resend_key = getattr(settings, 'RESEND_API_KEY', '')
-    
     # Force the Resend Sandbox email since the user's gmail.com domain isn't verified
     from_email = 'Colour Carnival <onboarding@resend.dev>'
+    subject = f"Your Ticket — Colour Carnival 1.0 🎉"
+    text_body, html_body = _email_bodies(booking)
 
-    email_status = "Skipped (No Resend Key)"
-    
-    if resend_key:
-        try:
-            resend_url = "https://api.resend.com/emails"
-            headers = {
-                "Authorization": f"Bearer {resend_key}",
-                "Content-Type": "application/json"
-            }
-            payload = {
-                "from": from_email,
-                "to": [booking.customer_email],
-                "subject": subject,
-                "html": html_body,
-                "text": text_body,
-                "attachments": [
-                    {
-                        "filename": f"ticket_qr_{booking.id}.png",
-                        "content": qr_b64
-                    }
-                ]
-            }
-            resp = requests.post(resend_url, headers=headers, json=payload, timeout=10)
-            if resp.status_code in [200, 201]:
-                email_status = "Sent"
-            else:
-                email_status = f"Failed: {resp.text}"
-        except Exception as e:
-            email_status = f"Error: {str(e)}"
-
-    # --- WhatsApp Ticket Delivery ---
-    whatsapp_status = "Skipped (No API Keys)"
-    phone_id = getattr(settings, 'WHATSAPP_PHONE_NUMBER_ID', '')
-    token = getattr(settings, 'WHATSAPP_ACCESS_TOKEN', '')
-
-    if phone_id and token:
-        try:
-            clean_phone = re.sub(r'\D', '', booking.customer_phone)
-            if len(clean_phone) == 10:
-                clean_phone = f"91{clean_phone}"
-
-            pdf_html = f"""
-            <!DOCTYPE html>
-            <html>
-            <head>
-            <meta charset="UTF-8">
-            <style>
-              body {{ font-family: 'Helvetica Neue', Arial, sans-serif; background: #fff; margin: 0; padding: 20px; }}
-              .wrapper {{ max-width: 600px; margin: 0 auto; border: 2px solid #333; border-radius: 12px; overflow: hidden; }}
-              .header {{ background: #E8182A; padding: 20px; text-align: center; color: #fff; border-bottom: 4px solid #333; }}
-              .header h1 {{ margin: 0; font-size: 28px; text-transform: uppercase; letter-spacing: 2px; }}
-              .receipt-badge {{ background: #222; color: #fff; font-size: 16px; font-weight: 700; text-align: center; padding: 10px; text-transform: uppercase; letter-spacing: 1px; }}
-              .body {{ padding: 30px; }}
-              .table {{ width: 100%; border-collapse: collapse; margin-bottom: 30px; font-size: 16px; }}
-              .table td {{ padding: 12px 10px; border-bottom: 1px solid #eee; }}
-              .table td:first-child {{ font-weight: bold; color: #555; width: 40%; }}
-              .amount {{ color: #E8182A; font-weight: bold; font-size: 18px; }}
-              .qr-container {{ text-align: center; margin: 20px 0; padding: 20px; background: #f9f9f9; border-radius: 8px; border: 1px dashed #ccc; }}
-              .qr-container img {{ width: 220px; height: 220px; }}
-              .qr-hint {{ font-size: 14px; color: #666; margin-top: 10px; font-weight: bold; }}
-              .footer {{ text-align: center; padding: 20px; font-size: 12px; color: #888; border-top: 1px solid #eee; margin-top: 20px; }}
-            </style>
-            </head>
-            <body>
-            <div class="wrapper">
-              <div class="header">
-                <h1>Colour Carnival 1.0</h1>
-                <p style="margin: 5px 0 0; opacity: 0.9;">Official Event Ticket</p>
-              </div>
-              <div class="receipt-badge">Payment Receipt / Admittance Pass</div>
-              <div class="body">
-                <p><strong>Name:</strong> {booking.customer_name}</p>
-                <table class="table">
-                  <tr><td>🎪 Event</td><td>{event.title}</td></tr>
-                  <tr><td>🎟 Ticket Type</td><td>{booking.ticket_type.name}</td></tr>
-                  <tr><td>🔢 Quantity</td><td>{booking.quantity} Person(s)</td></tr>
-                  <tr><td>💳 Total Paid</td><td class="amount">₹{booking.total_amount}</td></tr>
-                  <tr><td>🔑 Payment ID</td><td>{booking.payment_id}</td></tr>
-                  <tr><td>📋 Booking ID</td><td>#{booking.id}</td></tr>
-                </table>
-                
-                <div class="qr-container">
-                  <img src="data:image/png;base64,{qr_b64}" alt="Ticket QR Code" />
-                  <div class="qr-hint">Scan this QR Code at the Entry Gate</div>
-                </div>
-
-                <div style="font-size: 14px; color: #444; text-align: center; margin-top: 30px;">
-                  <p><strong>📅 Date:</strong> 8th March, 2026 | 10:00 AM – 4:00 PM</p>
-                  <p><strong>📍 Venue:</strong> Pandhurang Lawns, Guruvar Peth, Ambajogai – 431517</p>
-                </div>
-              </div>
-              <div class="footer">
-                Colour Carnival &copy; 2026 | Support: 9145452609 / 9359176168
-              </div>
-            </div>
-            </body>
-            </html>
-            """
-
-            # Step 1: Generate PDF from the HTML Receipt Body
-            pdf_bytes = weasyprint.HTML(string=pdf_html).write_pdf()
-
-            # Step 2: Upload PDF to Meta API (Media Endpoint)
-            media_url = f"https://graph.facebook.com/v18.0/{phone_id}/media"
-            media_headers = {
-                "Authorization": f"Bearer {token}"
+    try:
+        resend_url = f"{settings.RESEND_API_URL}/emails"
+        headers = {
+            "Authorization": f"Bearer {settings.RESEND_API_KEY}",
+            "Content-Type": "application/json"
+        }
+        payload = {
+            "from": from_email,
+            "to": [booking.customer_email],
+            "subject": subject,
+            "html": html_body,
+            "text": text_body,
+            "attachments": [
+                {
+                    "filename": f"ticket_qr_{booking.id}.png",
+                    "content": qr_b64
+                }
+            ]
+        }
+        resp = requests.post(resend_url, headers=headers, json=payload, timeout=10)
+        _check_transient(resp)
+    except (requests.RequestException, TransientDeliveryError) as e:
+        return _retry_or_fail(self, booking_id, 'email', e)
+
+    if resp.status_code not in [200, 201]:
+        _fail(booking_id, 'email', f"Failed: {resp.text}")
+    _set_delivery(booking_id, 'email', 'sent')
+    return "Sent"
+
+
+@shared_task
+def render_ticket_pdf(qr_b64, booking_id):
+    """CPU-bound WeasyPrint render, routed to its own `pdf` queue (see CELERY_TASK_ROUTES)."""
+    booking = _paid_booking(booking_id)
+    if booking is None:
+        raise Ignore(f"Booking {booking_id} not found or not paid.")
+    pdf_bytes = pdf.render_pdf(pdf.ticket_pdf_html(booking, qr_b64))
+    return base64.b64encode(pdf_bytes).decode('utf-8')
+
+
+@shared_task(bind=True, max_retries=DELIVERY_MAX_RETRIES)
+def upload_ticket_media(self, pdf_b64, booking_id):
+    """Upload the ticket PDF to the Meta media endpoint and return its media id."""
+    # The attempt is counted once, by send_whatsapp_ticket
+    phone_id = settings.WHATSAPP_PHONE_NUMBER_ID
+    try:
+        media_url = f"{settings.WHATSAPP_API_URL}/{phone_id}/media"
+        media_headers = {
+            "Authorization": f"Bearer {settings.WHATSAPP_ACCESS_TOKEN}"
+        }
+        # Use BytesIO to give the raw bytes a proper file-like interface for requests
+        files = {
+            "file": (f"Colour-Carnival-Ticket-{booking_id}.pdf", BytesIO(base64.b64decode(pdf_b64)), "application/pdf")
+        }
+        data = {"messaging_product": "whatsapp"}
+        media_response = requests.post(media_url, headers=media_headers, data=data, files=files, timeout=15)
+        _check_transient(media_response)
+    except (requests.RequestException, TransientDeliveryError) as e:
+        return _retry_or_fail(self, booking_id, 'whatsapp', e)
+
+    if media_response.status_code not in [200, 201]:
+        _fail(booking_id, 'whatsapp', f"Media Upload Failed: {media_response.text}")
+    return media_response.json().get('id')
+
+
+@shared_task(bind=True, max_retries=DELIVERY_MAX_RETRIES)
+def send_whatsapp_ticket(self, media_id, booking_id):
+    booking = _paid_booking(booking_id)
+    if booking is None:
+        raise Ignore(f"Booking {booking_id} not found or not paid.")
+
+    _start_attempt(booking_id, 'whatsapp')
+
+    clean_phone = re.sub(r'\D', '', booking.customer_phone)
+    if len(clean_phone) == 10:
+        clean_phone = f"91{clean_phone}"
+
+    try:
+        message_url = f"{settings.WHATSAPP_API_URL}/{settings.WHATSAPP_PHONE_NUMBER_ID}/messages"
+        headers = {
+            "Authorization": f"Bearer {settings.WHATSAPP_ACCESS_TOKEN}",
+            "Content-Type": "application/json"
+        }
+
+        # We send a standard document message instead of a template.
+        # Note: Sending free-form messages requires the user to have initiated the chat within 24h,
+        # OR we must use a pre-approved template that supports document headers.
+        # Assuming this is a business-initiated standard template with a documented header:
+        payload = {
+            "messaging_product": "whatsapp",
+            "to": clean_phone,
+            "type": "document",
+            "document": {
+                "id": media_id,
+                "caption": f"🎟 Colour Carnival Ticket - #{booking.id}\nThank you {booking.customer_name}! Show the attached QR code at the entry gate.",
+                "filename": f"Colour-Carnival-Ticket-#{booking.id}.pdf"
             }
-            # Use BytesIO to give the raw bytes a proper file-like interface for requests
-            files = {
-                "file": (f"Colour-Carnival-Ticket-{booking.id}.pdf", BytesIO(pdf_bytes), "application/pdf")
+        }
+
+        msg_response = requests.post(message_url, headers=headers, json=payload, timeout=10)
+        _check_transient(msg_response)
+
+        if msg_response.status_code in [200, 201]:
+            whatsapp_status = f"Sent Document to {clean_phone}"
+            _set_delivery(booking_id, 'whatsapp', 'sent', whatsapp_status)
+            return whatsapp_status
+
+        # Fallback to the pre-approved hello_world template if Meta rejects free-form documents
+        # (Meta blocks raw files if the customer hasn't messaged the business in 24 hours)
+        fallback_payload = {
+            "messaging_product": "whatsapp",
+            "to": clean_phone,
+            "type": "template",
+            "template": {
+                "name": "hello_world",
+                "language": { "code": "en_US" }
             }
-            data = {"messaging_product": "whatsapp"}
-            media_response = requests.post(media_url, headers=media_headers, data=data, files=files, timeout=15)
-            
-            if media_response.status_code in [200, 201]:
-                media_id = media_response.json().get('id')
-                
-                # Step 3: Send WhatsApp Message with Document Attachment
-                message_url = f"https://graph.facebook.com/v18.0/{phone_id}/messages"
-                headers = {
-                    "Authorization": f"Bearer {token}",
-                    "Content-Type": "application/json"
-                }
-                
-                # We send a standard document message instead of a template.
-                # Note: Sending free-form messages requires the user to have initiated the chat within 24h,
-                # OR we must use a pre-approved template that supports document headers.
-                # Assuming this is a business-initiated standard template with a documented header:
-                payload = {
-                    "messaging_product": "whatsapp",
-                    "to": clean_phone,
-                    "type": "document",
-                    "document": {
-                        "id": media_id,
-                        "caption": f"🎟 Colour Carnival Ticket - #{booking.id}\nThank you {booking.customer_name}! Show the attached QR code at the entry gate.",
-                        "filename": f"Colour-Carnival-Ticket-#{booking.id}.pdf"
-                    }
-                }
-                
-                msg_response = requests.post(message_url, headers=headers, json=payload, timeout=10)
-                
-                if msg_response.status_code in [200, 201]:
-                    whatsapp_status = f"Sent Document to {clean_phone}"
-                else:
-                    # Fallback to the pre-approved hello_world template if Meta rejects free-form documents
-                    # (Meta blocks raw files if the customer hasn't messaged the business in 24 hours)
-                    fallback_payload = {
-                        "messaging_product": "whatsapp",
-                        "to": clean_phone,
-                        "type": "template",
-                        "template": {
-                            "name": "hello_world",
-                            "language": { "code": "en_US" }
-                        }
-                    }
-                    fallback_resp = requests.post(message_url, headers=headers, json=fallback_payload, timeout=10)
-                    if fallback_resp.status_code in [200, 201]:
-                        whatsapp_status = f"Sent 'hello_world' Template to {clean_phone} (Document blocked by Meta 24h rule)"
-                    else:
-                        whatsapp_status = f"Document Failed: {msg_response.text} | Template Failed: {fallback_resp.text}"
-            else:
-                whatsapp_status = f"Media Upload Failed: {media_response.text}"
-                
-        except Exception as e:
-            whatsapp_status = f"Error: {str(e)}"
-
-    return f"Resend Email: {email_status} | WhatsApp: {whatsapp_status}"
+        }
+        fallback_resp = requests.post(message_url, headers=headers, json=fallback_payload, timeout=10)
+        _check_transient(fallback_resp)
+    except (requests.RequestException, TransientDeliveryError) as e:
+        return _retry_or_fail(self, booking_id, 'whatsapp', e)
+
+    if fallback_resp.status_code not in [200, 201]:
+        _fail(booking_id, 'whatsapp', f"Document Failed: {msg_response.text} | Template Failed: {fallback_resp.text}")
+    whatsapp_status = f"Sent 'hello_world' Template to {clean_phone} (Document blocked by Meta 24h rule)"
+    _set_delivery(booking_id, 'whatsapp', 'sent', whatsapp_status)
+    return whatsapp_status
+
+
+@shared_task
+def build_ticket_artifacts(order_id):
+    """Pre-render the ticket page and PDF for a paid order (routed to the `pdf` queue)."""
+    html = build_ticket_html(order_id)
+    if html is None:
+        return f"Order {order_id} has no paid bookings."
+    build_ticket_pdf(order_id)
+    return f"Built ticket artifacts for order {order_id}"
+
+
+@shared_task
+def expire_reservations():
+    """Periodic (CELERY_BEAT_SCHEDULE): release stock held by checkouts that were never paid."""
+    return f"Expired {expire_stale()} reservation(s)"
+
+
+def deliver_paid(paid):
+    """Queue ticket delivery and artifacts for {order_id: [booking ids]} once the paid status is committed."""
+    for order_id, booking_ids in paid.items():
+        for booking_id in booking_ids:
+            transaction.on_commit(lambda booking_id=booking_id: send_ticket_email.delay(booking_id))
+        transaction.on_commit(lambda order_id=order_id: build_ticket_artifacts.delay(order_id))
+
+
+@shared_task
+def process_payment_events():
+    """Apply Razorpay webhook events from the inbox in batches (queued by payment_webhook, and periodic)."""
+    applied = orders = 0
+    while True:
+        with transaction.atomic():
+            events, paid = apply_payment_events()
+            deliver_paid(paid)
+        if not events:
+            return f"Applied {applied} payment event(s), {orders} order(s) paid"
+        applied += len(events)
+        orders += len(paid)
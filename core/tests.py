@@ -1,3 +1,729 @@
-from django.test import TestCase
+import json
+import subprocess
+import sys
+import threading
+import unittest
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+import requests
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core import signing
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.urls import path
+from django.utils import timezone
+
+from . import checks, exports, fragments, gate, inventory, payments, pricing, qr, tasks, urls, views, waiting_room
+from .models import Booking, Event, Order, PaymentEvent, QRImage, Reservation, TicketDelivery, TicketSales, TicketType
+from .orders import apply_payment_events, confirm_payments, mark_paid, recover_failed
+from .pricing import StockError
+from .reservations import RESERVATION_TTL, available_quantities, expire_stale, release_order, reserve
+
+
+# Tests don't run collectstatic, so there is no manifest to look static files up in
+@override_settings(STORAGES={
+    **settings.STORAGES,
+    'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'},
+})
+class CheckoutTestCase(TestCase):
+    def setUp(self):
+        self.event = Event.objects.create(title='Test', description='', venue_name='-', venue_address='-', is_published=True)
+        self.ticket = TicketType.objects.create(event=self.event, name='General', price=500, quantity_available=5)
+
+    def checkout(self, order_id, quantity=1):
+        """What the checkout view does: hold the stock, then create the pending order and its booking."""
+        with transaction.atomic():
+            reserve(order_id, self.event, [(self.ticket, quantity)])
+            order = Order.objects.create(
+                order_id=order_id, event=self.event, customer_name='Buyer', customer_email='buyer@example.com',
+                customer_phone='9999999999', total_amount=self.ticket.price * quantity,
+            )
+            Booking.objects.create(
+                ticket_type=self.ticket, order=order, customer_name='Buyer', customer_email='buyer@example.com',
+                customer_phone='9999999999', quantity=quantity, total_amount=self.ticket.price * quantity,
+            )
+        return order
+
+    def assertSold(self, sold):
+        self.ticket.refresh_from_db()
+        self.assertEqual(self.ticket.quantity_available, 5 - sold)
+        self.assertEqual(TicketSales.objects.filter(ticket_type=self.ticket).values_list('sold', flat=True).first() or 0, sold)
+
+
+@override_settings(RAZORPAY_WEBHOOK_SECRET='webhook-secret')
+class PaymentConfirmationTests(CheckoutTestCase):
+    def webhook(self, event_id, order_id, payment_id='pay_1', event='payment.captured'):
+        body = json.dumps({
+            'event': event,
+            'payload': {'payment': {'entity': {'id': payment_id, 'order_id': order_id}}},
+        }).encode()
+        with mock.patch('core.views.process_payment_events'):
+            return self.client.post(
+                '/payment/webhook/', body, content_type='application/json',
+                HTTP_X_RAZORPAY_SIGNATURE=payments.FakeGateway('').sign_webhook(body),
+                HTTP_X_RAZORPAY_EVENT_ID=event_id,
+            )
+
+    def apply(self):
+        with transaction.atomic():
+            return apply_payment_events()
+
+    def test_duplicate_webhook_is_recorded_once(self):
+        self.checkout('order_a', 2)
+        self.assertEqual(self.webhook('evt_1', 'order_a').status_code, 200)
+        self.assertEqual(self.webhook('evt_1', 'order_a').status_code, 200)
+        self.assertEqual(PaymentEvent.objects.count(), 1)
+
+        events, paid = self.apply()
+        self.assertEqual(len(events), 1)
+        self.assertEqual(list(paid), ['order_a'])
+        self.assertEqual(self.apply(), ([], {}))
+        self.assertEqual(Order.objects.get(order_id='order_a').status, 'paid')
+        self.assertSold(2)
+
+    def test_both_paid_events_in_one_batch_pay_once(self):
+        self.checkout('order_a', 2)
+        self.webhook('evt_1', 'order_a')
+        self.webhook('evt_2', 'order_a', event='order.paid')
+        self.apply()
+        self.assertSold(2)
+
+    def test_mark_paid_is_repeatable(self):
+        self.checkout('order_a', 2)
+        with transaction.atomic():
+            self.assertEqual(len(mark_paid({'order_a': 'pay_1'})['order_a']), 1)
+        with transaction.atomic():
+            self.assertEqual(mark_paid({'order_a': 'pay_1'}), {})
+        self.assertSold(2)
+
+    @override_settings(LOCAL_PAYMENT_BYPASS=True)
+    def test_browser_then_webhook_confirm_once(self):
+        self.checkout('order_a', 2)
+        response = self.client.post('/payment/verify/', {'razorpay_order_id': 'order_a', 'bypass': 'true'})
+        self.assertContains(response, 'Payment Successful')
+        self.webhook('evt_1', 'order_a')
+        events, paid = self.apply()
+        self.assertEqual((len(events), paid), (1, {}))
+        self.assertSold(2)
+
+    def test_captured_payment_recovers_failed_order(self):
+        self.checkout('order_a', 2)
+        release_order('order_a')  # e.g. the hold expired while the buyer was paying
+        self.webhook('evt_1', 'order_a')
+        events, paid = self.apply()
+        self.assertEqual(list(paid), ['order_a'])
+        self.assertEqual(Order.objects.get(order_id='order_a').status, 'paid')
+        self.assertEqual(Booking.objects.get(order_id='order_a').status, 'paid')
+        self.assertFalse(PaymentEvent.objects.get().refund_due)
+        self.assertSold(2)
+
+    def test_captured_payment_for_sold_out_failed_order_is_flagged_for_refund(self):
+        self.checkout('order_a', 2)
+        release_order('order_a')
+        self.checkout('order_b', 5)  # the released stock sold to someone else
+        self.webhook('evt_1', 'order_a')
+        with self.assertLogs('core.orders', 'ERROR'):
+            _, paid = self.apply()
+        self.assertEqual(paid, {})
+        order = Order.objects.get(order_id='order_a')
+        self.assertEqual((order.status, order.payment_id), ('refund_due', 'pay_1'))
+        event = PaymentEvent.objects.get()
+        self.assertTrue(event.refund_due)
+        self.assertIsNone(event.processed_at)
+        self.assertEqual(self.apply(), ([], {}))
+        self.assertEqual(Order.objects.get(order_id='order_b').status, 'pending')
+        self.assertSold(0)
+
+    @override_settings(LOCAL_PAYMENT_BYPASS=True)
+    def test_payment_verify_for_sold_out_failed_order_tells_the_buyer(self):
+        self.checkout('order_a', 2)
+        release_order('order_a')
+        self.checkout('order_b', 5)
+        with self.assertLogs('core.orders', 'ERROR'):
+            response = self.client.post('/payment/verify/', {'razorpay_order_id': 'order_a', 'bypass': 'true'})
+        self.assertContains(response, 'will be refunded')
+        self.assertEqual(Order.objects.get(order_id='order_a').status, 'refund_due')
+
+
+@override_settings(LOCAL_PAYMENT_BYPASS=True)
+class PaymentVerifyTests(CheckoutTestCase):
+    def verify(self, order_id):
+        return self.client.post('/payment/verify/', {'razorpay_order_id': order_id, 'bypass': 'true'})
+
+    def test_order_is_paid_once_however_often_it_is_submitted(self):
+        self.checkout('order_a', 2)
+        self.checkout('order_b', 1)
+        for _ in range(2):
+            self.assertTemplateUsed(self.verify('order_a'), 'core/payment_success.html')
+        self.assertEqual(Order.objects.get(order_id='order_a').status, 'paid')
+        self.assertEqual(Order.objects.get(order_id='order_b').status, 'pending')
+        self.assertSold(2)
+
+    def test_unknown_order_is_sent_home(self):
+        self.assertRedirects(self.verify('order_missing'), '/', fetch_redirect_response=False)
+
+
+class AttendeeExportTests(CheckoutTestCase):
+    def setUp(self):
+        super().setUp()
+        for n in range(3):
+            self.checkout(f'order_{n}', 1)
+        with transaction.atomic():
+            mark_paid({f'order_{n}': f'pay_{n}' for n in range(3)})
+        self.staff = User.objects.create_user('staff', password='-', is_staff=True)
+        self.url = f'/organizer/event/{self.event.id}/attendees/export.csv'
+
+    def test_csv_export(self):
+        self.client.force_login(self.staff)
+        response = self.client.get(self.url)
+        self.assertFalse(response.is_async)
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual(len(lines), 4)
+        self.assertIn('order_2', lines[-1])
+
+    @override_settings(ASYNC_VIEWS=True)
+    async def test_csv_export_streams_asynchronously_under_asgi(self):
+        await self.async_client.aforce_login(self.staff)
+        response = await self.async_client.get(self.url)
+        self.assertTrue(response.is_async)
+        lines = b''.join([chunk async for chunk in response.streaming_content]).decode().splitlines()
+        self.assertEqual(len(lines), 4)
+        self.assertIn('order_2', lines[-1])
+
+    @mock.patch('core.views.ATTENDEES_PAGE_SIZE', 2)
+    def test_attendee_pages_split_bookings_booked_in_the_same_instant(self):
+        self.checkout('order_3', 1)
+        with transaction.atomic():
+            mark_paid({'order_3': 'pay_3'})
+        Booking.objects.update(created_at=timezone.now())  # every cursor ties on created_at
+        self.client.force_login(self.staff)
+        url = f'/organizer/event/{self.event.id}/attendees/'
+
+        first = self.client.get(url)
+        second = self.client.get(url, {'after': first.context['next_cursor']})
+        pages = [[booking.id for booking in page.context['bookings']] for page in (first, second)]
+        ids = sorted(Booking.objects.values_list('id', flat=True), reverse=True)
+        self.assertEqual(pages, [ids[:2], ids[2:]])
+        # Four bookings fill exactly two pages: no cursor to an empty third one
+        self.assertIsNone(second.context['next_cursor'])
+        self.assertTrue(self.client.get(url, {'after': 'garbage'}).context['is_first_page'])
+
+    def test_formulas_in_buyer_fields_are_exported_as_text(self):
+        Booking.objects.filter(order_id='order_0').update(customer_name='=HYPERLINK("http://x")', customer_email='@SUM(A1)')
+        rows = list(exports.attendee_rows(self.event))
+        line = ''.join(exports.csv_stream(rows[:1])).splitlines()[-1]
+        self.assertIn("'=HYPERLINK", line)
+        self.assertIn("'@SUM(A1)", line)
+        self.assertIn("<t xml:space=\"preserve\">'=HYPERLINK", exports._row(2, rows[0]))
+        self.assertIn('9999999999', line)
+
+
+class PricingTests(CheckoutTestCase):
+    def test_selection_is_loaded_in_one_query(self):
+        vip = TicketType.objects.create(event=self.event, name='VIP', price=1500, quantity_available=5)
+        elsewhere = Event.objects.create(title='Other', description='', venue_name='-', venue_address='-')
+        foreign = TicketType.objects.create(event=elsewhere, name='General', price=100, quantity_available=5)
+        quantities = pricing.parse_quantities({
+            f'qty_{vip.id}': '1', f'qty_{self.ticket.id}': '2', f'qty_{foreign.id}': '3', 'qty_x': '1', f'qty_{vip.id}0': '0',
+        })
+        with self.assertNumQueries(1):
+            lines = pricing.load_lines(self.event, quantities)
+        self.assertEqual(lines, [(self.ticket, 2), (vip, 1)])  # by id, other events' tickets dropped
+        self.assertEqual(pricing.lines_total(lines), 2500)
+
+    def test_update_total_answers_from_the_signed_manifest(self):
+        manifest = pricing.price_manifest([self.ticket])
+        with self.assertNumQueries(0):
+            response = self.client.get('/update-total/', {f'qty_{self.ticket.id}': '3', 'price_manifest': manifest})
+        self.assertContains(response, '1500.00')
+
+        # A manifest edited in the browser is ignored: the price comes from the server's table
+        payload, signature = manifest.split(':', 1)
+        cheaper = signing.b64_encode(json.dumps({str(self.ticket.id): '1.00'}, separators=(',', ':')).encode()).decode()
+        forged = f'{cheaper}:{signature}'
+        self.assertNotEqual(cheaper, payload)
+        pricing.invalidate_prices()
+        response = self.client.get('/update-total/', {f'qty_{self.ticket.id}': '3', 'price_manifest': forged})
+        self.assertContains(response, '1500.00')
+
+
+class IndexPageTests(CheckoutTestCase):
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+
+    def test_event_deleted_while_the_page_renders_is_left_out(self):
+        other = Event.objects.create(title='Gone', description='', venue_name='-', venue_address='-', is_published=True)
+
+        def cards_after_delete(event_ids):
+            other.delete()
+            return fragments.event_cards(event_ids)
+
+        with mock.patch('core.views.event_cards', cards_after_delete):
+            response = self.client.get('/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.context['event_cards']), 1)
+
+    def test_saving_a_ticket_type_rerenders_its_event_card(self):
+        self.assertContains(self.client.get('/'), 'General')
+        # A write that skips the signals leaves the cached card in place
+        TicketType.objects.filter(id=self.ticket.id).update(name='Early Bird')
+        self.assertNotContains(self.client.get('/'), 'Early Bird')
+
+        self.ticket.refresh_from_db()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.ticket.save()
+        self.assertContains(self.client.get('/'), 'Early Bird')
+
+
+@mock.patch('core.snapshot.INVENTORY_SNAPSHOT_MIN_REFRESH', 1)
+@mock.patch('core.snapshot.INVENTORY_SNAPSHOT_MAX_AGE', 10)
+@mock.patch('core.snapshot.time.time')
+class InventorySnapshotTests(CheckoutTestCase):
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+
+    def stock(self):
+        return self.client.get('/inventory/').json()['stock'][str(self.ticket.id)]
+
+    def test_sales_show_up_at_most_once_per_refresh_interval(self, now):
+        now.return_value = 1000.0
+        self.assertEqual(self.stock(), 5)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.checkout('order_a', 2)
+
+        # Polls inside MIN_REFRESH share the old snapshot, without touching the database
+        now.return_value = 1000.5
+        with self.assertNumQueries(0):
+            self.assertEqual(self.stock(), 5)
+        now.return_value = 1001.5
+        self.assertEqual(self.stock(), 3)
+        # Nothing changed since: served from the cache until MAX_AGE
+        now.return_value = 1005.0
+        with self.assertNumQueries(0):
+            self.assertEqual(self.stock(), 3)
+
+
+class ReservationTests(CheckoutTestCase):
+    """The orders in which checkout, payment, release and the expiry sweep can reach one order."""
+
+    def later(self):
+        return timezone.now() + RESERVATION_TTL + timedelta(minutes=1)
+
+    def available(self):
+        self.ticket.refresh_from_db()
+        return available_quantities([self.ticket])[self.ticket.id]
+
+    def statuses(self, order_id):
+        return Order.objects.get(order_id=order_id).status, Booking.objects.get(order_id=order_id).status
+
+    def test_reserve_holds_stock(self):
+        self.checkout('order_a', 3)
+        self.assertEqual(self.available(), 2)
+        with self.assertRaises(StockError), transaction.atomic():
+            reserve('order_b', self.event, [(self.ticket, 3)])
+        self.assertEqual(self.available(), 2)
+
+    def test_expiry_frees_stock_and_fails_the_order(self):
+        self.checkout('order_a', 3)
+        self.assertEqual(expire_stale(self.later()), 1)
+        self.assertEqual(self.available(), 5)
+        self.assertEqual(self.statuses('order_a'), ('failed', 'failed'))
+
+    def test_unswept_expired_hold_still_holds_stock(self):
+        # A's hold runs out, the sweep hasn't run yet: B can't take the stock A may still pay for
+        self.checkout('order_a', 5)
+        Reservation.objects.update(expires_at=timezone.now() - timedelta(minutes=1))
+        self.assertEqual(self.available(), 0)
+        with self.assertRaises(StockError), transaction.atomic():
+            reserve('order_b', self.event, [(self.ticket, 5)])
+        with transaction.atomic():
+            confirm_payments({'order_a': 'pay_a'})
+        self.assertEqual(self.statuses('order_a'), ('paid', 'paid'))
+        self.assertEqual(expire_stale(), 0)
+        self.assertSold(5)
+
+    def test_swept_order_paid_late_after_its_stock_sold_is_refunded(self):
+        self.checkout('order_a', 5)
+        Reservation.objects.update(expires_at=timezone.now() - timedelta(minutes=1))
+        self.assertEqual(expire_stale(), 1)
+        self.checkout('order_b', 5)
+        with self.assertLogs('core.orders', 'ERROR'), transaction.atomic():
+            paid, refund_due = confirm_payments({'order_a': 'pay_a', 'order_b': 'pay_b'})
+        self.assertEqual((list(paid), refund_due), (['order_b'], ['order_a']))
+        self.assertSold(5)  # never below zero
+
+    def test_release_then_expiry_frees_stock_once(self):
+        self.checkout('order_a', 3)
+        release_order('order_a')
+        release_order('order_a')
+        self.assertEqual(expire_stale(self.later()), 0)
+        self.assertEqual(self.available(), 5)
+        self.assertEqual(Reservation.objects.get().status, 'released')
+
+    def test_expiry_then_release_frees_stock_once(self):
+        self.checkout('order_a', 3)
+        expire_stale(self.later())
+        release_order('order_a')
+        self.assertEqual(self.available(), 5)
+        self.assertEqual(Reservation.objects.get().status, 'expired')
+
+    def test_expiry_leaves_paid_orders_alone(self):
+        self.checkout('order_a', 3)
+        with transaction.atomic():
+            mark_paid({'order_a': 'pay_1'})
+        self.assertEqual(expire_stale(self.later()), 0)
+        release_order('order_a')
+        self.assertEqual(self.statuses('order_a'), ('paid', 'paid'))
+        self.assertEqual(self.available(), 2)
+        self.assertSold(3)
+
+    def test_expired_order_paid_late_takes_its_stock_again(self):
+        self.checkout('order_a', 3)
+        expire_stale(self.later())
+        with transaction.atomic():
+            recover_failed({'order_a': 'pay_1'})
+            mark_paid({'order_a': 'pay_1'})
+        self.assertEqual(self.statuses('order_a'), ('paid', 'paid'))
+        self.assertEqual(self.available(), 2)
+        self.assertSold(3)
+
+    def test_sharded_release_and_expiry_credit_the_shards_once(self):
+        inventory.reshard(self.ticket.id, 2)
+        self.ticket.refresh_from_db()
+        self.checkout('order_a', 3)
+        self.checkout('order_b', 1)
+        self.assertEqual(self.available(), 1)
+        release_order('order_a')
+        expire_stale(self.later())
+        release_order('order_b')
+        self.assertEqual(self.available(), 5)
+
+
+@unittest.skipUnless(connection.vendor == 'postgresql', 'needs row locks (PostgreSQL)')
+class ConcurrentReservationTests(TransactionTestCase):
+    def test_concurrent_checkouts_and_sweeps_never_oversell(self):
+        event = Event.objects.create(title='Test', description='', venue_name='-', venue_address='-', is_published=True)
+        ticket = TicketType.objects.create(event=event, name='General', price=500, quantity_available=5)
+        held, barrier = [], threading.Barrier(12)
+
+        def buyer(n):
+            barrier.wait()
+            try:
+                with transaction.atomic():
+                    reserve(f'order_{n}', event, [(ticket, 1)])
+                held.append(n)
+            except StockError:
+                pass
+            finally:
+                connection.close()
+
+        def sweeper():
+            barrier.wait()
+            try:
+                expire_stale()
+                release_order('order_0')
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=buyer, args=(n,)) for n in range(10)]
+        threads += [threading.Thread(target=sweeper) for _ in range(2)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        active = Reservation.objects.filter(status='active').count()
+        self.assertLessEqual(active, 5)
+        self.assertEqual(available_quantities([ticket])[ticket.id], 5 - active)
+        self.assertEqual(len(held), active + Reservation.objects.filter(status='released').count())
+
+    def test_payment_racing_the_sweep_is_paid_or_refunded_never_lost(self):
+        event = Event.objects.create(title='Test', description='', venue_name='-', venue_address='-', is_published=True)
+        ticket = TicketType.objects.create(event=event, name='General', price=500, quantity_available=5)
+        for n in range(8):
+            with transaction.atomic():
+                if n < 5:  # the rest failed earlier and hold nothing
+                    reserve(f'order_{n}', event, [(ticket, 1)])
+                order = Order.objects.create(
+                    order_id=f'order_{n}', event=event, customer_name='Buyer', customer_email='buyer@example.com',
+                    customer_phone='9999999999', total_amount=500,
+                )
+                Booking.objects.create(
+                    ticket_type=ticket, order=order, customer_name='Buyer', customer_email='buyer@example.com',
+                    customer_phone='9999999999', quantity=1, total_amount=500,
+                    status='pending' if n < 5 else 'failed',
+                )
+        Order.objects.filter(order_id__in=[f'order_{n}' for n in range(5, 8)]).update(status='failed')
+        Reservation.objects.update(expires_at=timezone.now() - timedelta(minutes=1))
+        barrier = threading.Barrier(9)
+
+        def pay(n):
+            barrier.wait()
+            try:
+                with transaction.atomic():
+                    confirm_payments({f'order_{n}': f'pay_{n}'})
+            finally:
+                connection.close()
+
+        def sweep():
+            barrier.wait()
+            try:
+                expire_stale()
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=pay, args=(n,)) for n in range(8)] + [threading.Thread(target=sweep)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        statuses = list(Order.objects.values_list('status', flat=True))
+        self.assertEqual(set(statuses) - {'paid', 'refund_due'}, set())
+        ticket.refresh_from_db()
+        self.assertEqual(ticket.quantity_available, 5 - statuses.count('paid'))
+        self.assertGreaterEqual(ticket.quantity_available, 0)
+
+
+class QRCacheTests(CheckoutTestCase):
+    def test_a_qr_is_rendered_once_and_dropped_when_the_booking_changes(self):
+        self.checkout('order_a', 2)
+        with transaction.atomic():
+            mark_paid({'order_a': 'pay_1'})
+        booking = Booking.objects.get(order_id='order_a')
+
+        with mock.patch('core.qr.render_png', wraps=qr.render_png) as render:
+            with mock.patch.object(qr, '_memory', qr._LRU(8)):
+                first = qr.booking_qr_b64(booking)
+                self.assertEqual(qr.booking_qr_b64(booking), first)
+            # Another process starts with an empty memory cache and reads the shared row
+            with mock.patch.object(qr, '_memory', qr._LRU(8)):
+                self.assertEqual(qr.booking_qr_b64(booking), first)
+        self.assertEqual(render.call_count, 1)
+
+        booking.quantity = 1
+        booking.save()
+        self.assertFalse(QRImage.objects.filter(booking=booking).exists())
+
+
+class TicketDownloadTests(CheckoutTestCase):
+    def setUp(self):
+        super().setUp()
+        self.checkout('order_a', 2)
+        with transaction.atomic():
+            mark_paid({'order_a': 'pay_1'})
+        self.url = '/ticket/order_a/'
+
+    def test_repeat_visit_gets_304_until_the_booking_changes(self):
+        first = self.client.get(self.url)
+        self.assertEqual(first.status_code, 200)
+        self.assertIn('private', first['Cache-Control'])
+        etag = first['ETag']
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        booking = Booking.objects.get(order_id='order_a')
+        booking.customer_name = 'Renamed Buyer'
+        booking.save()
+        changed = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(changed.status_code, 200)
+        self.assertNotEqual(changed['ETag'], etag)
+        self.assertContains(changed, 'Renamed Buyer')
+
+    def test_unpaid_order_has_no_ticket(self):
+        self.checkout('order_b', 1)
+        self.assertRedirects(self.client.get('/ticket/order_b/'), '/', fetch_redirect_response=False)
+
+
+@mock.patch('core.views.GATE_API_KEY', 'gate-key')
+class GateCheckinTests(CheckoutTestCase):
+    def test_malformed_tokens_count_as_invalid(self):
+        self.checkout('order_a', 2)
+        with transaction.atomic():
+            (booking_id,) = mark_paid({'order_a': 'pay_1'})['order_a']
+        scans = [{'token': token} for token in (123, None, ['x'], {'a': 1}, 'cc1.nope', gate.make_token(booking_id, 2))]
+        response = self.client.post(
+            '/gate/checkins/', json.dumps({'scans': scans + ['not a scan']}), content_type='application/json',
+            HTTP_X_GATE_KEY='gate-key',
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['invalid'], 6)
+        self.assertEqual([result['status'] for result in response.json()['results']], ['admitted'])
+
+    def test_scan_admits_a_ticket_once(self):
+        self.checkout('order_a', 2)
+        with transaction.atomic():
+            (booking_id,) = mark_paid({'order_a': 'pay_1'})['order_a']
+
+        def scan(token, key='gate-key'):
+            return self.client.post('/gate/scan/', {'token': token}, HTTP_X_GATE_KEY=key)
+
+        token = gate.make_token(booking_id, 2)
+        prefix, booking, _quantity, signature = token.split('.')
+        self.assertEqual(scan(token, key='wrong').status_code, 403)
+        self.assertEqual(scan(f'{prefix}.{booking}.5.{signature}').status_code, 400)  # quantity altered
+        self.assertEqual(scan(token).json(), {'status': 'admitted', 'booking': booking_id, 'admit': 2})
+        self.assertEqual(scan(token).status_code, 409)
+
+    def test_batch_keeps_the_earliest_scan_whichever_gate_syncs_first(self):
+        self.checkout('order_a', 1)
+        with transaction.atomic():
+            (booking_id,) = mark_paid({'order_a': 'pay_1'})['order_a']
+        early, late = timezone.now() - timedelta(minutes=10), timezone.now() - timedelta(minutes=5)
+        self.assertEqual(gate.check_in_batch({booking_id: late}), {booking_id: ('admitted', late)})
+        self.assertEqual(gate.check_in_batch({booking_id: early}), {booking_id: ('admitted', early)})
+        self.assertEqual(gate.check_in_batch({booking_id: late}), {booking_id: ('already_checked_in', early)})
+        self.assertEqual(Booking.objects.get(id=booking_id).checked_in_at, early)
+
+
+class AsyncURLs:
+    """ROOT_URLCONF with the async checkout views, as core.urls picks them when ASYNC_VIEWS is on."""
+    urlpatterns = [
+        path('checkout/<int:event_id>/', views.acheckout, name='checkout'),
+        path('payment/verify/', views.apayment_verify, name='payment_verify'),
+        *urls.urlpatterns,
+    ]
+
+
+@override_settings(ROOT_URLCONF=AsyncURLs, LOCAL_PAYMENT_BYPASS=False)
+@mock.patch('core.payments._gateway', payments.FakeGateway('key-secret'))
+class AsyncCheckoutTests(CheckoutTestCase):
+    def buyer(self, quantity=2):
+        return {
+            'customer_name': 'Buyer', 'customer_email': 'buyer@example.com', 'customer_phone': '9999999999',
+            f'qty_{self.ticket.id}': str(quantity),
+        }
+
+    async def test_checkout_and_payment(self):
+        response = await self.async_client.post(f'/checkout/{self.event.id}/', self.buyer())
+        self.assertRedirects(response, '/checkout/', fetch_redirect_response=False)
+        order = await Order.objects.aget()
+        self.assertEqual(await Reservation.objects.filter(order_id=order.order_id).acount(), 1)
+
+        response = await self.async_client.post('/payment/verify/', {
+            'razorpay_order_id': order.order_id, 'razorpay_payment_id': 'pay_1',
+            'razorpay_signature': payments.gateway().sign(order.order_id, 'pay_1'),
+        })
+        self.assertTemplateUsed(response, 'core/payment_success.html')
+        self.assertEqual((await Order.objects.aget()).status, 'paid')
+        await sync_to_async(self.assertSold)(2)
+
+    async def test_gateway_failure_holds_no_stock(self):
+        with mock.patch('core.payments.acreate_order', side_effect=payments.GatewayError('down')):
+            response = await self.async_client.post(f'/checkout/{self.event.id}/', self.buyer())
+        self.assertRedirects(response, '/', fetch_redirect_response=False)
+        self.assertFalse(await Order.objects.aexists())
+        self.assertFalse(await Reservation.objects.aexists())
+
+    async def test_forged_signature_releases_the_hold(self):
+        await self.async_client.post(f'/checkout/{self.event.id}/', self.buyer())
+        order = await Order.objects.aget()
+        response = await self.async_client.post('/payment/verify/', {
+            'razorpay_order_id': order.order_id, 'razorpay_payment_id': 'pay_1', 'razorpay_signature': 'forged',
+        })
+        self.assertTemplateUsed(response, 'core/payment_failed.html')
+        self.assertEqual((await Order.objects.aget()).status, 'failed')
+        self.assertFalse(await Reservation.objects.filter(status='active').aexists())
+        await sync_to_async(self.assertSold)(0)
+
+
+# One admission a second, one poll's worth of burst: the first two numbers go straight in
+@mock.patch('core.waiting_room.WAITING_ROOM_RATE', 1)
+@mock.patch('core.waiting_room.WAITING_ROOM_POLL_SECONDS', 1)
+@mock.patch('core.waiting_room.time.time', return_value=1000.0)
+class WaitingRoomTests(CheckoutTestCase):
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+
+    def test_buyer_behind_the_frontier_waits_then_is_admitted(self, now):
+        for _ in range(2):
+            response = self.client_class().get('/checkout/')
+            self.assertRedirects(response, '/', fetch_redirect_response=False)
+            self.assertIn(waiting_room.PASS_COOKIE, response.cookies)
+
+        waiting = self.client.post(f'/checkout/{self.event.id}/', {'customer_name': 'Third'})
+        self.assertTemplateUsed(waiting, 'core/waiting_room.html')
+        self.assertEqual(waiting.context['position'], 1)
+        self.assertIn(('customer_name', 'Third'), waiting.context['replay'])
+        self.assertFalse(Order.objects.exists())
+        self.assertFalse(self.client.get('/queue/status/').context['admitted'])
+
+        now.return_value = 1001.0
+        status = self.client.get('/queue/status/')
+        self.assertTrue(status.context['admitted'])
+        self.assertEqual(status['HX-Trigger'], 'queue-admitted')
+        # The pass now lets this browser through without taking a new number
+        self.assertRedirects(self.client.get('/checkout/'), '/', fetch_redirect_response=False)
+        self.assertEqual(cache.get('waiting-room:issued'), 3)
+
+    def test_forged_queue_number_is_ignored(self, now):
+        self.client.cookies[waiting_room.QUEUE_COOKIE] = '1'
+        self.assertTrue(self.client.get('/queue/status/').context['expired'])
+
+
+@override_settings(WHATSAPP_PHONE_NUMBER_ID='123', WHATSAPP_ACCESS_TOKEN='token')
+class WhatsAppDeliveryTests(CheckoutTestCase):
+    def test_one_delivery_counts_one_attempt(self):
+        self.checkout('order_a', 1)
+        with transaction.atomic():
+            (booking_id,) = mark_paid({'order_a': 'pay_1'})['order_a']
+        TicketDelivery.objects.create(booking_id=booking_id, channel='whatsapp', status='queued')
+        ok = mock.Mock(status_code=200, json=lambda: {'id': 'media_1'})
+        with mock.patch('core.tasks.requests.post', return_value=ok):
+            media_id = tasks.upload_ticket_media.apply(args=('JVBERi0=', booking_id)).get()
+            tasks.send_whatsapp_ticket.apply(args=(media_id, booking_id)).get()
+        delivery = TicketDelivery.objects.get(booking_id=booking_id, channel='whatsapp')
+        self.assertEqual((delivery.status, delivery.attempts), ('sent', 1))
+
+
+class RazorpayGatewayTests(SimpleTestCase):
+    def test_an_unreachable_gateway_is_tried_once_per_adapter_attempt(self):
+        gateway = payments.RazorpayGateway('key', 'secret')
+        with mock.patch.object(gateway.client.session, 'post', side_effect=requests.ConnectionError) as post, \
+                mock.patch('time.sleep'):  # ours and the SDK's backoff
+            with self.assertRaises(payments.GatewayError):
+                gateway.create_order({'amount': 100, 'currency': 'INR'})
+        self.assertEqual(post.call_count, payments.PAYMENT_RETRIES + 1)
+
+
+class ColdStartTests(SimpleTestCase):
+    def test_web_process_loads_no_pdf_qr_or_gateway_library(self):
+        # A fresh interpreter: this one has imported everything already
+        script = (
+            'import sys\n'
+            'from pune_color_festival.wsgi import application\n'
+            'import pune_color_festival.urls\n'
+            "print(' '.join(name for name in ('weasyprint', 'qrcode', 'razorpay') if name in sys.modules))\n"
+        )
+        result = subprocess.run([sys.executable, '-c', script], capture_output=True, text=True, cwd=settings.BASE_DIR)
+        self.assertEqual(result.returncode, 0, result.stderr)
+        self.assertEqual(result.stdout.strip(), '')
+
+
+LOCMEM = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+REDIS = {'default': {'BACKEND': 'django.core.cache.backends.redis.RedisCache', 'LOCATION': 'redis://localhost:6379/1'}}
+
+
+class SharedCacheCheckTests(SimpleTestCase):
+    def errors(self):
+        return [error.id for error in checks.check_shared_cache(None) + checks.check_waiting_room_cache(None)]
+
+    @override_settings(CACHES=LOCMEM, WEB_CONCURRENCY=1)
+    def test_one_worker_may_use_locmem(self):
+        self.assertEqual(self.errors(), [])
+
+    @override_settings(CACHES=LOCMEM, WEB_CONCURRENCY=3)
+    def test_several_workers_need_a_shared_cache(self):
+        self.assertEqual(self.errors(), ['core.E001'])
+
+    @override_settings(CACHES=REDIS, WEB_CONCURRENCY=3, WAITING_ROOM_RATE=50)
+    def test_several_workers_and_waiting_room_with_redis(self):
+        self.assertEqual(self.errors(), [])
+
+    @override_settings(CACHES=LOCMEM, WEB_CONCURRENCY=1, WAITING_ROOM_RATE=50)
+    def test_waiting_room_needs_a_shared_cache(self):
+        self.assertEqual(self.errors(), ['core.E002'])
@@ -1,16 +1,28 @@
+from django.conf import settings
 from django.urls import path
 from . import views
 
+# Under ASGI the I/O-bound checkout steps are served by their async versions
+checkout = views.acheckout if settings.ASYNC_VIEWS else views.checkout
+payment_verify = views.apayment_verify if settings.ASYNC_VIEWS else views.payment_verify
+
 urlpatterns = [
     # Public URLs
     path('', views.index, name='index'),
     path('event/<int:event_id>/tickets/', views.event_tickets, name='event_tickets'),
     path('update-total/', views.update_total, name='update_total'),
-    path('checkout/<int:event_id>/', views.checkout, name='checkout'),
+    path('inventory/', views.inventory_snapshot, name='inventory_snapshot'),
+    path('checkout/<int:event_id>/', checkout, name='checkout'),
     path('checkout/', views.checkout_display, name='checkout_display'),
-    path('payment/verify/', views.payment_verify, name='payment_verify'),
+    path('queue/status/', views.queue_status, name='queue_status'),
+    path('payment/verify/', payment_verify, name='payment_verify'),
+    path('payment/webhook/', views.payment_webhook, name='payment_webhook'),
     path('ticket/<str:order_id>/', views.download_ticket, name='download_ticket'),
+    path('ticket/<str:order_id>/pdf/', views.download_ticket_pdf, name='download_ticket_pdf'),
     path('terms/', views.terms, name='terms'),
+    path('gate/scan/', views.gate_scan, name='gate_scan'),
+    path('gate/checkins/', views.gate_checkins, name='gate_checkins'),
+    path('gate/event/<int:event_id>/manifest/', views.gate_manifest, name='gate_manifest'),
     
     # Organizer URLs
     path('organizer/dashboard/', views.organizer_dashboard, name='organizer_dashboard'),
@@ -21,4 +33,5 @@ urlpatterns = [
     path('organizer/ticket/<int:ticket_id>/edit/', views.organizer_ticket_edit, name='organizer_ticket_edit'),
     path('organizer/ticket/<int:ticket_id>/delete/', views.organizer_ticket_delete, name='organizer_ticket_delete'),
     path('organizer/event/<int:event_id>/attendees/', views.organizer_event_attendees, name='organizer_event_attendees'),
+    path('organizer/event/<int:event_id>/attendees/export.<str:fmt>', views.organizer_event_attendees_export, name='organizer_event_attendees_export'),
 ]
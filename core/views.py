@@ -2,55 +2,85 @@ from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.admin.views.decorators import staff_member_required
 from django.contrib import messages
 from django.db import transaction
-from django.db.models import F
-from django.utils import timezone
-from datetime import timedelta
+from django.db.models import Prefetch
+from django.template.backends.utils import csrf_input
+from django.utils.safestring import mark_safe
+from asgiref.sync import sync_to_async
+import hashlib
+import json
 import uuid
-import threading
-from .models import Event, TicketType, Booking
+from datetime import datetime, timedelta, timezone as dt_timezone
+from .models import Event, TicketType, Booking, Order, TicketSales
 from .forms import EventForm, TicketTypeForm
-from .tasks import send_ticket_email
-import base64
-import io
-import qrcode
+from .pricing import (
+    StockError, parse_quantities, prices_for, total_for, load_lines, check_stock, lines_total,
+    price_manifest, manifest_prices,
+)
+from .reservations import available_quantities, reserve, release_order
+from .orders import confirm_payments, record_payment_event
+from .tasks import build_ticket_artifacts, deliver_paid, process_payment_events
+from . import gate, payments, snapshot, waiting_room
+from .manifest import build_manifest
+from .artifacts import get_artifact, get_etag, build_ticket_html
+from .exports import aiterate, attendee_rows, csv_stream, xlsx_stream
+from .fragments import CSRF_MARKER, event_cards
 
 def index(request):
-    events = Event.objects.filter(is_published=True).prefetch_related('ticket_types')
+    """Event cards come from the fragment cache (core.fragments), stock from the inventory snapshot."""
+    event_ids = list(Event.objects.filter(is_published=True).values_list('id', flat=True))
+    cards = event_cards(event_ids)
+    token_input = csrf_input(request)
     context = {
-        'events': events,
+        # An event deleted since the id query has no card: leave it out
+        'event_cards': [
+            mark_safe(cards[event_id].replace(CSRF_MARKER, token_input)) for event_id in event_ids if event_id in cards
+        ],
+        'stock': snapshot.snapshot()['stock'],
+        'inventory_poll_seconds': INVENTORY_POLL_SECONDS,
         'year': 2026,
     }
     return render(request, 'core/index.html', context)
 
+def inventory_snapshot(request):
+    """Tickets left per ticket type, polled by the index page; never touches the inventory rows itself."""
+    current = snapshot.snapshot()
+    response = JsonResponse({'built_at': current['built_at'], 'stock': current['stock']})
+    # Shared caches may answer polls too, for as long as the snapshot itself won't change
+    patch_cache_control(response, public=True, max_age=snapshot.INVENTORY_SNAPSHOT_MIN_REFRESH)
+    return response
+
 def event_tickets(request, event_id):
     from django.shortcuts import get_object_or_404
     event = get_object_or_404(Event, id=event_id)
-    ticket_types = TicketType.objects.filter(event=event)
-    return render(request, 'core/partials/ticket_selection.html', {'event': event, 'ticket_types': ticket_types})
+    ticket_types = list(TicketType.objects.filter(event=event))
+    context = {'event': event, 'ticket_types': ticket_types, 'price_manifest': price_manifest(ticket_types)}
+    return render(request, 'core/partials/ticket_selection.html', context)
 
 def update_total(request):
-    total = 0
-    for key, value in request.GET.items():
-        if key.startswith('qty_'):
-            try:
-                ticket_id = int(key.split('_')[1])
-                quantity = int(value)
-                ticket = TicketType.objects.get(id=ticket_id)
-                total += ticket.price * quantity
-            except (ValueError, TicketType.DoesNotExist):
-                continue
-    
+    """Fallback for browsers that can't total locally: answers from the signed manifest or the price cache."""
+    quantities = parse_quantities(request.GET)
+    prices = manifest_prices(request.GET.get('price_manifest')) or prices_for(quantities)
+    total = total_for(prices, quantities)
     return render(request, 'core/partials/total_display.html', {'total': total})
 
-import razorpay
 from django.conf import settings
 from django.views.decorators.csrf import csrf_exempt
-from django.http import HttpResponseBadRequest
-
-def checkout(request, event_id):
-    if request.method != 'POST':
-        return redirect('index')
-
+from django.http import Http404, HttpResponseBadRequest, HttpResponse, JsonResponse, StreamingHttpResponse
+from django.utils.crypto import constant_time_compare
+from django.utils.cache import patch_cache_control
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from django.utils.http import quote_etag
+from django.views.decorators.http import condition
+
+TICKET_CACHE_MAX_AGE = getattr(settings, 'TICKET_CACHE_MAX_AGE', 300)
+ATTENDEES_PAGE_SIZE = getattr(settings, 'ATTENDEES_PAGE_SIZE', 50)
+GATE_API_KEY = getattr(settings, 'GATE_API_KEY', '')
+INVENTORY_POLL_SECONDS = getattr(settings, 'INVENTORY_POLL_SECONDS', 5)
+GATE_CHECKIN_BATCH = getattr(settings, 'GATE_CHECKIN_BATCH', 500)
+
+def _checkout_prepare(request, event_id):
+    """Validate a checkout POST and price it: (error redirect, None) or (None, state for _checkout_reserve)."""
     event = get_object_or_404(Event, id=event_id)
     customer_name = request.POST.get('customer_name', '').strip()
     customer_email = request.POST.get('customer_email', '').strip()
@@ -58,45 +88,26 @@ def checkout(request, event_id):
 
     if not all([customer_name, customer_email, customer_phone]):
         messages.error(request, 'Please fill in all customer details.')
-        return redirect('index')
-
-    total_amount = 0
-    selected_tickets = []
-
-    for key, value in request.POST.items():
-        if key.startswith('qty_'):
-            try:
-                ticket_id = int(key.split('_')[1])
-                quantity = int(value)
-                if quantity > 0:
-                    ticket = TicketType.objects.get(id=ticket_id, event=event)
-                    # FIX #2: Check stock before allowing booking
-                    if ticket.quantity_available < quantity:
-                        messages.error(request, f'Sorry, only {ticket.quantity_available} tickets left for {ticket.name}.')
-                        return redirect('index')
-                    total_amount += ticket.price * quantity
-                    selected_tickets.append((ticket, quantity))
-            except (ValueError, TicketType.DoesNotExist):
-                continue
+        return redirect('index'), None
+
+    # Give back the hold from this browser's previous, unfinished checkout.
+    # Expired holds from everyone else are swept by the expire_reservations task.
+    previous_checkout = request.session.get('checkout')
+    if previous_checkout:
+        release_order(previous_checkout['order_id'])
+
+    # One query for every selected ticket type, then all stock checks at once
+    selected_tickets = load_lines(event, parse_quantities(request.POST))
+    try:
+        check_stock(selected_tickets, available_quantities([ticket for ticket, _ in selected_tickets]))
+    except StockError as e:
+        messages.error(request, str(e))
+        return redirect('index'), None
+    total_amount = lines_total(selected_tickets)
 
     if total_amount == 0:
         messages.error(request, 'Please select at least one ticket.')
-        return redirect('index')
-
-    # FIX #3: Clean up stale pending bookings older than 20 minutes to free locked slots
-    stale_cutoff = timezone.now() - timedelta(minutes=20)
-    Booking.objects.filter(
-        ticket_type__event=event,
-        status='pending',
-        created_at__lt=stale_cutoff
-    ).delete()
-
-    # Also clean up this customer's own old pending bookings for this event
-    Booking.objects.filter(
-        customer_phone=customer_phone,
-        ticket_type__event=event,
-        status='pending'
-    ).delete()
+        return redirect('index'), None
 
     # Initialize Razorpay or Bypass
     is_bypass = getattr(settings, 'LOCAL_PAYMENT_BYPASS', False)
@@ -106,45 +117,67 @@ def checkout(request, event_id):
         order_id = f"local_{uuid.uuid4().hex[:16]}"
         payment_data = {'amount': int(total_amount * 100)}
     else:
-        import socket
-        client = razorpay.Client(auth=(settings.RAZORPAY_KEY_ID, settings.RAZORPAY_KEY_SECRET))
+        order_id = None  # created by the gateway
         payment_data = {
             'amount': int(total_amount * 100),
             'currency': 'INR',
             'receipt': f'receipt_{event.id}_{customer_phone[-4:]}'
         }
-        old_timeout = socket.getdefaulttimeout()
-        socket.setdefaulttimeout(15)  # fail fast if Razorpay is unreachable
-        try:
-            razorpay_order = client.order.create(data=payment_data)
-            order_id = razorpay_order['id']
-        except Exception as e:
-            socket.setdefaulttimeout(old_timeout)
-            messages.error(request, 'Payment gateway error. Please try again in a moment.')
-            import sys
-            print(f'[Razorpay ERROR] {e}', file=sys.stderr)
-            return redirect('index')
-        finally:
-            socket.setdefaulttimeout(old_timeout)
-
-    # FIX #2: Atomic transaction with select_for_update() prevents race conditions on stock
-    with transaction.atomic():
-        for ticket, quantity in selected_tickets:
-            # Re-fetch ticket with a row-level lock
-            locked_ticket = TicketType.objects.select_for_update().get(id=ticket.id)
-            if locked_ticket.quantity_available < quantity:
-                messages.error(request, f'Sorry, only {locked_ticket.quantity_available} ticket(s) left for {locked_ticket.name}.')
-                return redirect('index')
-            Booking.objects.create(
-                ticket_type=ticket,
+    return None, {
+        'event': event,
+        'customer_name': customer_name,
+        'customer_email': customer_email,
+        'customer_phone': customer_phone,
+        'selected_tickets': selected_tickets,
+        'is_bypass': is_bypass,
+        'order_id': order_id,
+        'payment_data': payment_data,
+    }
+
+
+def _gateway_error(request, e):
+    messages.error(request, 'Payment gateway error. Please try again in a moment.')
+    import sys
+    print(f'[Razorpay ERROR] {e}', file=sys.stderr)
+    return redirect('index')
+
+
+def _checkout_reserve(request, state, order_id):
+    """Hold the stock under the gateway's order id and hand over to the payment page."""
+    event = state['event']
+    customer_name, customer_email, customer_phone = state['customer_name'], state['customer_email'], state['customer_phone']
+    payment_data = state['payment_data']
+
+    # FIX #2: Atomic transaction with select_for_update() prevents race conditions on stock.
+    # All rows are locked in one query, ordered by id, so concurrent checkouts can't deadlock.
+    # Sharded ticket types claim from their inventory counters instead (core.inventory).
+    try:
+        with transaction.atomic():
+            locked_tickets = reserve(order_id, event, state['selected_tickets'])
+            order = Order.objects.create(
+                order_id=order_id,
+                event=event,
                 customer_name=customer_name,
                 customer_email=customer_email,
                 customer_phone=customer_phone,
-                quantity=quantity,
-                total_amount=ticket.price * quantity,
-                order_id=order_id,
-                status='pending'
+                total_amount=lines_total(locked_tickets),
             )
+            Booking.objects.bulk_create([
+                Booking(
+                    ticket_type=ticket,
+                    customer_name=customer_name,
+                    customer_email=customer_email,
+                    customer_phone=customer_phone,
+                    quantity=quantity,
+                    total_amount=ticket.price * quantity,
+                    order=order,
+                    status='pending'
+                )
+                for ticket, quantity in locked_tickets
+            ])
+    except StockError as e:
+        messages.error(request, str(e))
+        return redirect('index')
 
     # FIX #1: Store order details in session, then redirect (PRG pattern)
     request.session['checkout'] = {
@@ -155,11 +188,47 @@ def checkout(request, event_id):
         'customer_email': customer_email,
         'customer_phone': customer_phone,
         'event_id': event.id,
-        'is_bypass': is_bypass,
+        'is_bypass': state['is_bypass'],
     }
     return redirect('checkout_display')
 
 
+@waiting_room.waiting_room
+def checkout(request, event_id):
+    if request.method != 'POST':
+        return redirect('index')
+
+    response, state = _checkout_prepare(request, event_id)
+    if response is not None:
+        return response
+    order_id = state['order_id']
+    if order_id is None:
+        try:
+            order_id = payments.create_order(state['payment_data'])
+        except payments.GatewayError as e:
+            return _gateway_error(request, e)
+    return _checkout_reserve(request, state, order_id)
+
+
+@waiting_room.waiting_room
+async def acheckout(request, event_id):
+    """checkout for ASGI: the Razorpay order is created on the event loop, so waiting on it holds no thread."""
+    if request.method != 'POST':
+        return redirect('index')
+
+    response, state = await sync_to_async(_checkout_prepare)(request, event_id)
+    if response is not None:
+        return response
+    order_id = state['order_id']
+    if order_id is None:
+        try:
+            order_id = await payments.acreate_order(state['payment_data'])
+        except payments.GatewayError as e:
+            return _gateway_error(request, e)
+    return await sync_to_async(_checkout_reserve)(request, state, order_id)
+
+
+@waiting_room.waiting_room
 def checkout_display(request):
     """GET view — shows the payment form. Session prevents duplicate booking on refresh."""
     checkout_data = request.session.get('checkout')
@@ -180,111 +249,247 @@ def checkout_display(request):
     }
     return render(request, 'core/checkout.html', context)
 
-@csrf_exempt
-def payment_verify(request):
-    if request.method != 'POST':
-        return redirect('index')
-
+def queue_status(request):
+    """Position fragment polled by the waiting page: signed cookie and cache only, no database."""
+    number = waiting_room.queue_number(request)
+    if waiting_room.has_pass(request):
+        context = {'admitted': True}
+    elif number is None:
+        context = {'expired': True}
+    else:
+        context = waiting_room.status(number)
+    response = render(request, 'core/partials/queue_status.html', context)
+    response['Cache-Control'] = 'no-store'
+    if context.get('admitted'):
+        response['HX-Trigger'] = 'queue-admitted'
+        waiting_room.admit(request, response)
+    return response
+
+REFUND_DUE_MESSAGE = (
+    'We received your payment, but your ticket hold had expired and the tickets have since sold out. '
+    'Your payment will be refunded in full.'
+)
+UNCONFIRMED_MESSAGE = 'We could not confirm this order.'
+
+def _complete_payment(request):
     data = request.POST
     payment_id = data.get('razorpay_payment_id', '')
     razorpay_order_id = data.get('razorpay_order_id', '')
     signature = data.get('razorpay_signature', '')
     is_bypass = getattr(settings, 'LOCAL_PAYMENT_BYPASS', False) and data.get('bypass') == 'true'
 
-    if not is_bypass:
-        client = razorpay.Client(auth=(settings.RAZORPAY_KEY_ID, settings.RAZORPAY_KEY_SECRET))
-        try:
-            client.utility.verify_payment_signature({
-                'razorpay_order_id': razorpay_order_id,
-                'razorpay_payment_id': payment_id,
-                'razorpay_signature': signature
-            })
-        except razorpay.errors.SignatureVerificationError:
-            Booking.objects.filter(order_id=razorpay_order_id).update(status='failed')
-            return render(request, 'core/payment_failed.html', {'error': 'Payment verification failed. Please contact support.'})
+    if not is_bypass and not payments.verify_signature(razorpay_order_id, payment_id, signature):
+        release_order(razorpay_order_id)
+        return render(request, 'core/payment_failed.html', {'error': 'Payment verification failed. Please contact support.'})
 
     if is_bypass:
         payment_id = f"bypassed_{razorpay_order_id}"
 
-    bookings = Booking.objects.filter(order_id=razorpay_order_id, status='pending')
-    if not bookings.exists():
-        # Already processed (double submission guard)
-        bookings = Booking.objects.filter(order_id=razorpay_order_id, status='paid')
-        if bookings.exists():
-            # Clear session and show success
-            request.session.pop('checkout', None)
-            return render(request, 'core/payment_success.html', {'bookings': bookings})
+    # The order and its lines: one lookup on the unique order_id, one for the bookings
+    order = (
+        Order.objects.filter(order_id=razorpay_order_id)
+        .prefetch_related(Prefetch('bookings', queryset=Booking.objects.select_related('ticket_type').order_by('id')))
+        .first()
+    )
+    if order is None:
         return redirect('index')
 
-    # Collect IDs first, then process inside transaction
-    paid_booking_ids = []
-    with transaction.atomic():
-        for booking in bookings:
-            booking.status = 'paid'
-            booking.payment_id = payment_id
-            booking.save()
-            TicketType.objects.filter(id=booking.ticket_type_id).update(
-                quantity_available=F('quantity_available') - booking.quantity
-            )
-            paid_booking_ids.append(booking.id)
-
-    # Send emails immediately (synchronously) for debugging purposes.
-    # If Resend or Meta fails, this will intentionally crash the view so we can see the full internal error in the Railway logs.
-    import logging
-    logger = logging.getLogger(__name__)
-
-    if paid_booking_ids:
-        for bid in paid_booking_ids:
-            try:
-                result = send_ticket_email(bid)
-                logger.warning(f"[DELIVERY SUCCESS] Booking {bid}: {result}")
-                print(f"[DELIVERY SUCCESS] Booking {bid}: {result}")
-            except Exception as e:
-                logger.error(f"[DELIVERY CRITICAL ERROR] Booking {bid} Failed: {str(e)}", exc_info=True)
-                print(f"[DELIVERY CRITICAL ERROR] Booking {bid} Failed: {str(e)}")
-                # Raise the error instantly so the webpage fails if needed (uncomment to force crash)
-                # raise e 
-
-    # Clear checkout session
+    if order.status in ('pending', 'failed'):
+        # One UPDATE for the order's bookings; a webhook that already confirmed it makes this a no-op.
+        # An order that failed meanwhile (hold expired) is re-reserved if the stock is still there,
+        # whether it failed before this request or while it waited for the order's lock.
+        # Ticket delivery (QR, PDF, Resend, Meta) runs on the Celery worker once the paid status is committed.
+        with transaction.atomic():
+            paid, _refund_due = confirm_payments({razorpay_order_id: payment_id})
+            deliver_paid(paid)
+        order.refresh_from_db(fields=['status'])
+
+    if order.status == 'refund_due':
+        request.session.pop('checkout', None)
+        return render(request, 'core/payment_failed.html', {'error': REFUND_DUE_MESSAGE})
+    if order.status != 'paid':
+        # Not reached by a captured payment (confirm_payments pays or flags it); say so anyway
+        return render(request, 'core/payment_failed.html', {'error': UNCONFIRMED_MESSAGE})
+
+    # Clear checkout session (a double submission of a paid order lands here too)
     request.session.pop('checkout', None)
-    return render(request, 'core/payment_success.html', {'bookings': bookings})
+    return render(request, 'core/payment_success.html', {'bookings': order.bookings.all()})
+
+@csrf_exempt
+def payment_verify(request):
+    if request.method != 'POST':
+        return redirect('index')
+    return _complete_payment(request)
+
+@csrf_exempt
+async def apayment_verify(request):
+    """payment_verify for ASGI. The signature check is local and delivery is queued for
+    Celery, so only the database is left to wait on; it runs on a thread, off the event loop."""
+    if request.method != 'POST':
+        return redirect('index')
+    return await sync_to_async(_complete_payment)(request)
+
+@csrf_exempt
+def payment_webhook(request):
+    """Razorpay webhook: verify, append to the PaymentEvent inbox and return at once.
+
+    process_payment_events marks the order paid; duplicate deliveries are dropped by event id.
+    """
+    if request.method != 'POST':
+        return HttpResponseBadRequest('POST required')
+    if not payments.verify_webhook_signature(request.body, request.headers.get('X-Razorpay-Signature', '')):
+        return HttpResponseBadRequest('Invalid signature')
+    try:
+        payload = json.loads(request.body)
+    except ValueError:
+        return HttpResponseBadRequest('Invalid payload')
+
+    event_id = request.headers.get('X-Razorpay-Event-Id') or hashlib.sha256(request.body).hexdigest()
+    if record_payment_event(event_id, payload):
+        process_payment_events.delay()
+    return HttpResponse(status=200)
 
 def terms(request):
     return render(request, 'core/terms.html')
 
+@csrf_exempt
+def gate_scan(request):
+    """Check a scanned ticket in. POST token=<QR contents> with the X-Gate-Key header.
+
+    Authenticated by the shared gate key rather than a staff session, so a scan costs no
+    session or user lookup: the signature is checked in memory, then one UPDATE.
+    """
+    if request.method != 'POST':
+        return JsonResponse({'status': 'method_not_allowed'}, status=405)
+    if not _gate_key_ok(request):
+        return JsonResponse({'status': 'forbidden'}, status=403)
+
+    ticket = gate.verify_token(request.POST.get('token', ''))
+    if ticket is None:
+        return JsonResponse({'status': 'invalid'}, status=400)
+    booking_id, quantity = ticket
+    result, checked_in_at = gate.check_in(booking_id)
+    if result == 'admitted':
+        return JsonResponse({'status': result, 'booking': booking_id, 'admit': quantity})
+    if result == 'already_checked_in':
+        return JsonResponse({'status': result, 'booking': booking_id, 'checked_in_at': checked_in_at.isoformat()}, status=409)
+    return JsonResponse({'status': result, 'booking': booking_id}, status=404)
+
+def _gate_key_ok(request):
+    return bool(GATE_API_KEY) and constant_time_compare(request.headers.get('X-Gate-Key', ''), GATE_API_KEY)
+
+def gate_manifest(request, event_id):
+    """The offline manifest of an event's paid tickets (core.manifest); ?since=<version> for a delta."""
+    if not _gate_key_ok(request):
+        return JsonResponse({'status': 'forbidden'}, status=403)
+    event = get_object_or_404(Event, id=event_id)
+    since = request.GET.get('since')
+    if since is not None and not since.isdigit():
+        return JsonResponse({'status': 'invalid'}, status=400)
+    response = HttpResponse(build_manifest(event, int(since) if since else None), content_type='application/octet-stream')
+    patch_cache_control(response, private=True, no_store=True)
+    return response
+
+@csrf_exempt
+def gate_checkins(request):
+    """Check-ins a scanner made offline, pushed as JSON: {"scans": [{"token": ..., "at": ISO 8601}, ...]}.
+
+    Answers per booking, so the device learns which of its admissions another gate made first.
+    """
+    if request.method != 'POST':
+        return JsonResponse({'status': 'method_not_allowed'}, status=405)
+    if not _gate_key_ok(request):
+        return JsonResponse({'status': 'forbidden'}, status=403)
+    try:
+        pushed = json.loads(request.body)['scans']
+    except (ValueError, KeyError, TypeError):
+        return JsonResponse({'status': 'invalid'}, status=400)
+    if not isinstance(pushed, list) or len(pushed) > GATE_CHECKIN_BATCH:
+        return JsonResponse({'status': 'invalid', 'max_scans': GATE_CHECKIN_BATCH}, status=400)
+
+    now = timezone.now()
+    scans, invalid = {}, 0
+    for scan in pushed:
+        ticket = gate.verify_token(scan.get('token', '')) if isinstance(scan, dict) else None
+        if ticket is None:
+            invalid += 1
+            continue
+        try:
+            scanned_at = parse_datetime(scan.get('at') or '')
+        except (TypeError, ValueError):
+            scanned_at = None
+        if scanned_at is None or timezone.is_naive(scanned_at) or scanned_at > now:
+            scanned_at = now  # device clocks drift; never record a check-in in the future
+        # The same ticket scanned twice before a push keeps its first scan
+        scans[ticket[0]] = min(scans.get(ticket[0], scanned_at), scanned_at)
+
+    results = gate.check_in_batch(scans) if scans else {}
+    return JsonResponse({
+        'results': [
+            {'booking': booking_id, 'status': result, 'checked_in_at': checked_in_at.isoformat() if checked_in_at else None}
+            for booking_id, (result, checked_in_at) in results.items()
+        ],
+        'invalid': invalid,
+    })
+
+def _ticket_etag(kind):
+    def etag_func(request, order_id):
+        return get_etag(order_id, kind)
+    return etag_func
+
+def _artifact_response(artifact, content_type):
+    response = HttpResponse(artifact.content, content_type=content_type)
+    response['ETag'] = quote_etag(artifact.etag)
+    # Tickets are personal: browsers may keep them, shared caches may not
+    patch_cache_control(response, private=True, max_age=TICKET_CACHE_MAX_AGE)
+    return response
+
+@condition(etag_func=_ticket_etag('html'))
 def download_ticket(request, order_id):
-    bookings = Booking.objects.filter(order_id=order_id, status='paid')
-    if not bookings.exists():
-        return redirect('index')
+    """Serves the pre-rendered ticket page; repeat visits with If-None-Match get a 304."""
+    artifact = get_artifact(order_id, 'html')
+    if artifact is None:
+        # Not built yet (or invalidated) — build it now, it is cheap without the PDF
+        artifact = build_ticket_html(order_id)
+        if artifact is None:
+            return redirect('index')
+    return _artifact_response(artifact, 'text/html; charset=utf-8')
 
-    items = []
-    for booking in bookings:
-        qr = qrcode.QRCode(version=1, box_size=8, border=3)
-        qr.add_data(f"ID:{booking.id}|{booking.customer_name}|{booking.ticket_type.name} x{booking.quantity}|Colour Carnival 1.0")
-        qr.make(fit=True)
-        img = qr.make_image(fill_color="black", back_color="white")
-        buffer = io.BytesIO()
-        img.save(buffer, format='PNG')
-        qr_b64 = base64.b64encode(buffer.getvalue()).decode('utf-8')
-        items.append({
-            'name': booking.customer_name,
-            'ticket': booking.ticket_type.name,
-            'qty': booking.quantity,
-            'amount': booking.total_amount,
-            'payment_id': booking.payment_id,
-            'booking_id': booking.id,
-            'qr': qr_b64,
-        })
-
-    return render(request, 'core/ticket.html', {'items': items})
+@condition(etag_func=_ticket_etag('pdf'))
+def download_ticket_pdf(request, order_id):
+    artifact = get_artifact(order_id, 'pdf')
+    if artifact is None:
+        if not Order.objects.filter(order_id=order_id, status='paid').exists():
+            return redirect('index')
+        # PDF rendering never runs on a web worker: queue it and ask the client to retry
+        build_ticket_artifacts.delay(order_id)
+        response = HttpResponse('Your ticket PDF is being prepared. Please refresh in a few seconds.', status=202, content_type='text/plain; charset=utf-8')
+        response['Retry-After'] = '5'
+        return response
+    response = _artifact_response(artifact, 'application/pdf')
+    response['Content-Disposition'] = f'inline; filename="Colour-Carnival-Ticket-{order_id}.pdf"'
+    return response
 
 # --- Organizer Views ---
 
 @staff_member_required
 def organizer_dashboard(request):
-    events = Event.objects.all().order_by('-date')
+    # Three queries for any number of events: events, their ticket types with sales rows, nothing per row
+    events = list(Event.objects.order_by('-date').prefetch_related(
+        Prefetch('ticket_types', queryset=TicketType.objects.select_related('sales').order_by('id'))
+    ))
+    for event in events:
+        event.sold = sum(_sales(ticket).sold for ticket in event.ticket_types.all())
+        event.revenue = sum(_sales(ticket).revenue for ticket in event.ticket_types.all())
     return render(request, 'organizer/dashboard.html', {'events': events})
 
+def _sales(ticket):
+    """The ticket type's TicketSales row, or an unsaved empty one before its first sale."""
+    try:
+        return ticket.sales
+    except TicketSales.DoesNotExist:
+        return TicketSales(ticket_type=ticket, event_id=ticket.event_id)
+
 @staff_member_required
 def organizer_event_create(request):
     if request.method == 'POST':
@@ -350,23 +555,84 @@ def organizer_event_delete(request, event_id):
         return redirect('organizer_dashboard')
     return render(request, 'organizer/event_confirm_delete.html', {'event': event})
 
+def _attendee_cursor(booking):
+    # Keyset position (created_at, id) as URL-safe integers
+    created_at = booking.created_at - datetime(1970, 1, 1, tzinfo=dt_timezone.utc)
+    return f'{created_at // timedelta(microseconds=1)}-{booking.id}'
+
+def _parse_attendee_cursor(cursor):
+    try:
+        micros, booking_id = (int(part) for part in cursor.split('-'))
+        return datetime(1970, 1, 1, tzinfo=dt_timezone.utc) + timedelta(microseconds=micros), booking_id
+    except (ValueError, OverflowError):
+        return None
+
 @staff_member_required
 def organizer_event_attendees(request, event_id):
-    from django.db.models import Sum
+    from django.db.models import Q, Sum
     event = get_object_or_404(Event, id=event_id)
-    
-    # Only show successful bookings
-    bookings = Booking.objects.filter(ticket_type__event=event, status='paid').order_by('-created_at')
-    
-    # Calculate totals
-    total_revenue = bookings.aggregate(total=Sum('total_amount'))['total'] or 0
-    total_sold = bookings.aggregate(total=Sum('quantity'))['total'] or 0
-    
+
+    # Sold and revenue come from the TicketSales rollup; check-ins are counted off the
+    # checked_in_at index, which only holds bookings already scanned at the gate
+    ticket_totals = list(TicketType.objects.filter(event=event).select_related('sales').order_by('id'))
+    checked_in = dict(
+        Booking.objects.filter(ticket_type__in=ticket_totals, status='paid', checked_in_at__isnull=False)
+        .values('ticket_type_id').annotate(total=Sum('quantity')).values_list('ticket_type_id', 'total')
+    )
+    for ticket in ticket_totals:
+        ticket.sold, ticket.revenue = _sales(ticket).sold, _sales(ticket).revenue
+        ticket.checked_in = checked_in.get(ticket.id, 0)
+    total_sold = sum(ticket.sold for ticket in ticket_totals)
+    total_revenue = sum(ticket.revenue for ticket in ticket_totals)
+    total_checked_in = sum(ticket.checked_in for ticket in ticket_totals)
+
+    # Only show successful bookings, newest first, one page at a time.
+    # Keyset pagination on (created_at, id): every page costs the same, however deep.
+    bookings = (
+        Booking.objects.filter(ticket_type__event=event, status='paid')
+        .select_related('ticket_type')
+        .order_by('-created_at', '-id')
+    )
+    query = request.GET.get('q', '').strip()
+    if query:
+        bookings = bookings.filter(
+            Q(customer_name__icontains=query) | Q(customer_phone__contains=query) | Q(payment_id__icontains=query)
+        )
+    after = _parse_attendee_cursor(request.GET.get('after', ''))
+    if after:
+        created_at, booking_id = after
+        bookings = bookings.filter(Q(created_at__lt=created_at) | Q(created_at=created_at, id__lt=booking_id))
+
+    page = list(bookings[:ATTENDEES_PAGE_SIZE + 1])
+    next_cursor = _attendee_cursor(page[ATTENDEES_PAGE_SIZE - 1]) if len(page) > ATTENDEES_PAGE_SIZE else None
+
     context = {
         'event': event,
-        'bookings': bookings,
+        'bookings': page[:ATTENDEES_PAGE_SIZE],
+        'ticket_totals': ticket_totals,
         'total_revenue': total_revenue,
-        'total_sold': total_sold
+        'total_sold': total_sold,
+        'total_checked_in': total_checked_in,
+        'query': query,
+        'is_first_page': after is None,
+        'next_cursor': next_cursor,
     }
     return render(request, 'organizer/attendees.html', context)
 
+EXPORT_FORMATS = {
+    'csv': (csv_stream, 'text/csv; charset=utf-8'),
+    'xlsx': (xlsx_stream, 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'),
+}
+
+@staff_member_required
+def organizer_event_attendees_export(request, event_id, fmt):
+    """Stream every paid booking of the event as CSV or XLSX, without building the file in memory."""
+    if fmt not in EXPORT_FORMATS:
+        raise Http404('Unknown export format')
+    event = get_object_or_404(Event, id=event_id)
+    stream, content_type = EXPORT_FORMATS[fmt]
+    chunks = stream(attendee_rows(event))
+    # Under ASGI a sync iterator would be read to the end into memory before the first byte goes out
+    response = StreamingHttpResponse(aiterate(chunks) if settings.ASYNC_VIEWS else chunks, content_type=content_type)
+    response['Content-Disposition'] = f'attachment; filename="attendees-event-{event.id}.{fmt}"'
+    return response
@@ -0,0 +1,151 @@
+"""
+Virtual waiting room for ticket launches.
+
+With WAITING_ROOM_RATE set (admissions per second), the checkout views only serve
+browsers holding an admission pass. Anyone else takes a number: a signed queue token
+in a cookie, and a small waiting page that polls /queue/status/ with htmx. A shared
+frontier moves forward WAITING_ROOM_RATE numbers per second; a token at or below it
+is swapped for a pass valid WAITING_ROOM_PASS_TTL seconds, and the page resubmits
+the buyer's original request.
+
+The frontier can run ahead of the last number issued by one poll interval's worth of
+admissions, so when nobody is waiting a buyer goes straight through. Numbers and the
+frontier live in the cache and tokens and passes are signed cookies: waiting costs
+no database access. The cache must be shared by every process (core.checks refuses
+a per-process one). The frontier is advanced without a lock, so the rate is
+approximate. Set WAITING_ROOM_RATE a little under the checkouts/sec that
+`manage.py bench_flash_sale` measures for the deployment.
+"""
+import math
+import time
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core import signing
+from django.core.cache import cache
+from django.shortcuts import render
+
+WAITING_ROOM_RATE = getattr(settings, 'WAITING_ROOM_RATE', 0)
+WAITING_ROOM_PASS_TTL = getattr(settings, 'WAITING_ROOM_PASS_TTL', 600)
+WAITING_ROOM_TOKEN_TTL = getattr(settings, 'WAITING_ROOM_TOKEN_TTL', 3600)
+WAITING_ROOM_POLL_SECONDS = getattr(settings, 'WAITING_ROOM_POLL_SECONDS', 3)
+
+QUEUE_COOKIE = 'cc_queue'
+PASS_COOKIE = 'cc_admit'
+_QUEUE_SALT = 'core.waiting_room.queue'
+_PASS_SALT = 'core.waiting_room.pass'
+_ISSUED_KEY = 'waiting-room:issued'
+_FRONTIER_KEY = 'waiting-room:frontier'
+
+
+def enabled():
+    return WAITING_ROOM_RATE > 0
+
+
+def _burst():
+    return max(1, math.ceil(WAITING_ROOM_RATE * WAITING_ROOM_POLL_SECONDS))
+
+
+def _signed_cookie(request, name, salt, max_age):
+    try:
+        return signing.loads(request.COOKIES.get(name, ''), salt=salt, max_age=max_age)
+    except signing.BadSignature:
+        return None
+
+
+def has_pass(request):
+    return _signed_cookie(request, PASS_COOKIE, _PASS_SALT, WAITING_ROOM_PASS_TTL) is not None
+
+
+def queue_number(request):
+    """This browser's number in the queue, or None if it hasn't joined (or its token expired)."""
+    return _signed_cookie(request, QUEUE_COOKIE, _QUEUE_SALT, WAITING_ROOM_TOKEN_TTL)
+
+
+def join():
+    cache.add(_ISSUED_KEY, 0, None)
+    return cache.incr(_ISSUED_KEY)
+
+
+def frontier():
+    """The highest number admitted so far."""
+    now = time.time()
+    state = cache.get_many([_ISSUED_KEY, _FRONTIER_KEY])
+    value, at = state.get(_FRONTIER_KEY, (0, 0))  # no state yet: a full burst is available
+    value = min(value + (now - at) * WAITING_ROOM_RATE, state.get(_ISSUED_KEY, 0) + _burst())
+    cache.set(_FRONTIER_KEY, (value, now), None)
+    return math.floor(value)
+
+
+def _set_cookie(request, response, name, value, max_age):
+    response.set_cookie(name, value, max_age=max_age, httponly=True, samesite='Lax', secure=request.is_secure())
+
+
+def admit(request, response):
+    """Give the browser its pass and drop its queue token."""
+    _set_cookie(request, response, PASS_COOKIE, signing.dumps(True, salt=_PASS_SALT), WAITING_ROOM_PASS_TTL)
+    response.delete_cookie(QUEUE_COOKIE)
+    return response
+
+
+def status(number):
+    """Context for the position partial: admitted, or place in line and a rough wait."""
+    ahead = number - frontier()
+    if ahead <= 0:
+        return {'admitted': True}
+    return {'admitted': False, 'position': ahead, 'wait_minutes': math.ceil(ahead / WAITING_ROOM_RATE / 60)}
+
+
+def _queue(request):
+    """(waiting page, False) to hold the request back, or (None, whether it was just admitted) to let it through."""
+    if not enabled() or has_pass(request):
+        return None, False
+
+    number = queue_number(request)
+    joined = number is None
+    if joined:
+        number = join()
+    context = status(number)
+    if context['admitted']:
+        return None, True
+
+    context.update({
+        'poll_seconds': WAITING_ROOM_POLL_SECONDS,
+        'replay': [(name, value) for name in request.POST for value in request.POST.getlist(name)],
+        'method': request.method,
+        'action': request.path,
+    })
+    response = render(request, 'core/waiting_room.html', context)
+    response['Cache-Control'] = 'no-store'
+    if joined:
+        _set_cookie(request, response, QUEUE_COOKIE, signing.dumps(number, salt=_QUEUE_SALT), WAITING_ROOM_TOKEN_TTL)
+    return response, False
+
+
+def waiting_room(view):
+    """Admit a request to `view` (sync or async) only with a pass; otherwise queue it and serve the waiting page.
+
+    The waiting page carries the original POST fields and replays them once admitted.
+    It is rendered without the session, user or messages, so it needs no database.
+    """
+    if iscoroutinefunction(view):
+        @wraps(view)
+        async def wrapped(request, *args, **kwargs):
+            if not enabled():
+                return await view(request, *args, **kwargs)
+            waiting, admitted = await sync_to_async(_queue)(request)
+            if waiting is not None:
+                return waiting
+            response = await view(request, *args, **kwargs)
+            return admit(request, response) if admitted else response
+        return wrapped
+
+    @wraps(view)
+    def wrapped(request, *args, **kwargs):
+        waiting, admitted = _queue(request)
+        if waiting is not None:
+            return waiting
+        response = view(request, *args, **kwargs)
+        return admit(request, response) if admitted else response
+    return wrapped
@@ -0,0 +1,66 @@
+"""
+Production server profile, read by `gunicorn` from the project directory.
+
+WEB_SERVER_MODE picks how requests are served:
+
+    sync   (default) WSGI on gthread workers: WEB_CONCURRENCY processes x GUNICORN_THREADS
+           threads, each thread serving one request at a time
+    async  ASGI on uvicorn workers: checkout and payment_verify are async views
+           (pune_color_festival.asgi), so a request waiting on Razorpay holds no thread
+
+WEB_CONCURRENCY defaults to 2 x CPUs + 1 when CACHE_URL is shared (redis://, file://),
+and to 1 on the default per-process cache: more than one worker needs a shared
+cache, and the master runs the cache system checks (core.checks) before it forks.
+The app is loaded once in the master and forked (preload_app): workers share its
+memory and start serving at once. Database connections, the payment gateway client
+and the Celery producer are opened lazily, so nothing opened before the fork is shared.
+
+Every request in flight may hold a database connection, in either mode: keep
+WEB_CONCURRENCY x GUNICORN_THREADS (sync), or the expected concurrency (async),
+under the database's connection limit, or put PgBouncer in front of it.
+
+`manage.py bench_servers` compares the two modes under load.
+"""
+import multiprocessing
+import os
+
+WEB_SERVER_MODE = os.environ.get('WEB_SERVER_MODE', 'sync')
+
+
+def _cpus():
+    try:
+        return len(os.sched_getaffinity(0))  # the CPUs this container may use, not the host's
+    except AttributeError:
+        return multiprocessing.cpu_count()
+
+
+def _shared_cache():
+    # The backends settings.py picks for these CACHE_URL schemes are shared between processes
+    return os.environ.get('CACHE_URL', '').startswith(('redis://', 'rediss://', 'file://'))
+
+
+workers = int(os.environ.get('WEB_CONCURRENCY', _cpus() * 2 + 1 if _shared_cache() else 1))
+os.environ['WEB_CONCURRENCY'] = str(workers)  # settings.WEB_CONCURRENCY, for core.checks
+preload_app = True
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 30))
+graceful_timeout = 20
+keepalive = 5
+# Recycle workers now and then, a little apart, so slow leaks can't build up
+max_requests = int(os.environ.get('GUNICORN_MAX_REQUESTS', 2000))
+max_requests_jitter = max_requests // 10
+
+if WEB_SERVER_MODE == 'async':
+    wsgi_app = 'pune_color_festival.asgi:application'
+    worker_class = 'uvicorn_worker.UvicornWorker'
+elif WEB_SERVER_MODE == 'sync':
+    wsgi_app = 'pune_color_festival.wsgi:application'
+    worker_class = 'gthread'
+    threads = int(os.environ.get('GUNICORN_THREADS', 4))
+else:
+    raise ValueError(f"WEB_SERVER_MODE must be 'sync' or 'async', not {WEB_SERVER_MODE!r}")
+
+
+def when_ready(server):
+    # The app is loaded (preload_app): refuse to serve a configuration the workers can't share
+    from django.core.management import call_command
+    call_command('check', tag=['caches'])
@@ -12,5 +12,7 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'pune_color_festival.settings')
+# Served by an ASGI server: use the async checkout and payment views (core.urls)
+os.environ.setdefault('ASYNC_VIEWS', 'True')
 
 application = get_asgi_application()
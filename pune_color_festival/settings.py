@@ -4,6 +4,7 @@ Django settings for pune_color_festival project.
 import os
 from pathlib import Path
 import dj_database_url
+from django.core.exceptions import ImproperlyConfigured
 from dotenv import load_dotenv
 
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -37,7 +38,7 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
-    'whitenoise.middleware.WhiteNoiseMiddleware',
+    'core.middleware.WhiteNoiseMiddleware',  # WhiteNoise, async-capable for the ASGI server
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -65,6 +66,10 @@ TEMPLATES = [
 ]
 
 WSGI_APPLICATION = 'pune_color_festival.wsgi.application'
+ASGI_APPLICATION = 'pune_color_festival.asgi.application'
+# Serve checkout and payment_verify as async views (core.urls). pune_color_festival.asgi
+# turns this on, so it follows the server mode in gunicorn.conf.py.
+ASYNC_VIEWS = os.environ.get('ASYNC_VIEWS', 'False') == 'True'
 
 # Database — uses DATABASE_URL env var on production, SQLite locally
 DATABASE_URL = os.environ.get('DATABASE_URL')
@@ -110,15 +115,148 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 # Razorpay Settings — set these in Render environment variables
 RAZORPAY_KEY_ID = os.environ.get('RAZORPAY_KEY_ID', 'test_key_id')
 RAZORPAY_KEY_SECRET = os.environ.get('RAZORPAY_KEY_SECRET', 'test_key_secret')
+# Provider API base URLs are settings so load tests can point them at core.stubs (`manage.py provider_stubs`)
+RAZORPAY_API_URL = os.environ.get('RAZORPAY_API_URL', 'https://api.razorpay.com')
+# Webhook secret from the Razorpay dashboard (webhook URL: <SITE_URL>/payment/webhook/)
+RAZORPAY_WEBHOOK_SECRET = os.environ.get('RAZORPAY_WEBHOOK_SECRET', '')
+# 'razorpay', or 'fake' for tests / benchmarks (local orders and signatures, see core.payments)
+PAYMENT_GATEWAY = os.environ.get('PAYMENT_GATEWAY', 'razorpay')
+PAYMENT_FAKE_LATENCY_MS = int(os.environ.get('PAYMENT_FAKE_LATENCY_MS', 0))
+# Per-call timeouts (seconds) and retries for gateway API calls
+PAYMENT_CONNECT_TIMEOUT = float(os.environ.get('PAYMENT_CONNECT_TIMEOUT', 3))
+PAYMENT_READ_TIMEOUT = float(os.environ.get('PAYMENT_READ_TIMEOUT', 10))
+PAYMENT_RETRIES = int(os.environ.get('PAYMENT_RETRIES', 2))
+# Consecutive failed calls before checkout stops calling the gateway, and for how long
+PAYMENT_BREAKER_THRESHOLD = int(os.environ.get('PAYMENT_BREAKER_THRESHOLD', 5))
+PAYMENT_BREAKER_COOLDOWN = int(os.environ.get('PAYMENT_BREAKER_COOLDOWN', 30))
+
+# Web worker processes: gunicorn.conf.py sets this to the number it starts
+WEB_CONCURRENCY = int(os.environ.get('WEB_CONCURRENCY', 1))
+
+# Cache (page fragments, inventory snapshot, waiting room, cache-backed sessions), from CACHE_URL:
+#   locmem://                  default; per process, so only for a single worker (core.checks)
+#   file:///var/tmp/cc-cache   shared by the workers of one machine
+#   redis://host:6379/1        shared by every worker and machine (rediss:// for TLS)
+CACHE_URL = os.environ.get('CACHE_URL', 'locmem://')
+if CACHE_URL.startswith(('redis://', 'rediss://')):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': CACHE_URL,
+            'KEY_PREFIX': 'colour-carnival',
+        }
+    }
+elif CACHE_URL.startswith('file://'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': CACHE_URL[len('file://'):] or str(BASE_DIR / '.cache'),
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'colour-carnival',
+        }
+    }
+
+# Where sessions live (checkout keeps the pending order in one), from SESSION_BACKEND:
+#   db              default; a django_session read and write on the main database per checkout step
+#   cached_db       reads from the cache, still writes through to the database
+#   cache           cache only: needs a shared CACHE_URL, and sessions go if the cache evicts them
+#   signed_cookies  no server-side storage; the data is signed, not encrypted, and visible to the browser
+# `manage.py bench_sessions` compares their database cost.
+SESSION_BACKEND = os.environ.get('SESSION_BACKEND', 'db')
+SESSION_ENGINES = {
+    'db': 'django.contrib.sessions.backends.db',
+    'cached_db': 'django.contrib.sessions.backends.cached_db',
+    'cache': 'django.contrib.sessions.backends.cache',
+    'signed_cookies': 'django.contrib.sessions.backends.signed_cookies',
+}
+if SESSION_BACKEND not in SESSION_ENGINES:
+    raise ImproperlyConfigured(f"SESSION_BACKEND must be one of {', '.join(SESSION_ENGINES)}, not {SESSION_BACKEND!r}")
+SESSION_ENGINE = SESSION_ENGINES[SESSION_BACKEND]
+
+# Seconds an index page event card stays cached (edits invalidate it sooner)
+INDEX_CARD_CACHE_TTL = int(os.environ.get('INDEX_CARD_CACHE_TTL', 300))
+
+# "Tickets left" counters (core.snapshot): rebuilt at most once per MIN_REFRESH seconds after a
+# sale, and at least every MAX_AGE seconds; the index page polls every INVENTORY_POLL_SECONDS
+INVENTORY_SNAPSHOT_MAX_AGE = int(os.environ.get('INVENTORY_SNAPSHOT_MAX_AGE', 10))
+INVENTORY_SNAPSHOT_MIN_REFRESH = int(os.environ.get('INVENTORY_SNAPSHOT_MIN_REFRESH', 1))
+INVENTORY_POLL_SECONDS = int(os.environ.get('INVENTORY_POLL_SECONDS', 5))
+
+# In-process ticket price table used by update_total (seconds before other workers see a price edit)
+PRICE_CACHE_TTL = int(os.environ.get('PRICE_CACHE_TTL', 60))
 
 # Celery Settings
-CELERY_BROKER_URL = os.environ.get('CELERY_BROKER_URL', 'memory://')
+# Ticket delivery runs on a separate worker: `celery -A pune_color_festival worker -l info`.
+# Set CELERY_BROKER_URL (e.g. redis://...) in production. Without it a local filesystem
+# broker under .celery/ is used, so a worker on the same machine (or a test run) needs no Redis.
+# Run tasks inline instead of queueing them (tests / one-off scripts only)
+CELERY_TASK_ALWAYS_EAGER = os.environ.get('CELERY_TASK_ALWAYS_EAGER', 'False') == 'True'
+CELERY_BROKER_URL = os.environ.get('CELERY_BROKER_URL', 'filesystem://')
+if CELERY_BROKER_URL == 'filesystem://':
+    if not DEBUG and not CELERY_TASK_ALWAYS_EAGER:
+        # The web and worker services don't share a disk: tasks would queue up unseen.
+        raise ImproperlyConfigured('CELERY_BROKER_URL must be set (e.g. redis://...) when DEBUG is off.')
+    _celery_dir = BASE_DIR / '.celery'
+    CELERY_BROKER_TRANSPORT_OPTIONS = {
+        'data_folder_in': str(_celery_dir / 'queue'),
+        'data_folder_out': str(_celery_dir / 'queue'),
+        'control_folder': str(_celery_dir / 'control'),
+        'store_processed': False,
+    }
+    for _folder in ('queue', 'control'):
+        (_celery_dir / _folder).mkdir(parents=True, exist_ok=True)
 CELERY_RESULT_BACKEND = os.environ.get('CELERY_RESULT_BACKEND', 'cache+memory://')
 CELERY_ACCEPT_CONTENT = ['json']
 CELERY_TASK_SERIALIZER = 'json'
 CELERY_RESULT_SERIALIZER = 'json'
 CELERY_TIMEZONE = 'Asia/Kolkata'
-CELERY_TASK_ALWAYS_EAGER = True
+CELERY_TASK_ACKS_LATE = True
+CELERY_WORKER_PREFETCH_MULTIPLIER = 1
+# PDF rendering is CPU-bound; give it its own queue so it can be scaled apart from
+# the I/O-bound senders (`celery -A pune_color_festival worker -Q pdf`).
+CELERY_TASK_ROUTES = {
+    'core.tasks.render_ticket_pdf': {'queue': 'pdf'},
+    'core.tasks.build_ticket_artifacts': {'queue': 'pdf'},
+}
+# Periodic jobs, run by `celery -A pune_color_festival beat` (one instance only)
+CELERY_BEAT_SCHEDULE = {
+    'expire-reservations': {
+        'task': 'core.tasks.expire_reservations',
+        'schedule': 60.0,
+    },
+    # Safety net: payment_webhook queues this itself for every new event
+    'process-payment-events': {
+        'task': 'core.tasks.process_payment_events',
+        'schedule': 30.0,
+    },
+}
+# Webhook events applied per transaction by process_payment_events
+PAYMENT_EVENT_BATCH = int(os.environ.get('PAYMENT_EVENT_BATCH', 200))
+
+# Waiting room in front of checkout (core.waiting_room): admissions per second, 0 = off. Needs a shared CACHE_URL.
+# Size it from `manage.py bench_flash_sale` checkouts/sec; a pass then lasts WAITING_ROOM_PASS_TTL seconds.
+WAITING_ROOM_RATE = float(os.environ.get('WAITING_ROOM_RATE', 0))
+WAITING_ROOM_PASS_TTL = int(os.environ.get('WAITING_ROOM_PASS_TTL', 600))
+WAITING_ROOM_POLL_SECONDS = int(os.environ.get('WAITING_ROOM_POLL_SECONDS', 3))
+
+# How long checkout holds stock while the customer pays
+RESERVATION_TTL_MINUTES = int(os.environ.get('RESERVATION_TTL_MINUTES', 20))
+
+# Shared secret gate scanners send as X-Gate-Key to /gate/scan/ (empty = check-in disabled)
+GATE_API_KEY = os.environ.get('GATE_API_KEY', '')
+# Offline scanners: check-ins accepted per push, and how far back manifest deltas reach before `since`
+GATE_CHECKIN_BATCH = int(os.environ.get('GATE_CHECKIN_BATCH', 500))
+GATE_MANIFEST_OVERLAP = int(os.environ.get('GATE_MANIFEST_OVERLAP', 120))
+
+# Ticket delivery retries (per channel): backoff doubles from DELIVERY_RETRY_BACKOFF seconds
+DELIVERY_MAX_RETRIES = int(os.environ.get('DELIVERY_MAX_RETRIES', 5))
+DELIVERY_RETRY_BACKOFF = int(os.environ.get('DELIVERY_RETRY_BACKOFF', 30))
+DELIVERY_RETRY_BACKOFF_MAX = int(os.environ.get('DELIVERY_RETRY_BACKOFF_MAX', 600))
 
 # Email Settings
 # Set EMAIL_HOST_USER and EMAIL_HOST_PASSWORD in Railway env vars to enable real sending.
@@ -134,9 +272,11 @@ EMAIL_HOST_PASSWORD = os.environ.get('EMAIL_HOST_PASSWORD', '')
 # WhatsApp API Settings
 WHATSAPP_PHONE_NUMBER_ID = os.environ.get('WHATSAPP_PHONE_NUMBER_ID', '')
 WHATSAPP_ACCESS_TOKEN = os.environ.get('WHATSAPP_ACCESS_TOKEN', '')
+WHATSAPP_API_URL = os.environ.get('WHATSAPP_API_URL', 'https://graph.facebook.com/v18.0')
 
 # Resend API Settings (HTTPS Email Delivery)
 RESEND_API_KEY = os.environ.get('RESEND_API_KEY', '')
+RESEND_API_URL = os.environ.get('RESEND_API_URL', 'https://api.resend.com')
 DEFAULT_FROM_EMAIL = os.environ.get('DEFAULT_FROM_EMAIL', EMAIL_HOST_USER)
 EMAIL_TIMEOUT = 10  # fail fast if SMTP hangs
 